@@ -1,7 +1,8 @@
-from langchain_groq import ChatGroq
 from langchain_core.messages import SystemMessage, HumanMessage
 
-llm = ChatGroq(model_name="llama3-70b-8192", temperature=0.0)
+import resources
+import telemetry
+from context_builder import estimate_tokens
 
 system_message = SystemMessage(
     content=(
@@ -13,16 +14,18 @@ system_message = SystemMessage(
     )
 )
 
-def shopbot_ai(user_query: str, context: str) -> str:
-    print(context)
+def build_messages(user_query: str, context: str, history: str = "") -> list:
+    # Lịch sử đã được rút gọn sẵn (conversation.ConversationState.history)
+    history_block = f"Lịch sử hội thoại:  \n{history}  \n  \n" if history else ""
     full_prompt = (
+        f"{history_block}"
         f"Câu hỏi của người dùng: {user_query}  \n  \n"
+        # Mỗi sản phẩm trong context đã gộp sẵn các biến thể (context_builder.build_context)
         f"Danh sách sản phẩm:  \n{context}  \n  \n"
 
         f"🔁 Lưu ý QUAN TRỌNG:  \n"
         f"- Bạn phải tự động dịch các giá trị từ tiếng Anh sang tiếng Việt một cách chính xác theo ngữ cảnh và trả lời toàn bộ bằng TIẾNG VIỆT.  \n"
         f"- Bạn chỉ được sử dụng thông tin trong danh sách sản phẩm để trả lời.  \n"
-        f"- Nếu có nhiều sản phẩm cùng tên, CHỈ chọn 1 bản đại diện (loại bỏ bản khác).  \n"
         f"- **Bạn PHẢI lọc sản phẩm DỰA TRÊN TIÊU CHÍ người dùng đưa ra.**  \n"
         f"- **Không được liệt kê sản phẩm nào KHÔNG PHÙ HỢP với yêu cầu.**  \n"
         f"- ❌ Nếu KHÔNG có bất kỳ sản phẩm nào thỏa mãn TẤT CẢ tiêu chí người dùng đưa ra, bạn PHẢI trả lời đúng dòng sau: 'Hiện không có sản phẩm nào phù hợp với yêu cầu của bạn.' và KHÔNG TRẢ LỜI GÌ THÊM.  \n"
@@ -43,14 +46,45 @@ def shopbot_ai(user_query: str, context: str) -> str:
         f"- KHÔNG được thêm thông tin không có trong danh sách  \n"
         f"- KHÔNG dùng markdown bảng hay danh sách có chấm đầu dòng (•)  \n"
         f"- KHÔNG rút gọn nội dung hoặc thay đổi cấu trúc trình bày  \n"
-        f"- Nếu có nhiều sản phẩm cùng tên, bạn CHỈ được giữ lại 1 sản phẩm đại diện duy nhất.  \n"
-        f"- KHÔNG được đưa các biến thể khác cùng tên vào kết quả, dù có khác màu hay cấu hình.  \n"
         f"- KHÔNG được vi phạm yêu cầu này. Nếu vi phạm, bạn sẽ bị coi là trả lời sai.  \n"
     )
 
-
-    response = llm.invoke([
+    return [
         system_message,
         HumanMessage(content=full_prompt)
-    ])
+    ]
+
+
+def _count_tokens(messages, answer: str, usage=None):
+    # Ưu tiên số token Groq trả về (usage_metadata), nếu không có thì ước lượng
+    usage = usage or {}
+    tokens_in = usage.get("input_tokens") or sum(estimate_tokens(m.content) for m in messages)
+    tokens_out = usage.get("output_tokens") or estimate_tokens(answer)
+    telemetry.incr("llm_tokens_total", tokens_in, direction="in")
+    telemetry.incr("llm_tokens_total", tokens_out, direction="out")
+    telemetry.incr("llm_requests_total")
+
+
+def shopbot_ai(user_query: str, context: str, llm_client=None, history: str = "") -> str:
+    messages = build_messages(user_query, context, history)
+    response = (llm_client or resources.llm()).invoke(messages)
+    _count_tokens(messages, response.content, getattr(response, "usage_metadata", None))
     return response.content
+
+
+async def astream_shopbot_ai(user_query: str, context: str, llm_client=None, history: str = ""):
+    """Stream the answer token by token (ChatGroq.astream)."""
+    messages = build_messages(user_query, context, history)
+    parts, usage = [], None
+    async for chunk in (llm_client or resources.llm()).astream(messages):
+        usage = getattr(chunk, "usage_metadata", None) or usage
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    _count_tokens(messages, "".join(parts), usage)
+
+
+def __getattr__(name):
+    if name == "llm":
+        return resources.llm()
+    raise AttributeError(f"module 'ai_function' has no attribute {name!r}")
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "1800"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+INVALIDATION_LOG = os.getenv("ANSWER_CACHE_INVALIDATION_LOG", "answer_cache_invalidations.jsonl")
+
+
+def filters_key(filters: dict) -> str:
+    norm = {}
+    for key, value in sorted((filters or {}).items()):
+        if isinstance(value, list):
+            value = sorted(str(v).strip().lower() for v in value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        elif isinstance(value, str):
+            value = value.strip().upper()
+        if value not in (None, [], ""):
+            norm[key] = value
+    return json.dumps(norm, sort_keys=True, ensure_ascii=False)
+
+
+def publish_invalidation(products=None, flush_all: bool = False, path: str = INVALIDATION_LOG):
+    """Called by the sync jobs: answers that mention these products get dropped."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"ts": time.time(), "products": sorted(set(products or [])), "all": flush_all},
+                           ensure_ascii=False) + "\n")
+
+
+class SemanticAnswerCache:
+    """Answer cache keyed on (query embedding, normalized filters).
+
+    A stored answer is served when the cosine similarity to a previous query
+    with the *same* filters passes `threshold`. Entries expire after `ttl`
+    seconds and are dropped when a catalog sync reports a change to one of
+    the products the answer was built from. Entries stored with `prices`
+    ({DetailId: [Price, Status]}) are only served when `fresh(prices)` still
+    holds at lookup time (overlay.PriceOverlay.unchanged).
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_SIZE, invalidation_log: str = INVALIDATION_LOG):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.invalidation_log = invalidation_log
+        self._log_offset = os.path.getsize(invalidation_log) if os.path.exists(invalidation_log) else 0
+        self.entries = {}  # filters_key -> list of entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.invalidated = 0
+        self.stale = 0
+
+    def _size(self) -> int:
+        return sum(len(v) for v in self.entries.values())
+
+    def _apply_invalidations(self):
+        if not os.path.exists(self.invalidation_log):
+            return
+        if os.path.getsize(self.invalidation_log) <= self._log_offset:
+            return
+        with open(self.invalidation_log, encoding="utf-8") as f:
+            f.seek(self._log_offset)
+            lines = f.readlines()
+            self._log_offset = f.tell()
+        for line in lines:
+            event = json.loads(line)
+            if event.get("all"):
+                self.invalidated += self._size()
+                self.entries.clear()
+            else:
+                self._drop_products(event.get("products", []))
+
+    def _drop_products(self, products):
+        names = [p.strip().lower() for p in products if p]
+        if not names:
+            return
+        for key, items in list(self.entries.items()):
+            kept = [e for e in items
+                    if not any(n in e["products"] or n in e["answer_lower"] for n in names)]
+            self.invalidated += len(items) - len(kept)
+            self.entries[key] = kept
+
+    def invalidate_products(self, products):
+        with self.lock:
+            self._drop_products(products)
+
+    def lookup(self, vector, filters: dict, fresh=None):
+        """The cached answer text, or None."""
+        entry = self.lookup_entry(vector, filters, fresh)
+        return entry["answer"] if entry is not None else None
+
+    def lookup_entry(self, vector, filters: dict, fresh=None):
+        """The matching entry (answer, products, documents...), or None; counts the hit / miss."""
+        now = time.time()
+        key = filters_key(filters)
+        entry = None
+        with self.lock:
+            self._apply_invalidations()
+            items = [e for e in self.entries.get(key, []) if now - e["created"] < self.ttl]
+            self.entries[key] = items
+            query = np.asarray(vector, dtype=np.float32)
+            items = [e for e in items if e["vector"].shape == query.shape]
+            if items:
+                query = query / max(np.linalg.norm(query), 1e-12)
+                scores = np.stack([e["vector"] for e in items]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry = items[best]
+
+        # fresh() có thể truy vấn DB nên chạy ngoài lock
+        if entry is not None and fresh is not None and entry["prices"] and not fresh(entry["prices"]):
+            with self.lock:
+                # Giá / tồn kho đã đổi kể từ lúc trả lời: bỏ entry, tính là miss
+                self.entries[key] = [e for e in self.entries.get(key, []) if e is not entry]
+                self.stale += 1
+            entry = None
+
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += entry["latency"]
+            return entry
+
+    def store(self, vector, filters: dict, answer: str, products=(), latency: float = 0.0, prices: dict = None,
+              documents=()):
+        vector = np.asarray(vector, dtype=np.float32)
+        entry = {
+            "vector": vector / max(np.linalg.norm(vector), 1e-12),
+            "answer": answer,
+            "answer_lower": answer.lower(),
+            "products": {p.strip().lower() for p in products if p},
+            "created": time.time(),
+            "latency": latency,
+            "prices": prices or {},
+            # Kết quả tìm kiếm của câu trả lời, để câu hỏi tiếp theo trong phiên còn dùng lại được
+            "documents": list(documents),
+        }
+        with self.lock:
+            self.entries.setdefault(filters_key(filters), []).append(entry)
+            if self._size() > self.max_entries:
+                # Bỏ entry cũ nhất
+                oldest_key = min((k for k in self.entries if self.entries[k]),
+                                 key=lambda k: self.entries[k][0]["created"])
+                self.entries[oldest_key].pop(0)
+
+    def metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "entries": self._size(),
+            "invalidated": self.invalidated,
+            "stale": self.stale,
+        }
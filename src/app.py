@@ -20,7 +20,15 @@
 import streamlit as st
 from streamlit_chat import message
 import random
-from chatbot import shop_chatbot
+import resources
+import telemetry
+from chatbot import stream_shop_chatbot
+from conversation import ConversationState
+
+# Tải model embedding / kết nối vector store một lần cho cả process, chạy nền
+resources.start_warmup()
+# /metrics cho Prometheus nếu đặt METRICS_PORT
+telemetry.serve_metrics()
 
 
 # st.set_page_config(page_title='🤖 Shop Assistant Chatbot', layout='centered', page_icon='🛒')
@@ -40,9 +48,15 @@ INIT_MESSAGE = {"role": "assistant",
 if "messages" not in st.session_state:
         st.session_state.messages = [INIT_MESSAGE]
 
-def generate_response(input_text):
-    output = shop_chatbot(user_query=input_text)
-    return output
+# Bộ lọc / kết quả / lịch sử rút gọn của phiên chat, dùng cho các câu hỏi tiếp theo
+if "conversation" not in st.session_state:
+    st.session_state.conversation = ConversationState()
+
+def stream_response(input_text, parts):
+    # Giữ lại text gốc, chỉ đổi xuống dòng cho markdown khi hiển thị
+    for token in stream_shop_chatbot(user_query=input_text, state=st.session_state.conversation):
+        parts.append(token)
+        yield token.replace("\n", "  \n")
 
 # Display chat messages
 for msg in st.session_state.messages:
@@ -62,11 +76,10 @@ if user_input:
 
 # Generate response
 if st.session_state.messages[-1]["role"] != "assistant":
-    response = generate_response(user_input)
+    parts = []
+    with st.chat_message("assistant"):
+        st.write_stream(stream_response(user_input, parts))
+    response = "".join(parts)
 
     st.session_state.messages.append({"role": "assistant", "content": response})
 
-    assistant_message = st.chat_message("assistant")
-    formatted_response = response.replace("\n", "  \n")
-    assistant_message.markdown(formatted_response, unsafe_allow_html=True)
-
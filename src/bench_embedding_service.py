@@ -0,0 +1,86 @@
+"""Load test of embedding_service against a fake single-model encoder, offline.
+
+    python bench_embedding_service.py --sessions 32 --queries 20
+    python bench_embedding_service.py --http --max-wait-ms 2
+
+Each session thread embeds its own stream of distinct queries, like
+concurrent Streamlit sessions calling search_product_context. The fake
+encoder (fakes.FakeSlowEmbeddings) runs one forward pass at a time and
+costs --latency per call plus --per-text per text, so sharing passes is
+what makes batching pay off. The same load goes straight to the model,
+through EmbeddingBatcher, and (--http) through the HTTP service.
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import telemetry
+from bench_queries import QUERIES
+from embedding_service import EmbeddingBatcher, RemoteEmbeddings, serve
+from fakes import FakeSlowEmbeddings
+
+
+def run(embeddings, sessions: int, queries: int) -> dict:
+    def session(i):
+        latencies = []
+        for j in range(queries):
+            started = time.perf_counter()
+            embeddings.embed_query(f"{QUERIES[(i + j) % len(QUERIES)]} #{i}-{j}")
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        latencies = sorted(s for result in pool.map(session, range(sessions)) for s in result)
+    wall = time.perf_counter() - started
+    return {
+        "wall_s": round(wall, 2),
+        "qps": round(len(latencies) / wall, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[int(0.99 * (len(latencies) - 1))] * 1000, 1),
+    }
+
+
+def histograms() -> str:
+    lines = [line for line in telemetry.prometheus_text().splitlines()
+             if line.startswith(("embedding_batch_size_", "embedding_queue_seconds_")) and "_bucket" not in line]
+    return "\n".join(f"   {line}" for line in lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=32, help="concurrent caller threads")
+    parser.add_argument("--queries", type=int, default=20, help="queries per session")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake encoder seconds per forward pass")
+    parser.add_argument("--per-text", type=float, default=0.001, help="fake encoder seconds per text in a pass")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--http", action="store_true", help="also go through the local HTTP service")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    def model():
+        return FakeSlowEmbeddings(size=768, latency=args.latency, per_text=args.per_text)
+
+    direct = model()
+    print(f"🔴 direct : {run(direct, args.sessions, args.queries)}  forward passes={direct.calls}")
+
+    encoder = model()
+    batcher = EmbeddingBatcher(encoder, args.max_batch, args.max_wait_ms)
+    telemetry.reset()
+    print(f"🟢 batched: {run(batcher, args.sessions, args.queries)}  forward passes={encoder.calls}")
+    print(histograms())
+
+    if args.http:
+        encoder = model()
+        server = serve(EmbeddingBatcher(encoder, args.max_batch, args.max_wait_ms), port=args.port)
+        remote = RemoteEmbeddings(f"http://127.0.0.1:{args.port}")
+        telemetry.reset()
+        print(f"🌐 http   : {run(remote, args.sessions, args.queries)}  forward passes={encoder.calls}")
+        print(histograms())
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark: rule-based filter parser vs the LLM extractor.
+
+    python bench_filters.py            # parser only (+ recorded LLM outputs if present)
+    python bench_filters.py --llm      # call Groq, record outputs for later offline runs
+"""
+import argparse
+import json
+import os
+import time
+
+from bench_queries import QUERIES
+from filter_parser import parse_filters, empty_filters, load_vocab
+
+FIELDS = ["price_min", "price_max", "colors", "memories", "status", "attributes"]
+RECORD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_filters_llm.json")
+
+
+def _norm(field, value):
+    if field in ("colors", "memories", "attributes"):
+        return sorted(str(v).strip().lower() for v in (value or []))
+    if field in ("price_min", "price_max"):
+        return float(value) if value not in (None, "") else None
+    return str(value).upper() if value else None
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def run_parser(repeat: int):
+    load_vocab()  # không tính thời gian đọc CSV
+    timings, results = [], {}
+    for _ in range(repeat):
+        for q in QUERIES:
+            start = time.perf_counter()
+            results[q] = parse_filters(q)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings, results
+
+
+def run_llm():
+    from database import extract_filters_llm
+
+    timings, results = [], {}
+    for q in QUERIES:
+        start = time.perf_counter()
+        results[q] = extract_filters_llm(q)
+        elapsed = (time.perf_counter() - start) * 1000
+        timings.append(elapsed)
+        results[q]["_latency_ms"] = elapsed
+    with open(RECORD_PATH, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return timings, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", action="store_true", help="call the LLM extractor and record its outputs")
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("FILTER_CONFIDENCE_THRESHOLD", "0.7")))
+    args = parser.parse_args()
+
+    parser_ms, parsed = run_parser(args.repeat)
+    print(f"⚡ Parser: p50={_percentile(parser_ms, 50):.3f}ms p99={_percentile(parser_ms, 99):.3f}ms "
+          f"({len(parser_ms)} calls)")
+    low = [q for q in QUERIES if parsed[q].confidence < args.threshold]
+    print(f"🤖 LLM fallback: {len(low)}/{len(QUERIES)} queries")
+    for q in low:
+        print(f"   - {q}: {parsed[q].issues}")
+
+    if args.llm:
+        llm_ms, llm_results = run_llm()
+    elif os.path.exists(RECORD_PATH):
+        with open(RECORD_PATH, encoding="utf-8") as f:
+            llm_results = json.load(f)
+        llm_ms = [r.get("_latency_ms", 0.0) for r in llm_results.values()]
+    else:
+        print("ℹ️ No recorded LLM outputs, run with --llm to compare agreement")
+        return
+
+    print(f"🐢 LLM: p50={_percentile(llm_ms, 50):.1f}ms p99={_percentile(llm_ms, 99):.1f}ms")
+
+    agree = {f: 0 for f in FIELDS}
+    full = 0
+    compared = [q for q in QUERIES if q in llm_results]
+    for q in compared:
+        expected = {**empty_filters(), **llm_results[q]}
+        same = [f for f in FIELDS if _norm(f, parsed[q].filters[f]) == _norm(f, expected[f])]
+        for f in same:
+            agree[f] += 1
+        if len(same) == len(FIELDS):
+            full += 1
+        else:
+            diff = {f: (parsed[q].filters[f], expected[f]) for f in FIELDS if f not in same}
+            print(f"   ≠ {q}: {diff}")
+
+    n = len(compared) or 1
+    print("📊 Agreement per field: " + ", ".join(f"{f}={agree[f] / n:.0%}" for f in FIELDS))
+    print(f"📊 Full agreement: {full / n:.0%} ({full}/{len(compared)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Burst test of llm_gateway.LLMGateway against a fake rate-limited Groq.
+
+    python bench_llm_gateway.py --requests 200 --concurrency 64 --rps 5 --distinct 10
+    python bench_llm_gateway.py --fallback --fallback-depth 8
+
+The upstream is fakes.FakeRateLimitedChatModel: it answers after --latency
+seconds and raises a 429 beyond --rps requests/s or --max-concurrent open
+calls. The same burst (threads calling .invoke, like Streamlit sessions) is
+sent straight to the model and then through the gateway.
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage
+
+import telemetry
+from bench_queries import QUERIES
+from fakes import FakeRateLimitedChatModel
+from llm_gateway import GatewayOverloaded, LLMGateway
+
+
+def make_model(args, latency: float):
+    return FakeRateLimitedChatModel(latency=latency, rps=args.rps, max_concurrent=args.max_concurrent)
+
+
+def burst(client, prompts, concurrency: int) -> dict:
+    def one(prompt):
+        started = time.perf_counter()
+        try:
+            client.invoke([HumanMessage(content=prompt)])
+            result = "ok"
+        except GatewayOverloaded:
+            result = "overloaded"
+        except Exception as e:
+            result = type(e).__name__
+        return result, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, prompts))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(seconds for result, seconds in outcomes if result == "ok")
+    counts = {}
+    for result, _ in outcomes:
+        counts[result] = counts.get(result, 0) + 1
+    return {
+        "wall_s": round(wall, 2),
+        "results": counts,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "p99_ms": round(latencies[int(0.99 * (len(latencies) - 1))] * 1000, 1) if latencies else None,
+    }
+
+
+def _counter(name: str, **labels) -> int:
+    wanted = [f'{k}="{v}"' for k, v in labels.items()]
+    total = 0.0
+    for line in telemetry.prometheus_text().splitlines():
+        series, _, value = line.rpartition(" ")
+        if series.split("{")[0] == name and all(w in series for w in wanted):
+            total += float(value)
+    return int(total)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64, help="caller threads (sessions)")
+    parser.add_argument("--distinct", type=int, default=10, help="distinct prompts in the burst")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake upstream seconds per call")
+    parser.add_argument("--rps", type=float, default=5.0, help="fake upstream quota (requests/s)")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="fake upstream open-call limit")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--fallback", action="store_true", help="add a faster fallback model")
+    parser.add_argument("--fallback-depth", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    prompts = [rng.choice(QUERIES[:args.distinct]) for _ in range(args.requests)]
+
+    direct = make_model(args, args.latency)
+    report = burst(direct, prompts, args.concurrency)
+    print(f"🔴 direct : {report}  upstream calls={direct.calls} rejected={direct.rejected}")
+
+    primary = make_model(args, args.latency)
+    fallback = make_model(args, args.latency / 2) if args.fallback else None
+    gateway = LLMGateway(primary, fallback=fallback, workers=args.workers, max_queue=args.max_queue,
+                         fallback_depth=args.fallback_depth, rpm=args.rps * 60, burst_seconds=1, backoff=0.1)
+    telemetry.reset()
+    report = burst(gateway, prompts, args.concurrency)
+    upstream = primary.calls + (fallback.calls if fallback else 0)
+    gateway.close()
+    print(f"🟢 gateway: {report}  upstream calls={upstream} rejected={primary.rejected}")
+    print(f"   coalesced={_counter('llm_gateway_requests_total', result='coalesced')} "
+          f"retries={_counter('llm_gateway_retries_total')} "
+          f"fallback calls={fallback.calls if fallback else 0}")
+
+
+if __name__ == "__main__":
+    main()
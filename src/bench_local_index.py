@@ -0,0 +1,73 @@
+"""Benchmark: LocalVectorIndex vs the Chroma store in chroma_db/.
+
+Both sides search the same vectors (exported from the Chroma collection)
+with the same query embeddings, so only search latency is compared.
+
+    python bench_local_index.py [--repeat 50] [--filtered]
+"""
+import argparse
+import tempfile
+import time
+
+import chromadb
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from bench_queries import QUERIES
+from catalog import build_metadata_filter
+from chroma_sync import MODEL_NAME, COLLECTION_NAME
+from collection_alias import resolve
+from embedding_cache import CachedEmbeddings
+from filter_parser import parse_filters
+from local_index import LocalVectorIndex, build_local_index, export_chroma
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def _report(name, timings):
+    print(f"{name:>8}: p50={_percentile(timings, 50):.3f}ms p99={_percentile(timings, 99):.3f}ms "
+          f"({len(timings)} searches)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--filtered", action="store_true", help="apply build_metadata_filter to both stores")
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path="./chroma_db").get_collection(resolve(COLLECTION_NAME))
+    texts, metadatas, vectors = export_chroma()
+    local = LocalVectorIndex(build_local_index(texts, metadatas, vectors, tempfile.mkdtemp(), model=MODEL_NAME))
+
+    embeddings = CachedEmbeddings(HuggingFaceEmbeddings(model_name=MODEL_NAME))
+    queries = [(embeddings.embed_query(q), build_metadata_filter(parse_filters(q).filters) if args.filtered else None)
+               for q in QUERIES]
+
+    chroma_ms, local_ms, overlap = [], [], []
+    for _ in range(args.repeat):
+        for vector, where in queries:
+            start = time.perf_counter()
+            chroma_hits = collection.query(query_embeddings=[vector], n_results=args.k, where=where)
+            chroma_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            local_ids, _ = local.search_ids(vector, k=args.k, where=where)
+            local_ms.append((time.perf_counter() - start) * 1000)
+
+            chroma_docs = set(chroma_hits["documents"][0])
+            local_docs = {texts[i] for i in local_ids}
+            if chroma_docs or local_docs:
+                overlap.append(len(chroma_docs & local_docs) / max(len(chroma_docs), len(local_docs)))
+
+    print(f"📦 {len(texts)} vectors, dim={len(vectors[0])}, filtered={args.filtered}")
+    _report("chroma", chroma_ms)
+    _report("local", local_ms)
+    if overlap:
+        print(f"🎯 top-{args.k} overlap with Chroma (HNSW, approximate): {sum(overlap) / len(overlap):.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Offline throughput test of pinecone_sync.pipelined_upsert.
+
+    python bench_pinecone_sync.py --scale 20 --workers 1,4,8
+    python bench_pinecone_sync.py --failure-rate 0.2      # retries + dead-letter file
+
+Rows come from product_data.csv (mapped to fetch_data's columns). The
+embedder is fakes.FakeSlowEmbeddings (one call at a time, like one Gemini
+client) and the sink is fakes.FakeVectorSink with a per-upsert latency. The
+old loop (embed, then upsert, batch after batch) is the baseline.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from fakes import FakeSlowEmbeddings, FakeVectorSink
+from pinecone_sync import BATCH_SIZE, pipelined_upsert, prepare_rows
+from snapshot import read_table
+
+
+def catalog_frame(path: str, scale: int) -> pd.DataFrame:
+    df = read_table(path)
+    df = df[df["product_variant_detail_id"].notna()]
+    frame = pd.DataFrame({
+        "id": df["product_variant_detail_id"].astype(str),
+        "product_name": df["product_name"],
+        "variant_id": df["product_variant_id"],
+        "variant_name": df["product_variant_name"],
+        "price": df["price"],
+        "status": df["product_variant_detail_status"],
+        "color_name": df["color_name"],
+        "memory_name": df["memory_name"],
+        "attributes": df["attributes"].fillna(""),
+    }).drop_duplicates("id")
+    frame["pvd_name"] = frame["variant_name"] + " - " + frame["color_name"] + " - " + frame["memory_name"]
+    copies = [frame.assign(id=frame["id"] + (f"#{i}" if i else "")) for i in range(scale)]
+    return pd.concat(copies, ignore_index=True)
+
+
+def sequential(ids, texts, metadatas, index, embed_model, batch_size: int) -> dict:
+    started = time.perf_counter()
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        embeds = embed_model.embed_documents(texts[start:end])
+        index.upsert(vectors=list(zip(ids[start:end], embeds, metadatas[start:end])))
+    seconds = time.perf_counter() - started
+    return {"rows": len(ids), "seconds": round(seconds, 2), "rows_per_s": round(len(ids) / seconds, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default="product_data.csv")
+    parser.add_argument("--scale", type=int, default=20, help="copies of the catalog")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", default="1,4,8", help="concurrent upserts to compare")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="fake embedder seconds per batch")
+    parser.add_argument("--upsert-latency", type=float, default=0.15, help="fake sink seconds per upsert")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of upserts failing with a 429")
+    parser.add_argument("--retries", type=int, default=3)
+    args = parser.parse_args()
+
+    ids, texts, metadatas = prepare_rows(catalog_frame(args.csv, args.scale))
+    print(f"📦 {len(ids)} rows, batches of {args.batch_size}")
+
+    def embedder():
+        return FakeSlowEmbeddings(size=768, latency=args.embed_latency, per_text=0.0)
+
+    sink = FakeVectorSink(latency=args.upsert_latency)
+    print(f"🔴 sequential : {sequential(ids, texts, metadatas, sink, embedder(), args.batch_size)}")
+
+    for workers in (int(w) for w in args.workers.split(",")):
+        sink = FakeVectorSink(latency=args.upsert_latency, failure_rate=args.failure_rate)
+        dead_letter = os.path.join(tempfile.mkdtemp(), "dead_letter.jsonl")
+        stats = pipelined_upsert(ids, texts, metadatas, sink, embedder(), batch_size=args.batch_size,
+                                 workers=workers, retries=args.retries, backoff=0.05, dead_letter_path=dead_letter)
+        print(f"🟢 pipelined x{workers}: {stats}  stored={len(sink.vectors)} upsert calls={sink.calls} "
+              f"injected failures={sink.failures}")
+
+
+if __name__ == "__main__":
+    main()
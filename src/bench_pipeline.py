@@ -0,0 +1,208 @@
+"""Offline end-to-end benchmark of the shop_chatbot pipeline.
+
+No Groq, Pinecone or SQL Server: each query goes through the real
+chatbot.stream_shop_chatbot (structured answers, conversation state, answer
+cache, retrieval, context, generation) with fakes plugged in: the LLMs are
+fakes.FakeChatModel (recorded or templated answers with configurable
+latency), the store is an in-memory Chroma collection built from
+product_data.csv, and the queries are bench_queries.QUERIES.
+
+    python bench_pipeline.py [--concurrency 1,4,16] [--repeat 3] [--out bench_pipeline.json]
+    python bench_pipeline.py --store fake --embeddings minilm --llm-latency 0.3 --token-latency 0.01
+
+Per-stage timings come from the pipeline's own telemetry (stage_seconds,
+time_to_first_token_seconds), so stages the pipeline skips (e.g. retrieval
+for a structured answer) are simply not counted. The answer cache is off
+unless --answer-cache. The JSON output is meant to be compared between commits.
+"""
+import argparse
+import contextvars
+import json
+import os
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings.fake import DeterministicFakeEmbedding
+
+import telemetry
+from bench_queries import QUERIES
+from fakes import FakeChatModel, FakeVectorStore
+from snapshot import load_documents
+
+STAGES = ["structured", "filters", "embed", "search", "context", "first_token", "generation", "total"]
+FILTER_RECORDING = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_filters_llm.json")
+# Thời gian từng stage của câu hỏi đang chạy (to_thread / event loop chép context nên vẫn thấy)
+_timings = contextvars.ContextVar("bench_timings", default=None)
+
+
+def _record(name: str, value: float, labels: dict):
+    timings = _timings.get()
+    if timings is None:
+        return
+    if name == "stage_seconds":
+        stage = "total" if labels.get("stage") == "request" else labels.get("stage")
+        timings[stage] = timings.get(stage, 0.0) + value
+    elif name == "time_to_first_token_seconds":
+        timings["first_token"] = value
+    elif name == "context_tokens":
+        timings["context_tokens"] = value
+
+
+telemetry.add_observer(_record)
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def _summary(values) -> dict:
+    ms = [v * 1000 for v in values]
+    return {"p50": round(_percentile(ms, 50), 3), "p95": round(_percentile(ms, 95), 3),
+            "p99": round(_percentile(ms, 99), 3), "mean": round(statistics.fmean(ms), 3), "n": len(ms)}
+
+
+def make_embeddings(kind: str):
+    if kind == "minilm":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from chroma_sync import MODEL_NAME
+        return HuggingFaceEmbeddings(model_name=MODEL_NAME)
+    return DeterministicFakeEmbedding(size=384)
+
+
+def make_store(kind: str, csv_path: str, embeddings, level: str = "variant"):
+    if level == "product":
+        import database
+        from catalog import build_product_documents
+        from snapshot import read_table
+        from variant_table import VariantTable
+
+        texts, metadatas, variants = build_product_documents(read_table(csv_path))
+        database._variant_table.pin(VariantTable(variants))
+    else:
+        texts, metadatas = load_documents(csv_path)
+    if kind == "fake":
+        return FakeVectorStore(texts, metadatas, embeddings=embeddings)
+
+    import chromadb
+    from langchain_chroma import Chroma
+
+    store = Chroma(collection_name="bench_products", embedding_function=embeddings,
+                   client=chromadb.EphemeralClient())
+    store.add_texts(texts, metadatas=metadatas)
+    return store
+
+
+def filter_llm_from_recording(path: str = FILTER_RECORDING, latency: float = 0.0) -> FakeChatModel:
+    """Replay the outputs recorded by `bench_filters.py --llm` (keyed by query)."""
+    responses = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for query, result in json.load(f).items():
+                responses[query] = json.dumps({k: v for k, v in result.items() if not k.startswith("_")})
+    return FakeChatModel(responses, template="{{}}", latency=latency)
+
+
+def run_query(query: str, store, llm, filter_llm, cache) -> dict:
+    """One fresh conversation through chatbot.stream_shop_chatbot; {stage: seconds, ...}."""
+    import chatbot
+    from conversation import ConversationState
+
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        for _ in chatbot.stream_shop_chatbot(query, llm=llm, filter_llm=filter_llm, store=store, cache=cache,
+                                             state=ConversationState()):
+            pass
+    finally:
+        _timings.reset(token)
+    # Câu trả lời có sẵn (structured / cache) không stream: token đầu tiên = cả request
+    timings.setdefault("first_token", timings.get("total", 0.0))
+    return timings
+
+
+def run_level(concurrency: int, queries, store, llm, filter_llm, cache) -> dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = list(pool.map(lambda q: run_query(q, store, llm, filter_llm, cache), queries))
+    wall = time.perf_counter() - started
+    tokens = [t["context_tokens"] for t in timings if "context_tokens" in t]
+    return {
+        "qps": round(len(queries) / wall, 2),
+        "wall_s": round(wall, 3),
+        "stages": {stage: _summary([t[stage] for t in timings if stage in t])
+                   for stage in STAGES if any(stage in t for t in timings)},
+        "context_tokens": round(statistics.fmean(tokens), 1) if tokens else 0.0,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default="product_data.csv")
+    parser.add_argument("--store", choices=["chroma", "fake"], default="chroma")
+    parser.add_argument("--embeddings", choices=["fake", "minilm"], default="fake")
+    parser.add_argument("--level", choices=["variant", "product"], default="variant",
+                        help="index one document per variant-detail row or per product variant")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the query corpus per level")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per streamed token")
+    parser.add_argument("--filter-latency", type=float, default=0.0, help="latency of the fake filter LLM")
+    parser.add_argument("--overlay", choices=["none", "snapshot"], default="none",
+                        help="live price overlay (the default SQL one needs the database)")
+    parser.add_argument("--answer-cache", action="store_true", help="let repeated queries hit the answer cache")
+    parser.add_argument("--out", default="bench_pipeline.json")
+    args = parser.parse_args()
+
+    import resources
+    from answer_cache import ANSWER_CACHE_SIZE, SemanticAnswerCache
+    from overlay import create_overlay
+
+    embeddings = make_embeddings(args.embeddings)
+    store = make_store(args.store, args.csv, embeddings, level=args.level)
+    llm = FakeChatModel(latency=args.llm_latency, token_latency=args.token_latency)
+    filter_llm = filter_llm_from_recording(latency=args.filter_latency)
+    resources.price_overlay.set(create_overlay(args.overlay))
+    resources.llm.set(llm)
+    queries = QUERIES * args.repeat
+
+    def new_cache():
+        # max_entries=0: không giữ câu trả lời nào, mọi câu hỏi đi hết pipeline
+        return SemanticAnswerCache(max_entries=ANSWER_CACHE_SIZE if args.answer_cache else 0,
+                                   invalidation_log=os.devnull)
+
+    run_query(QUERIES[0], store, llm, filter_llm, new_cache())  # làm nóng (import, lexical index, vocab)
+    report = {
+        "commit": _git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "levels": {},
+    }
+    for level in [int(c) for c in args.concurrency.split(",")]:
+        result = run_level(level, queries, store, llm, filter_llm, new_cache())
+        report["levels"][str(level)] = result
+        total = result["stages"]["total"]
+        print(f"⚡ concurrency={level:>3}: {result['qps']:>8.2f} qps, total p50={total['p50']:.1f}ms "
+              f"p95={total['p95']:.1f}ms p99={total['p99']:.1f}ms")
+        for stage in STAGES[:-1]:
+            if stage not in result["stages"]:
+                continue
+            s = result["stages"][stage]
+            print(f"    {stage:>11}: p50={s['p50']:.2f}ms p95={s['p95']:.2f}ms p99={s['p99']:.2f}ms")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark: quantized first pass + float re-rank vs exact search in LocalVectorIndex.
+
+    python bench_quantization.py                           # all-mpnet-base-v2 on product_data.csv
+    python bench_quantization.py --embeddings fake --scale 200 --rerank 1,2,4,8
+
+Documents are embedded from the catalog; --scale N adds N-1 jittered copies
+of every vector to approximate a larger catalog. Queries are bench_queries
+plus a sample of document texts. Recall@k is measured against exact float32
+search (a hit scoring as high as the exact k-th result counts, since the
+catalog repeats some texts); memory is the resident part of the index
+(codes + codebook vs the float32 matrix).
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from bench_queries import QUERIES
+from local_index import LocalVectorIndex, MODEL_NAME, PQ_SUBSPACES, build_local_index
+from snapshot import load_documents
+
+
+def make_embeddings(kind: str):
+    if kind == "mpnet":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from embedding_cache import CachedEmbeddings
+        return CachedEmbeddings(HuggingFaceEmbeddings(model_name=MODEL_NAME))
+    from langchain_core.embeddings.fake import DeterministicFakeEmbedding
+    return DeterministicFakeEmbedding(size=768)
+
+
+def jitter(vectors: np.ndarray, scale: int, noise: float, seed: int) -> np.ndarray:
+    if scale <= 1:
+        return vectors
+    rng = np.random.default_rng(seed)
+    copies = [vectors] + [vectors + rng.normal(0, noise, vectors.shape).astype(np.float32) for _ in range(scale - 1)]
+    return np.concatenate(copies)
+
+
+def _mb(nbytes: int) -> str:
+    return f"{nbytes / 2 ** 20:.2f}MB"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default="product_data.csv")
+    parser.add_argument("--embeddings", choices=["fake", "mpnet"], default="mpnet")
+    parser.add_argument("--scale", type=int, default=1, help="jittered copies of every document vector")
+    parser.add_argument("--noise", type=float, default=0.02, help="std of the jitter added to the copies")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", default="1,2,4,8", help="shortlist sizes as multiples of k")
+    parser.add_argument("--rerank-min", type=int, default=0, help="shortlist floor (LOCAL_INDEX_RERANK_MIN)")
+    parser.add_argument("--subspaces", type=int, default=PQ_SUBSPACES)
+    parser.add_argument("--queries", type=int, default=100, help="document texts added to the query set")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings = make_embeddings(args.embeddings)
+    texts, metadatas = load_documents(args.csv)
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    rng = np.random.default_rng(args.seed)
+    sample = [texts[i] for i in rng.choice(len(texts), size=min(args.queries, len(texts)), replace=False)]
+    queries = [np.asarray(v, dtype=np.float32) for v in embeddings.embed_documents(QUERIES + sample)]
+
+    vectors = jitter(vectors, args.scale, args.noise, args.seed)
+    n = len(vectors)
+    texts = [texts[i % len(texts)] for i in range(n)]
+    metadatas = [metadatas[i % len(metadatas)] for i in range(n)]
+    exact = LocalVectorIndex(build_local_index(texts, metadatas, vectors, tempfile.mkdtemp(), quantization="none"))
+    # Điểm chính xác của mọi dòng và ngưỡng top-k cho từng câu hỏi
+    exact_scores = [np.asarray(exact.matrix) @ (q / np.linalg.norm(q)) for q in queries]
+    thresholds = [exact.search_ids(q, k=args.k)[1][-1] - 1e-6 for q in queries]
+    float_bytes = exact.matrix.nbytes
+
+    print(f"📦 {n} vectors, dim={vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    exact_ms = []
+    for q in queries:
+        start = time.perf_counter()
+        exact.search_ids(q, k=args.k)
+        exact_ms.append((time.perf_counter() - start) * 1000)
+    print(f"{'exact':>6}: memory={_mb(float_bytes)} p50={statistics.median(exact_ms):.3f}ms")
+
+    for kind in ("int8", "pq"):
+        index = LocalVectorIndex(build_local_index(texts, metadatas, vectors, tempfile.mkdtemp(),
+                                                   quantization=kind, subspaces=args.subspaces))
+        resident = index.codes.nbytes + index.quantizer.nbytes
+        print(f"{kind:>6}: memory={_mb(resident)} ({float_bytes / resident:.1f}x smaller than float32)")
+        for factor in (int(f) for f in args.rerank.split(",")):
+            index.rerank, index.rerank_min = factor, args.rerank_min
+            recalls, timings = [], []
+            for q, scores, threshold in zip(queries, exact_scores, thresholds):
+                start = time.perf_counter()
+                ids, _ = index.search_ids(q, k=args.k)
+                timings.append((time.perf_counter() - start) * 1000)
+                recalls.append(sum(scores[i] >= threshold for i in ids) / args.k)
+            print(f"        re-rank top {max(factor * args.k, args.rerank_min):>4}: recall@{args.k}={statistics.mean(recalls):.3f} "
+                  f"p50={statistics.median(timings):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
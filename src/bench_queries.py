@@ -0,0 +1,33 @@
+# Bộ câu hỏi tiếng Việt cố định dùng chung cho các benchmark
+QUERIES = [
+    "Điện thoại từ 10 đến 20 triệu, màu đen, RAM 8GB và 12GB, hàng mới, hỗ trợ 5G",
+    "điện thoại Samsung dưới 10 triệu màu xanh",
+    "điện thoại dưới 15tr",
+    "máy nào giá trên 25 triệu",
+    "tầm 8 triệu nên mua máy nào",
+    "iPhone nào còn hàng dưới 20 triệu",
+    "có bao nhiêu màu của Galaxy A55",
+    "Samsung Galaxy A55 5G 12GB",
+    "A55 5G 12GB",
+    "OLED 120Hz",
+    "điện thoại màn hình AMOLED 120Hz pin 5000mAh",
+    "máy màu tím ram 8GB",
+    "Galaxy S23 Ultra màu đen",
+    "điện thoại gaming RAM 16GB",
+    "Sony Xperia màu bạc còn hàng không",
+    "OPPO Reno12 5G giá bao nhiêu",
+    "máy chụp ảnh đẹp từ 15 đến 30 triệu",
+    "điện thoại 20 tr đổ lại màu xanh lá",
+    "điện thoại khoảng 10tr5",
+    "Z Flip5 màu xám",
+    "điện thoại hết hàng",
+    "máy giá từ 10.000.000đ đến 15.000.000đ",
+    "điện thoại màu nâu đồng 24GB",
+    "điện thoại có sạc nhanh và chống nước",
+    "máy nào rẻ nhất",
+    "điện thoại livestream tốt dưới 12 triệu",
+    "RAM 4GB màu trắng",
+    "Samsung 5G không quá 18 triệu",
+    "điện thoại từ 30 triệu trở lên",
+    "điện thoại pin trâu màu cam",
+]
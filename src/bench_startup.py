@@ -0,0 +1,78 @@
+"""Startup benchmark: import time, warmup and first/second request latency.
+
+Each run is a fresh interpreter, so import-time work is measured the way
+`streamlit run app.py` pays for it.
+
+    python bench_startup.py [--runs 3] [--no-warmup] [--fake]
+
+--fake answers with fakes.FakeChatModel / FakeVectorStore (no network), which
+still measures import cost but not model loading.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+QUERIES = ["Điện thoại Samsung màu đen dưới 15 triệu", "Điện thoại OPPO RAM 8GB"]
+
+
+def child(warmup: bool, fake: bool):
+    timings = {}
+    started = time.perf_counter()
+    import chatbot
+    import resources
+    timings["import_s"] = time.perf_counter() - started
+
+    kwargs = {}
+    if fake:
+        from fakes import FakeChatModel, FakeVectorStore
+        kwargs = {"llm": FakeChatModel(), "filter_llm": FakeChatModel(), "store": FakeVectorStore.from_csv("product_data.csv")}
+
+    if warmup and not fake:
+        started = time.perf_counter()
+        resources.start_warmup().join()
+        timings["warmup_s"] = time.perf_counter() - started
+
+    # Hai câu hỏi khác nhau để lần thứ hai không trúng answer cache
+    for name, query in zip(("first_request_s", "second_request_s"), QUERIES):
+        started = time.perf_counter()
+        for _ in chatbot.stream_shop_chatbot(query, **kwargs):
+            pass
+        timings[name] = time.perf_counter() - started
+
+    timings["resources"] = resources.init_seconds
+    print("BENCH " + json.dumps(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--no-warmup", action="store_true")
+    parser.add_argument("--fake", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(warmup=not args.no_warmup, fake=args.fake)
+        return
+
+    runs = []
+    for i in range(args.runs):
+        cmd = [sys.executable, __file__, "--child"] + (["--no-warmup"] if args.no_warmup else []) \
+            + (["--fake"] if args.fake else [])
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        line = next(l for l in out.splitlines() if l.startswith("BENCH "))
+        runs.append(json.loads(line[len("BENCH "):]))
+        print(f"run {i + 1}: " + ", ".join(f"{k}={v:.3f}" for k, v in runs[-1].items() if k != "resources"))
+
+    print(f"📊 median over {len(runs)} runs:")
+    for key in [k for k in runs[0] if k != "resources"]:
+        print(f"  {key:>17}: {statistics.median(r[key] for r in runs):.3f}s")
+    for name in runs[-1]["resources"]:
+        print(f"  {'init ' + name:>17}: {statistics.median(r['resources'].get(name, 0) for r in runs):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
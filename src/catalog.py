@@ -0,0 +1,283 @@
+import math
+import re
+from functools import lru_cache
+
+
+def _clean_str(value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value).strip()
+
+
+def _to_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+# filter key -> metadata field, so sánh ">=" (bộ lọc thông số dạng số)
+NUMERIC_SPECS = {
+    "memory_min_gb": "MemoryGB",
+    "battery_min_mah": "BatteryMah",
+    "refresh_min_hz": "RefreshHz",
+}
+
+_MEMORY_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(GB|TB)", re.I)
+_MAH_RE = re.compile(r"(\d+)\s*mAh", re.I)
+_HZ_RE = re.compile(r"(\d+)\s*Hz", re.I)
+
+
+def memory_gb(memory):
+    m = _MEMORY_RE.search(_clean_str(memory))
+    if not m:
+        return None
+    return float(m.group(1)) * (1024 if m.group(2).upper() == "TB" else 1)
+
+
+def numeric_specs(memory, attributes) -> dict:
+    """MemoryGB / BatteryMah / RefreshHz parsed from the memory name and attributes (missing ones omitted)."""
+    attributes = attributes if isinstance(attributes, dict) else parse_attributes(attributes)
+    battery = [int(x) for k, v in attributes.items() if "bat" in k.lower() for x in _MAH_RE.findall(v)]
+    refresh = [int(x) for v in attributes.values() for x in _HZ_RE.findall(v)]
+    specs = {"MemoryGB": memory_gb(memory),
+             "BatteryMah": float(max(battery)) if battery else None,
+             "RefreshHz": float(max(refresh)) if refresh else None}
+    return {k: v for k, v in specs.items() if v is not None}
+
+
+def typed_metadata(name, color, memory, price, status, attributes, **extra) -> dict:
+    """Vector metadata with typed fields so the store can filter before scoring.
+
+    Price is numeric, Status/ColorKey/MemoryKey are normalized keywords; the
+    display fields keep their original spelling for the prompt.
+    """
+    color = _clean_str(color)
+    memory = _clean_str(memory)
+    metadata = {
+        "ProductName": _clean_str(name),
+        "Color": color,
+        "ColorKey": color.lower(),
+        "Memory": memory,
+        "MemoryKey": memory.upper(),
+        "Status": _clean_str(status).upper(),
+        "Attributes": _clean_str(attributes),
+    }
+    price = _to_float(price)
+    if price is not None:
+        metadata["Price"] = price
+    for key, value in extra.items():
+        metadata[key] = value if isinstance(value, (int, float, bool)) else _clean_str(value)
+    return metadata
+
+
+def build_metadata_filter(filters: dict):
+    """Translate extracted filters into a Chroma `where` / Pinecone `filter` dict.
+
+    Both stores accept the same operator syntax. Attributes are substring
+    matches, which neither store supports, so they stay in matches_filters.
+    """
+    clauses = []
+    if filters.get("price_min"):
+        clauses.append({"Price": {"$gte": float(filters["price_min"])}})
+    if filters.get("price_max"):
+        clauses.append({"Price": {"$lte": float(filters["price_max"])}})
+    if filters.get("colors"):
+        clauses.append({"ColorKey": {"$in": [c.strip().lower() for c in filters["colors"]]}})
+    if filters.get("memories"):
+        clauses.append({"MemoryKey": {"$in": [m.strip().upper() for m in filters["memories"]]}})
+    if filters.get("status"):
+        clauses.append({"Status": {"$eq": filters["status"].upper()}})
+    for key, field in NUMERIC_SPECS.items():
+        if filters.get(key):
+            clauses.append({field: {"$gte": float(filters[key])}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def build_product_filter(filters: dict):
+    """Store filter for product-level documents (build_product_documents).
+
+    A product document only carries price / spec ranges over its variants, so
+    this keeps products where *some* variant may match; colors, memories and
+    status are checked on the variant rows after expansion.
+    """
+    clauses = []
+    if filters.get("price_min"):
+        clauses.append({"PriceMax": {"$gte": float(filters["price_min"])}})
+    if filters.get("price_max"):
+        clauses.append({"PriceMin": {"$lte": float(filters["price_max"])}})
+    for key, field in NUMERIC_SPECS.items():
+        if filters.get(key):
+            clauses.append({field: {"$gte": float(filters[key])}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def _spec_ok(m: dict, filters: dict) -> bool:
+    wanted = {field: filters[key] for key, field in NUMERIC_SPECS.items() if filters.get(key)}
+    if not wanted:
+        return True
+    specs = {f: m.get(f) for f in wanted}
+    if any(v is None for v in specs.values()):
+        # Metadata cũ (trước khi có các cột số) thì tính lại từ Memory / Attributes
+        specs = numeric_specs(m.get("Memory"), m.get("Attributes"))
+    return all(specs.get(f) is not None and specs[f] >= v for f, v in wanted.items())
+
+
+def matches_filters(m: dict, filters: dict) -> bool:
+    price = _to_float(m.get("Price"))
+    color = _clean_str(m.get("Color")).lower()
+    mem = _clean_str(m.get("Memory")).upper()
+    status = _clean_str(m.get("Status")).upper()
+    searchable = f"{_clean_str(m.get('ProductName'))} {_clean_str(m.get('Attributes'))}".lower()
+
+    return (
+        (not filters.get("price_min") or (price is not None and price >= filters["price_min"])) and
+        (not filters.get("price_max") or (price is not None and price <= filters["price_max"])) and
+        (not filters.get("colors") or any(c.lower() in color for c in filters["colors"])) and
+        (not filters.get("memories") or mem in [x.upper() for x in filters["memories"]]) and
+        (not filters.get("status") or status == filters["status"].upper()) and
+        (not filters.get("attributes") or any(a.lower() in searchable for a in filters["attributes"])) and
+        _spec_ok(m, filters)
+    )
+
+
+_OPS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+def evaluate_where(m: dict, where) -> bool:
+    """Evaluate a build_metadata_filter dict against one metadata dict (for in-process stores)."""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(evaluate_where(m, clause) for clause in where["$and"])
+    if "$or" in where:
+        return any(evaluate_where(m, clause) for clause in where["$or"])
+    for key, cond in where.items():
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        if not all(_OPS[op](m.get(key), value) for op, value in cond.items()):
+            return False
+    return True
+
+
+def detail_id(value) -> dict:
+    """{"DetailId": ...} for a product_variant_detail_id (the stable row key), {} when missing."""
+    value = _clean_str(value)
+    return {"DetailId": value} if value else {}
+
+
+def build_documents(df):
+    """Document text + typed metadata for every catalog row (built column-wise).
+
+    Price and stock stay out of the text (they change daily and would force a
+    re-embed); they are metadata only and refreshed by overlay.PriceOverlay.
+    """
+    def col(name):
+        return df[name].astype(object).where(df[name].notna(), "").astype(str)
+
+    text = (
+        col('product_variant_name') + ". Màu: " + col('color_name')
+        + ". RAM: " + col('memory_name') + ". Thuộc tính: " + col('attributes')
+    ).tolist()
+
+    records = df[['product_variant_name', 'color_name', 'memory_name', 'price',
+                  'product_variant_status', 'attributes']].to_dict('records')
+    detail_ids = col('product_variant_detail_id').tolist() if 'product_variant_detail_id' in df else [""] * len(df)
+    metadatas = [
+        typed_metadata(r['product_variant_name'], r['color_name'], r['memory_name'], r['price'],
+                       r['product_variant_status'], r['attributes'], text=t,
+                       **detail_id(d), **numeric_specs(r['memory_name'], r['attributes']))
+        for r, t, d in zip(records, text, detail_ids)
+    ]
+    return text, metadatas
+
+
+def build_product_documents(df):
+    """One document per product variant + its variant-detail rows.
+
+    The text is name, description and attributes (no color / memory / price);
+    the metadata has PriceMin / PriceMax and the largest numeric specs so the
+    store can still pre-filter. Returns (texts, metadatas, variants) where
+    variants maps VariantId -> the build_documents metadata of each row.
+    """
+    _, details = build_documents(df)
+    ids = df['product_variant_id'].astype(object).where(df['product_variant_id'].notna(), None).tolist()
+    descriptions = df['product_variant_description'].tolist() if 'product_variant_description' in df else [""] * len(df)
+
+    variants, description_of = {}, {}
+    for variant_id, description, m in zip(ids, descriptions, details):
+        if not m["ProductName"]:
+            continue
+        key = _clean_str(variant_id) or m["ProductName"]
+        variants.setdefault(key, []).append(m)
+        description_of.setdefault(key, _clean_str(description))
+
+    texts, metadatas = [], []
+    for key, rows in variants.items():
+        name = rows[0]["ProductName"]
+        # Thuộc tính bị lặp do JOIN: chỉ nhúng mỗi thuộc tính một lần
+        parsed = parse_attributes(rows[0]["Attributes"])
+        attributes = "; ".join(f"{k}: {v}" for k, v in parsed.items()) if parsed else rows[0]["Attributes"]
+        description = description_of[key]
+        parts = [name] + ([description] if description and description != name else [])
+        text = ". ".join(parts) + f". Thuộc tính: {attributes}"
+        prices = [m["Price"] for m in rows if "Price" in m]
+        metadata = {"ProductName": name, "VariantId": key, "Attributes": attributes, "Variants": len(rows), "text": text}
+        if prices:
+            metadata.update(PriceMin=min(prices), PriceMax=max(prices))
+        for field in NUMERIC_SPECS.values():
+            values = [m[field] for m in rows if field in m]
+            if values:
+                metadata[field] = max(values)
+        texts.append(text)
+        metadatas.append(metadata)
+    return texts, metadatas, variants
+
+
+def parse_attributes(attributes) -> dict:
+    """'Screen type: OLED; Batery: 5000 mAh; ...' -> {'Screen type': 'OLED', ...} (duplicates dropped).
+
+    Also accepts the ", "-joined form written by pinecone_sync.py; pieces
+    without a "key:" belong to the previous value. Results are cached per
+    string since the same attributes come back on every query.
+    """
+    if not isinstance(attributes, str):
+        return {}
+    return dict(_parse_attributes(attributes))
+
+
+@lru_cache(maxsize=4096)
+def _parse_attributes(attributes: str) -> tuple:
+    parsed = {}
+    key = None
+    for item in re.split(r"[;,]", attributes):
+        if ":" in item:
+            key, value = item.split(":", 1)
+            key = key.strip()
+            if key in parsed:
+                key = None  # thuộc tính lặp lại do JOIN
+                continue
+            parsed[key] = value.strip()
+        elif key is not None and item.strip():
+            parsed[key] += ", " + item.strip()
+    return tuple(parsed.items())
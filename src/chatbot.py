@@ -1,8 +1,217 @@
-from database import search_product_context
-from ai_function import shopbot_ai
-
-def shop_chatbot(user_query: str) -> str:
-    context = search_product_context(user_query)
-    print("Context: ", context)
-    answer = shopbot_ai(user_query=user_query, context=context)
-    return answer
+import asyncio
+import time
+
+from langchain_core.documents import Document
+
+import resources
+import telemetry
+from telemetry import span, traced
+from database import extract_filters, retrieve_products_by_vector
+from context_builder import build_context
+from ai_function import shopbot_ai, astream_shopbot_ai
+from answer_cache import SemanticAnswerCache
+from conversation import ConversationState
+from filter_parser import parse_filters
+from llm_gateway import GatewayOverloaded
+from overlay import price_snapshot
+from structured_answers import STRUCTURED_ANSWERS, answer_structured
+
+# Trả cho người dùng khi LLMGateway từ chối (hàng đợi đầy) hoặc quá thời gian
+BUSY_MESSAGE = "Hệ thống đang bận, bạn vui lòng thử lại sau ít phút nhé."
+
+answer_cache = SemanticAnswerCache()
+telemetry.register_gauge("answer_cache_hit_ratio", lambda: {(): answer_cache.metrics()["hit_rate"]})
+telemetry.register_gauge("answer_cache_entries", lambda: {(): answer_cache.metrics()["entries"]})
+telemetry.register_buckets("context_tokens", (250, 500, 1000, 2000, 4000, 8000))
+
+
+def _product_names(results) -> list:
+    return list(dict.fromkeys(doc.metadata.get('ProductName', '') for doc in results))
+
+
+def _record_context(context):
+    telemetry.incr("context_tokens_total", context.tokens)
+    telemetry.incr("context_tokens_saved_total", context.saved_tokens)
+    telemetry.observe("context_tokens", context.tokens)
+    telemetry.log("context", tokens=context.tokens, saved=context.saved_tokens,
+                  products=context.products, dropped=context.dropped)
+
+
+def _lookup(cache, vector, filters, trace_id=None):
+    # Câu trả lời cache chứa giá: chỉ dùng khi giá / tồn kho các dòng đó chưa đổi
+    overlay = resources.price_overlay()
+    with span("cache_lookup", trace_id=trace_id):
+        cached = cache.lookup_entry(vector, filters, fresh=overlay.unchanged if overlay is not None else None)
+    telemetry.incr("answer_cache_lookups_total", result="hit" if cached is not None else "miss")
+    return cached
+
+
+# Answer cache dùng chung giữa các phiên nên chỉ chứa câu trả lời không phụ thuộc hội thoại:
+# câu hỏi nối tiếp không tra cache, câu trả lời sinh ra có lịch sử không được lưu
+def _cacheable(state, user_query) -> bool:
+    return not state.follows_up(user_query)
+
+
+def _end_turn(state, user_query, results):
+    if state is not None:
+        state.results = results
+        state.add_turn(user_query, _product_names(results))
+
+
+def _structured(user_query, state, trace_id=None):
+    """Catalog answer for a fully structured question (no retrieval, no LLM), else None."""
+    if not STRUCTURED_ANSWERS or state.follows_up(user_query):
+        return None
+    with span("structured", trace_id=trace_id):
+        parsed = parse_filters(user_query)
+        structured = answer_structured(user_query, parsed)
+    telemetry.incr("structured_answers_total", result=structured.intent if structured else "llm")
+    if structured is None:
+        return None
+    state.resolve(user_query, parsed.filters)
+    state.results = [Document(page_content=m.get("text", ""), metadata=m) for m in structured.metadatas]
+    state.add_turn(user_query, structured.products)
+    return structured.text
+
+
+def _busy(error) -> str:
+    telemetry.incr("busy_answers_total", error=type(error).__name__)
+    telemetry.log("llm_busy", error=str(error))
+    return BUSY_MESSAGE
+
+
+def shop_chatbot(user_query: str, state: ConversationState = None) -> str:
+    """Answer one message. With `state` (one per chat session), follow-ups reuse
+    the previous filters / results and the LLM sees the summarized history."""
+    try:
+        return _shop_chatbot(user_query, state if state is not None else ConversationState())
+    except GatewayOverloaded as e:
+        return _busy(e)
+
+
+def _shop_chatbot(user_query: str, state: ConversationState) -> str:
+    history, search_query = state.history(), state.search_query(user_query)
+    cacheable = _cacheable(state, user_query)
+    with span("request"):
+        structured = _structured(user_query, state)
+        if structured is not None:
+            return structured
+        with span("filters"):
+            filters, results = state.resolve(user_query, extract_filters(user_query))
+        telemetry.incr("conversation_retrievals_total", result="reused" if results is not None else "search")
+
+        vector, started = None, time.perf_counter()
+        if results is None:
+            with span("embed"):
+                vector = resources.vectorstore().embeddings.embed_query(search_query)
+            cached = _lookup(answer_cache, vector, filters) if cacheable else None
+            if cached is not None:
+                _end_turn(state, user_query, cached["documents"])
+                return cached["answer"]
+
+            started = time.perf_counter()
+            with span("search"):
+                results = retrieve_products_by_vector(vector, filters, query=search_query)
+        with span("context"):
+            context = build_context(results, filters, reviews=resources.review_snippets())
+        _record_context(context)
+        with span("generation"):
+            answer = shopbot_ai(user_query=user_query, context=context.text, history=history)
+        _end_turn(state, user_query, results)
+        if vector is not None and cacheable and not history:
+            answer_cache.store(vector, filters, answer, products=_product_names(results),
+                               latency=time.perf_counter() - started, prices=price_snapshot(results),
+                               documents=results)
+        return answer
+
+
+async def shop_chatbot_async(user_query: str, llm=None, filter_llm=None, store=None, cache=None,
+                             state: ConversationState = None):
+    """Async shop_chatbot that yields answer tokens as they arrive.
+
+    Filter extraction and query embedding run concurrently; the filtered
+    vector search starts as soon as both are done. `llm`, `filter_llm` and
+    `store` default to the real clients and can be swapped for fakes.
+    A follow-up that may reuse the previous results (see `state`) extracts
+    filters first and only embeds when it has to search again.
+    When the LLM gateway is overloaded or times out, BUSY_MESSAGE is yielded instead.
+    """
+    answered = False
+    try:
+        async for token in _shop_chatbot_async(user_query, llm, filter_llm, store, cache, state):
+            answered = True
+            yield token
+    except GatewayOverloaded as e:
+        yield ("\n\n" if answered else "") + _busy(e)
+
+
+async def _shop_chatbot_async(user_query, llm, filter_llm, store, cache, state):
+    store = store or resources.vectorstore()
+    cache = cache or answer_cache
+    state = state if state is not None else ConversationState()
+    history, search_query = state.history(), state.search_query(user_query)
+    cacheable = _cacheable(state, user_query)
+    started = time.perf_counter()
+    trace_id = telemetry.new_trace_id()
+    structured = _structured(user_query, state, trace_id)
+    if structured is not None:
+        telemetry.observe("stage_seconds", time.perf_counter() - started, stage="request")
+        yield structured
+        return
+    extract = asyncio.to_thread(traced("filters", extract_filters, trace_id), user_query, filter_llm)
+    embed = traced("embed", store.embeddings.embed_query, trace_id)
+
+    vector, results = None, None
+    if state.results and state.follows_up(user_query):
+        filters, results = state.resolve(user_query, await extract)
+        if results is None:
+            vector = await asyncio.to_thread(embed, search_query)
+    else:
+        filters, vector = await asyncio.gather(extract, asyncio.to_thread(embed, search_query))
+        filters, _ = state.resolve(user_query, filters)
+    telemetry.incr("conversation_retrievals_total", result="reused" if results is not None else "search")
+
+    if results is None:
+        cached = _lookup(cache, vector, filters, trace_id) if cacheable else None
+        if cached is not None:
+            _end_turn(state, user_query, cached["documents"])
+            telemetry.observe("stage_seconds", time.perf_counter() - started, stage="request")
+            yield cached["answer"]
+            return
+
+        results = await asyncio.to_thread(traced("search", retrieve_products_by_vector, trace_id), vector,
+                                          filters, store=store, query=search_query)
+    with span("context", trace_id=trace_id):
+        context = build_context(results, filters, reviews=resources.review_snippets())
+    _record_context(context)
+
+    # Không mở span qua các lần yield: mỗi token có thể chạy trong một Task (context) khác
+    generation_started = time.perf_counter()
+    first, parts = True, []
+    async for token in astream_shopbot_ai(user_query, context.text, llm_client=llm, history=history):
+        if first:
+            telemetry.observe("time_to_first_token_seconds", time.perf_counter() - started)
+            first = False
+        parts.append(token)
+        yield token
+    telemetry.observe("stage_seconds", time.perf_counter() - generation_started, stage="generation")
+    telemetry.observe("stage_seconds", time.perf_counter() - started, stage="request")
+    _end_turn(state, user_query, results)
+    if vector is not None and cacheable and not history:
+        cache.store(vector, filters, "".join(parts), products=_product_names(results),
+                    latency=time.perf_counter() - started, prices=price_snapshot(results), documents=results)
+
+
+def stream_shop_chatbot(user_query: str, **kwargs):
+    """Sync generator over shop_chatbot_async (for st.write_stream)."""
+    loop = asyncio.new_event_loop()
+    tokens = shop_chatbot_async(user_query, **kwargs)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(tokens.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(tokens.aclose())
+        loop.close()
@@ -1,48 +1,275 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
 import pandas as pd
-from langchain.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 import chromadb
+from catalog import build_documents, build_product_documents
+from snapshot import load_documents, read_table
+from embedding_cache import EmbeddingCache
+from answer_cache import publish_invalidation
+from lexical_index import BM25Index, LEXICAL_INDEX_PATH
+from variant_table import INDEX_LEVEL, VARIANT_TABLE_PATH, VariantTable
+from collection_alias import (COLLECTION_NAME, KEEP_VERSIONS, PRODUCT_COLLECTION_NAME, artifact_path, resolve,
+                              stale_versions, swap, versioned_name)
 
 csv_path = "product_data.csv"
+MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+CHECKPOINT_PATH = "chroma_sync.checkpoint.json"
+
+_worker_model = None
+
+
+def synthetic_catalog(df: pd.DataFrame, scale: int) -> pd.DataFrame:
+    """Repeat the catalog `scale` times with distinct names (for throughput tests)."""
+    copies = []
+    for i in range(scale):
+        copy = df.copy()
+        if i:
+            copy['product_variant_name'] = copy['product_variant_name'].astype(str) + f" #{i}"
+            copy['product_variant_id'] = copy['product_variant_id'].astype(str) + f"#{i}"
+            copy['product_variant_detail_id'] = copy['product_variant_detail_id'].astype(str) + f"#{i}"
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def _init_worker(model_name: str, threads: int):
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode(texts, batch_size: int):
+    return np.asarray(_worker_model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+def _source_hash(texts, metadatas) -> str:
+    # Giá / tồn kho chỉ nằm trong metadata, không còn trong text: đổi giá cũng phải ghi lại chunk
+    digest = hashlib.sha256()
+    for text, metadata in zip(texts, metadatas):
+        digest.update(text.encode("utf-8") + b"\0")
+        digest.update(json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def document_ids(texts, metadatas) -> list:
+    """Stable ids: the variant-detail id, the VariantId of a product document, else a hash of the text."""
+    return [m.get("DetailId") or m.get("VariantId") or "sha-" + hashlib.sha256(t.encode("utf-8")).hexdigest()[:32]
+            for t, m in zip(texts, metadatas)]
+
+
+def unique_documents(texts, metadatas):
+    """(texts, metadatas, ids) with one entry per id; JOIN duplicates keep the last row."""
+    last = {doc_id: i for i, doc_id in enumerate(document_ids(texts, metadatas))}
+    rows = sorted(last.values())
+    return [texts[i] for i in rows], [metadatas[i] for i in rows], list(last)
+
+
+def load_checkpoint(path: str, source: str, chunk_size: int, collection: str = None) -> set:
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    if (state.get("source") != source or state.get("chunk_size") != chunk_size
+            or state.get("collection", collection) != collection):
+        print("⚠️ Checkpoint is for another catalog or collection, starting over")
+        return set()
+    return set(state["done"])
+
+
+def save_checkpoint(path: str, source: str, chunk_size: int, done: set, collection: str = None):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"source": source, "chunk_size": chunk_size, "collection": collection, "done": sorted(done)}, f)
+    os.replace(tmp, path)
+
+
+def pending_rebuild(path: str, alias: str):
+    """Versioned collection of an interrupted --rebuild of `alias`, to resume instead of starting a new one."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        name = json.load(f).get("collection") or ""
+    return name if name.startswith(alias + "__v") and name != resolve(alias) else None
+
+
+def ingest(texts, metadatas, collection, workers: int = 1, chunk_size: int = 512, batch_size: int = 64,
+           write_batch: int = 5000, checkpoint_path: str = CHECKPOINT_PATH, cache: EmbeddingCache = None,
+           ids=None):
+    """Pipelined ingest: build text -> encode in a process pool -> upsert into Chroma.
+
+    Chunks are encoded concurrently (at most 2 per worker in flight) and each
+    chunk is recorded in the checkpoint once written, so a restart skips it.
+    Rows are upserted under `ids` (document_ids by default), so a re-run
+    overwrites instead of appending another copy.
+    """
+    ids = ids or document_ids(texts, metadatas)
+    source = _source_hash(texts, metadatas)
+    done = load_checkpoint(checkpoint_path, source, chunk_size, collection.name)
+    chunks = [i for i in range(0, len(texts), chunk_size) if i not in done]
+    write_limit = min(chunk_size, write_batch)
+
+    def write(start, vectors):
+        end = start + chunk_size
+        for i in range(start, min(end, len(texts)), write_limit):
+            j = min(i + write_limit, end, len(texts))
+            collection.upsert(
+                ids=ids[i:j],
+                embeddings=vectors[i - start:j - start].tolist(),
+                metadatas=metadatas[i:j],
+                documents=texts[i:j],
+            )
+        done.add(start)
+        save_checkpoint(checkpoint_path, source, chunk_size, done, collection.name)
+
+    def cached_or_none(start):
+        if cache is None:
+            return None
+        hits = cache.get_many(MODEL_NAME, texts[start:start + chunk_size])
+        return np.stack(hits) if all(h is not None for h in hits) else None
+
+    started = time.perf_counter()
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    if workers <= 1:
+        for start in chunks:
+            vectors = cached_or_none(start)
+            if vectors is None:
+                if _worker_model is None:
+                    _init_worker(MODEL_NAME, threads)
+                vectors = _encode(texts[start:start + chunk_size], batch_size)
+                if cache is not None:
+                    cache.put_many(MODEL_NAME, texts[start:start + chunk_size], vectors)
+            write(start, vectors)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(MODEL_NAME, threads)) as pool:
+            pending, queue = {}, list(chunks)
+            while queue or pending:
+                while queue and len(pending) < workers * 2:
+                    start = queue.pop(0)
+                    vectors = cached_or_none(start)
+                    if vectors is not None:
+                        write(start, vectors)
+                        continue
+                    pending[pool.submit(_encode, texts[start:start + chunk_size], batch_size)] = start
+                if not pending:
+                    continue
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    start = pending.pop(future)
+                    vectors = future.result()
+                    if cache is not None:
+                        cache.put_many(MODEL_NAME, texts[start:start + chunk_size], vectors)
+                    write(start, vectors)
+
+    elapsed = time.perf_counter() - started
+    rows = sum(min(chunk_size, len(texts) - s) for s in chunks)
+    print(f"⏱️ {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s, {workers} workers)")
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+
+def prune_stale(collection, ids, batch: int = 5000) -> int:
+    """Delete rows whose id is no longer in the catalog (and legacy random-id rows)."""
+    keep = set(ids)
+    stale = [i for i in collection.get(include=[])["ids"] if i not in keep]
+    for start in range(0, len(stale), batch):
+        collection.delete(ids=stale[start:start + batch])
+    return len(stale)
+
+
+def collection_names(client) -> list:
+    # chromadb < 0.6 trả về Collection, bản mới trả về tên
+    return [getattr(c, "name", c) for c in client.list_collections()]
+
+
+def gc_versions(client, alias: str, keep: int = KEEP_VERSIONS) -> list:
+    dropped = stale_versions(collection_names(client), alias, keep=keep)
+    for name in dropped:
+        client.delete_collection(name)
+        for path in (VARIANT_TABLE_PATH, LEXICAL_INDEX_PATH):
+            if artifact_path(path, name) != path and os.path.exists(artifact_path(path, name)):
+                os.remove(artifact_path(path, name))
+    return dropped
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default=csv_path, help="CSV, Parquet export or Arrow snapshot (snapshot.py)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--chunk-size", type=int, default=512, help="rows per encode task / checkpoint unit")
+    parser.add_argument("--batch-size", type=int, default=64, help="sentence-transformers encode batch size")
+    parser.add_argument("--scale", type=int, default=1, help="replicate the catalog N times (benchmark)")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--level", choices=["variant", "product"], default=INDEX_LEVEL,
+                        help="one document per variant-detail row, or per product variant + side table")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="build a new versioned collection, then switch the alias to it")
+    parser.add_argument("--keep", type=int, default=KEEP_VERSIONS, help="old versions kept after a rebuild")
+    args = parser.parse_args()
+
+    chroma_client = chromadb.PersistentClient(path="./chroma_db")
+    alias = PRODUCT_COLLECTION_NAME if args.level == "product" else COLLECTION_NAME
+    if args.rebuild:
+        # Truy vấn vẫn đọc collection cũ cho đến khi đổi alias
+        name = pending_rebuild(CHECKPOINT_PATH, alias) or versioned_name(alias)
+    else:
+        name = resolve(alias)
+    collection = chroma_client.get_or_create_collection(name=name, embedding_function=None)
+    print(f"🗂️ Collection {name} (alias {alias})")
+
+    print("✨ Loading product data...")
+    variants = None
+    if args.level == "product":
+        df = read_table(args.csv)
+        texts, metadatas, variants = build_product_documents(synthetic_catalog(df, args.scale) if args.scale > 1 else df)
+        print(f"🧩 {len(texts)} product documents for {sum(len(v) for v in variants.values())} variant rows")
+    elif args.scale > 1:
+        df = read_table(args.csv)
+        texts, metadatas = build_documents(synthetic_catalog(df, args.scale))
+    else:
+        # snapshot: text và metadata đã tính sẵn, đọc qua memory map
+        texts, metadatas = load_documents(args.csv)
+    texts, metadatas, ids = unique_documents(texts, metadatas)
+
+    print("📊 Embedding and indexing...")
+    cache = None if args.no_cache else EmbeddingCache()
+    ingest(texts, metadatas, collection, workers=args.workers, chunk_size=args.chunk_size, batch_size=args.batch_size,
+           write_batch=chroma_client.get_max_batch_size(), cache=cache, ids=ids)
+
+    if args.rebuild:
+        if collection.count() != len(ids):
+            raise RuntimeError(f"{name} has {collection.count()} rows, expected {len(ids)}; alias not switched")
+    else:
+        print(f"🧹 Removed {prune_stale(collection, ids)} stale rows")
+
+    # Bảng biến thể và BM25 thuộc về đúng phiên bản collection; ghi xong cả hai rồi mới đổi alias
+    print("🔤 Building lexical index...")
+    if variants is not None:
+        VariantTable(variants).save(artifact_path(VARIANT_TABLE_PATH, name))
+    BM25Index(metadatas, texts).save(artifact_path(LEXICAL_INDEX_PATH, name))
+
+    if args.rebuild:
+        previous = swap(alias, name)
+        print(f"🔀 {alias}: {previous} -> {name}")
+        for dropped in gc_versions(chroma_client, alias, keep=args.keep):
+            print(f"🗑️ Dropped old collection {dropped}")
+
+    publish_invalidation(flush_all=True)
+    if cache is not None:
+        print(f"🗃️ Embedding cache: {cache.stats()}")
+    print("✅ Done syncing to ChromaDB!")
+
 
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
-
-vectorstore = Chroma(
-    collection_name="products",
-    embedding_function=embedding_model,
-    client=chroma_client
-)
-
-print("✨ Loading product data...")
-df = pd.read_csv(csv_path)
-
-print("📊 Embedding and indexing...")
-documents, metadatas = [], []
-for _, row in df.iterrows():
-    name = row['product_variant_name']
-    color = row['color_name']
-    memory = row['memory_name']
-    price = row.get('price', 'Không rõ')
-    status = row['product_variant_status']
-    attributes = row['attributes']
-
-    text = f"{name}. Màu: {color}. RAM: {memory}. Giá: {price}. Trạng thái: {status}. Thuộc tính: {attributes}"
-    documents.append(text)
-    metadatas.append({
-        "ProductName": name,
-        "Color": color,
-        "Memory": memory,
-        "Price": price,
-        "Status": status,
-        "Attributes": attributes,
-        "text": text
-    })
-
-vectorstore.add_texts(texts=documents, metadatas=metadatas)
-
-
-print("✅ Done syncing to ChromaDB!")
+if __name__ == "__main__":
+    main()
 
 # import pandas as pd
 # from langchain.vectorstores import Chroma
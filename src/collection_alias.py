@@ -0,0 +1,126 @@
+"""Alias file for blue/green Chroma collections.
+
+    resolve("products")                      # -> "products__v20261018093000" (or "products")
+    swap("products", "products__v20261018101500")
+
+chroma_sync.py --rebuild fills a new versioned collection, then points the
+alias at it with one atomic file replace; readers (resources.vectorstore)
+notice the new file and reopen the store, so a query never sees a half-built
+collection. Collections without an alias entry are used under their own name.
+
+Side files built with a collection (variant table, BM25 index) are written
+next to it under artifact_path() before the swap, and read through
+AliasedArtifact, so they switch together with the collection.
+"""
+import json
+import os
+import threading
+import time
+
+COLLECTION_NAME = "products"
+# Index theo sản phẩm (INDEX_LEVEL=product) dùng collection riêng
+PRODUCT_COLLECTION_NAME = "product_variants"
+ALIAS_PATH = os.getenv("CHROMA_ALIAS_PATH", os.path.join("chroma_db", "aliases.json"))
+# Số phiên bản cũ giữ lại sau khi đổi alias (cho truy vấn đang chạy và để quay lại)
+KEEP_VERSIONS = int(os.getenv("CHROMA_KEEP_VERSIONS", "1"))
+
+
+def read_aliases(path: str = ALIAS_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve(alias: str, path: str = ALIAS_PATH) -> str:
+    return read_aliases(path).get(alias, alias)
+
+
+def alias_stamp(path: str = ALIAS_PATH):
+    """Changes whenever the alias file is replaced (None while there is none)."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def versioned_name(alias: str) -> str:
+    return f"{alias}__v{time.strftime('%Y%m%d%H%M%S')}"
+
+
+def is_version_of(name: str, alias: str) -> bool:
+    return name == alias or name.startswith(alias + "__v")
+
+
+def swap(alias: str, name: str, path: str = ALIAS_PATH) -> str:
+    """Point `alias` at `name` atomically; returns the previous target."""
+    aliases = read_aliases(path)
+    previous = aliases.get(alias, alias)
+    aliases[alias] = name
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(aliases, f, indent=2)
+    os.replace(tmp_path, path)
+    return previous
+
+
+def artifact_path(path: str, name: str) -> str:
+    """Side file of collection `name`: variant_table.json.gz -> variant_table.products__v2026....json.gz
+    (collections without a version suffix keep the plain path)."""
+    if "__v" not in name:
+        return path
+    directory, base = os.path.split(path)
+    stem, dot, ext = base.partition(".")
+    return os.path.join(directory, f"{stem}.{name}.{ext}" if dot else f"{base}.{name}")
+
+
+def _mtime(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class AliasedArtifact:
+    """Side file of the collection `alias` points at, loaded with `load(path)`
+    and reloaded when the alias is swapped or the file is rewritten (None while missing)."""
+
+    def __init__(self, alias: str, path: str, load, alias_path: str = ALIAS_PATH):
+        self.alias = alias
+        self.path = path
+        self.load = load
+        self.alias_path = alias_path
+        self._lock = threading.Lock()
+        self._alias_stamp = self._stamp = object()
+        self._file = path
+        self._value = None
+        self._pinned = False
+
+    def pin(self, value):
+        """Serve `value` from now on (benchmarks / tests without files on disk)."""
+        with self._lock:
+            self._value, self._pinned = value, True
+
+    def get(self):
+        if self._pinned:
+            return self._value
+        with self._lock:
+            stamp = alias_stamp(self.alias_path)
+            if stamp != self._alias_stamp:
+                self._file = artifact_path(self.path, resolve(self.alias, self.alias_path))
+                self._alias_stamp = stamp
+            current = (self._file, _mtime(self._file))
+            if current != self._stamp:
+                self._value = self.load(self._file) if current[1] is not None else None
+                self._stamp = current
+            return self._value
+
+
+def stale_versions(names, alias: str, path: str = ALIAS_PATH, keep: int = KEEP_VERSIONS) -> list:
+    """Versions of `alias` that can be dropped: all but the current one and the `keep` newest others."""
+    current = resolve(alias, path)
+    # Collection gốc không có hậu tố phiên bản được coi là cũ nhất
+    others = sorted((n for n in names if is_version_of(n, alias) and n != current),
+                    key=lambda n: (n != alias, n), reverse=True)
+    return others[keep:]
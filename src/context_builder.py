@@ -0,0 +1,186 @@
+import os
+import re
+from dataclasses import dataclass
+
+from catalog import parse_attributes
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+# Số thuộc tính giữ lại cho mỗi sản phẩm khi người dùng không hỏi thuộc tính cụ thể
+DEFAULT_ATTRIBUTES = int(os.getenv("CONTEXT_DEFAULT_ATTRIBUTES", "3"))
+
+
+@dataclass
+class ContextResult:
+    text: str
+    tokens: int
+    baseline_tokens: int
+    products: int
+    dropped: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.baseline_tokens - self.tokens)
+
+
+def estimate_tokens(text: str) -> int:
+    # Ước lượng thô: mỗi từ / dấu câu ~ 1 token, từ dài tính thêm
+    return sum(1 + len(piece) // 6 for piece in re.findall(r"\w+|[^\w\s]", text))
+
+
+def render_full(results: list) -> str:
+    """The original one-block-per-hit rendering (every attribute of every variant)."""
+    if not results:
+        return "Không tìm thấy sản phẩm nào phù hợp."
+
+    out = []
+    for doc in results:
+        m = doc.metadata
+        name  = m.get('ProductName', '').strip()
+
+        lines = [
+            f"📦 Tên sản phẩm: {name}  \n",
+            f"🎨 Màu: {m.get('Color', 'Không rõ')}  \n",
+            f"💾 RAM: {m.get('Memory', 'Không rõ')}  \n",
+            f"💸 Giá: {m.get('Price', 'Không rõ')}  \n",
+            f"📋 Trạng thái: {m.get('Status', 'Không rõ')}  \n",
+            "⚙️ Thuộc tính khác:"
+        ]
+
+
+        attributes = m.get('Attributes')
+        if isinstance(attributes, dict):
+            attr_lines = [f"- {key}: {value}" for key, value in attributes.items()]
+        elif isinstance(attributes, str):
+            attr_lines = [f"- {item.strip()}" for item in re.split(r',|;', attributes) if ':' in item]
+        else:
+            attr_lines = []
+
+        attr_text = "  \n".join(attr_lines)
+        out.append("  \n".join(lines) + "  \n" + attr_text + "  \n---")
+
+    return "\n\n".join(out)
+
+
+def _unique(values) -> list:
+    return list(dict.fromkeys(v for v in values if v not in (None, "")))
+
+
+def group_variants(results: list) -> list:
+    """One entry per ProductName, in retrieval order, with the variant values collected.
+
+    `variants` keeps each (color, memory, price, status) combination in
+    retrieval order; the other lists are the same values collapsed.
+    """
+    groups = {}
+    for doc in results:
+        m = doc.metadata
+        name = m.get('ProductName', '').strip()
+        group = groups.setdefault(name.lower(), {"name": name, "colors": [], "memories": [], "prices": [],
+                                                 "statuses": [], "variants": [], "attributes": {}})
+        group["colors"].append(m.get('Color'))
+        group["memories"].append(m.get('Memory'))
+        group["prices"].append(m.get('Price'))
+        group["statuses"].append(m.get('Status'))
+        variant = {key: m.get(key) for key in ("Color", "Memory", "Price", "Status")}
+        if variant not in group["variants"]:
+            group["variants"].append(variant)
+        attributes = m.get('Attributes')
+        parsed = attributes if isinstance(attributes, dict) else parse_attributes(attributes)
+        for key, value in parsed.items():
+            group["attributes"].setdefault(key, value)
+
+    for group in groups.values():
+        for field in ("colors", "memories", "statuses"):
+            group[field] = _unique(group[field])
+        group["prices"] = sorted(_unique(p for p in group["prices"] if isinstance(p, (int, float))))
+    return list(groups.values())
+
+
+def relevant_attributes(attributes: dict, filters: dict = None, default: int = DEFAULT_ATTRIBUTES) -> dict:
+    """Attributes that mention a requested keyword; otherwise the first `default` ones."""
+    wanted = [a.lower() for a in (filters or {}).get("attributes") or []]
+    if wanted:
+        matched = {k: v for k, v in attributes.items()
+                   if any(w in f"{k} {v}".lower() for w in wanted)}
+        if matched:
+            return matched
+    return dict(list(attributes.items())[:default])
+
+
+def format_price(value: float) -> str:
+    return f"{value:,.0f}".replace(",", ".") + "đ"
+
+
+def render_variant(variant: dict) -> str:
+    """"Black/12GB: 30.990.000đ (AVAILABLE)" for one combination."""
+    label = "/".join(str(variant[key]) for key in ("Color", "Memory") if variant[key] not in (None, ""))
+    price = variant["Price"]
+    price = format_price(price) if isinstance(price, (int, float)) else "Không rõ"
+    status = f" ({variant['Status']})" if variant["Status"] else ""
+    return f"{label or 'Không rõ'}: {price}{status}"
+
+
+def render_group(group: dict, attributes: dict, review: str = "", combinations: bool = False) -> str:
+    """One product entry; `combinations` lists each variant with its own price instead of the collapsed values."""
+    prices = group["prices"]
+    if not prices:
+        price = "Không rõ"
+    elif prices[0] == prices[-1]:
+        price = format_price(prices[0])
+    else:
+        price = f"{format_price(prices[0])} - {format_price(prices[-1])}"
+
+    if combinations and len(group["variants"]) > 1:
+        lines = [f"📦 {group['name']}", *(f"💸 {render_variant(v)}" for v in group["variants"])]
+    else:
+        lines = [
+            f"📦 {group['name']}",
+            f"🎨 {', '.join(group['colors']) or 'Không rõ'}",
+            f"💾 {', '.join(group['memories']) or 'Không rõ'}",
+            f"💸 {price}",
+            f"📋 {', '.join(group['statuses']) or 'Không rõ'}",
+        ]
+    if attributes:
+        lines.append("⚙️ " + "; ".join(f"{k}: {v}" for k, v in attributes.items()))
+    if review:
+        lines.append(review)
+    return "\n".join(lines)
+
+
+def build_context(results: list, filters: dict = None, budget: int = CONTEXT_TOKEN_BUDGET,
+                  reviews: dict = None) -> ContextResult:
+    """Compact prompt context within `budget` tokens.
+
+    Variants of a product become one entry with one line per color / memory
+    combination and its price, attributes are trimmed to the ones the
+    filters ask about, and entries are added in retrieval order until the
+    budget is reached (the review snippet, then the per-combination lines,
+    then attributes, are dropped before a product is). `reviews` maps
+    lowercase product name -> precomputed snippet (review_digest.py).
+    """
+    # So với cách cũ: một block đầy đủ cho mỗi sản phẩm (một biến thể đại diện)
+    first_variants = {}
+    for doc in results:
+        first_variants.setdefault(doc.metadata.get('ProductName', '').strip().lower(), doc)
+    baseline = estimate_tokens(render_full(list(first_variants.values())))
+    if not results:
+        text = render_full(results)
+        return ContextResult(text, estimate_tokens(text), baseline, 0, 0)
+
+    groups = group_variants(results)
+    entries, used = [], 0
+    for group in groups:
+        attributes = relevant_attributes(group["attributes"], filters)
+        review = (reviews or {}).get(group["name"].lower(), "")
+        options = [render_group(group, attributes, review, combinations=True),
+                   render_group(group, attributes, combinations=True),
+                   render_group(group, attributes), render_group(group, {})]
+        fitting = [e for e in options if used + estimate_tokens(e) <= budget]
+        if not fitting and entries:
+            break
+        entry = fitting[0] if fitting else options[-1]  # sản phẩm đầu tiên luôn được giữ
+        entries.append(entry)
+        used += estimate_tokens(entry)
+
+    text = "\n---\n".join(entries)
+    return ContextResult(text, estimate_tokens(text), baseline, len(entries), len(groups) - len(entries))
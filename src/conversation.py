@@ -0,0 +1,128 @@
+"""Per-session conversation state for shop_chatbot.
+
+    state = ConversationState()
+    shop_chatbot("Samsung dưới 10 triệu", state=state)
+    shop_chatbot("cái màu đen thì sao?", state=state)   # filters merged, results reused
+
+Follow-up turns carry the previous filters forward. When the merged filters
+only narrow the previous ones, the earlier retrieval results are filtered
+in memory instead of searching again. History sent to the LLM is the last
+few turns (question + products shown) plus a running summary of older
+turns, clipped to HISTORY_TOKEN_BUDGET.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+
+from catalog import build_metadata_filter, evaluate_where, matches_filters, NUMERIC_SPECS
+from context_builder import estimate_tokens
+from filter_parser import empty_filters, mentions_product, normalize_query
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "300"))
+HISTORY_TURNS = int(os.getenv("HISTORY_TURNS", "3"))
+
+# Chỉ các cụm thật sự trỏ về câu trước; "còn", "cái", "này", "đó" đứng riêng quá phổ biến
+FOLLOW_UP_CUES = ["thì sao", "thi sao", "thế còn", "the con", "nó", "cái đó", "cái này", "cái kia",
+                  "con đó", "con này", "máy đó", "máy này", "mẫu đó", "mẫu này", "loại đó", "loại này",
+                  "bản đó", "bản này", "trong số", "trong đó", "kể trên", "vừa rồi", "bản nào", "loại nào",
+                  "con nào", "mẫu nào"]
+_FOLLOW_UP_RE = re.compile(r"(?<!\w)(?:" + "|".join(re.escape(c) for c in FOLLOW_UP_CUES) + r")(?!\w)")
+# "còn bản 256GB?" ở đầu câu là hỏi tiếp; "còn hàng" là trạng thái kho
+_LEADING_CON_RE = re.compile(r"^\s*(?:vậy |thế )?còn\s+(?!hàng(?!\w))")
+_LOWER_BOUNDS = ["price_min", *NUMERIC_SPECS]
+
+
+@dataclass
+class Turn:
+    query: str
+    products: list
+
+
+@dataclass
+class ConversationState:
+    filters: dict = field(default_factory=empty_filters)
+    results: list = field(default_factory=list)
+    # Câu hỏi mở đầu chủ đề hiện tại, ghép với câu hỏi tiếp theo khi phải tìm lại
+    topic: str = ""
+    turns: list = field(default_factory=list)
+    summary: str = ""
+
+    def follows_up(self, query: str) -> bool:
+        return bool(self.topic) and is_follow_up(query)
+
+    def search_query(self, query: str) -> str:
+        return f"{self.topic} {query}" if self.follows_up(query) else query
+
+    def resolve(self, query: str, new_filters: dict):
+        """(filters, reusable results or None) for this turn; starts a new topic unless it follows up."""
+        if not self.follows_up(query):
+            self.topic, self.filters = query, new_filters
+            return new_filters, None
+
+        merged = merge_filters(self.filters, new_filters)
+        reused = None
+        if self.results and narrows(self.filters, merged):
+            where = build_metadata_filter(merged)
+            reused = [doc for doc in self.results
+                      if evaluate_where(doc.metadata, where) and matches_filters(doc.metadata, merged)] or None
+        self.filters = merged
+        return merged, reused
+
+    def add_turn(self, query: str, products, budget: int = HISTORY_TOKEN_BUDGET):
+        self.turns.append(Turn(query, list(products)))
+        while len(self.turns) > 1 and (len(self.turns) > HISTORY_TURNS or estimate_tokens(self.history()) > budget):
+            old = self.turns.pop(0)
+            shown = f" ({', '.join(old.products[:3])})" if old.products else ""
+            self.summary = _clip_oldest(f"{self.summary} {old.query}{shown}.".strip(), budget // 3)
+
+    def history(self) -> str:
+        lines = [f"Tóm tắt trước đó: {self.summary}"] if self.summary else []
+        for turn in self.turns:
+            lines.append(f"Khách: {turn.query}")
+            if turn.products:
+                lines.append(f"Trợ lý đã giới thiệu: {', '.join(turn.products)}")
+        return "  \n".join(lines)
+
+
+def _clip_oldest(text: str, budget: int) -> str:
+    # Bỏ các từ cũ nhất cho đến khi vừa ngân sách
+    words = text.split()
+    while words and estimate_tokens(" ".join(words)) > budget:
+        words.pop(0)
+    return " ".join(words)
+
+
+def is_follow_up(query: str, vocab: dict = None) -> bool:
+    """A real anaphoric cue and no product / brand of its own ("cái màu đen thì sao")."""
+    text = normalize_query(query)
+    if mentions_product(text, vocab):
+        return False
+    return bool(_FOLLOW_UP_RE.search(text) or _LEADING_CON_RE.match(text))
+
+
+def merge_filters(previous: dict, new: dict) -> dict:
+    """New values win; keys the follow-up does not mention keep the previous value."""
+    merged = dict(previous)
+    for key, value in new.items():
+        if value not in (None, [], ""):
+            merged[key] = value
+    return merged
+
+
+def _subset(narrow, wide, normalize) -> bool:
+    return not wide or (bool(narrow) and {normalize(v) for v in narrow} <= {normalize(v) for v in wide})
+
+
+def narrows(previous: dict, merged: dict) -> bool:
+    """True when every variant matching `merged` also matches `previous`."""
+    for key in _LOWER_BOUNDS:
+        if previous.get(key) and not (merged.get(key) and merged[key] >= previous[key]):
+            return False
+    if previous.get("price_max") and not (merged.get("price_max") and merged["price_max"] <= previous["price_max"]):
+        return False
+    if previous.get("status") and (merged.get("status") or "").upper() != previous["status"].upper():
+        return False
+    # attributes khớp theo "bất kỳ", nên chỉ thu hẹp khi là tập con
+    return (_subset(merged.get("colors"), previous.get("colors"), str.lower)
+            and _subset(merged.get("memories"), previous.get("memories"), str.upper)
+            and _subset(merged.get("attributes"), previous.get("attributes"), str.lower))
@@ -50,26 +50,37 @@
 #         print(f"Product {i+1}:\n{all_products[i]}\n")
 #     return "\n".join(all_products)
 
-from langchain_groq import ChatGroq
 from langchain_core.messages import SystemMessage, HumanMessage
-import re
+import logging
 import os
-from dotenv import load_dotenv
-from langchain_pinecone import PineconeVectorStore
-from langchain_huggingface import HuggingFaceEmbeddings
-from pinecone import Pinecone, ServerlessSpec
+from filter_parser import parse_filters
+from catalog import build_metadata_filter, build_product_filter, matches_filters, evaluate_where
+from lexical_index import BM25Index, LEXICAL_INDEX_PATH, reciprocal_rank_fusion
+from context_builder import build_context
+import resources
+import telemetry
+from variant_table import INDEX_LEVEL, VARIANT_TABLE_PATH, VariantTable
+from llm_gateway import GatewayOverloaded
+from collection_alias import COLLECTION_NAME, PRODUCT_COLLECTION_NAME, AliasedArtifact
+
+
+# Dưới ngưỡng này bộ parser cục bộ nhường lại cho LLM
+FILTER_CONFIDENCE_THRESHOLD = float(os.getenv("FILTER_CONFIDENCE_THRESHOLD", "0.7"))
+SEARCH_K = int(os.getenv("SEARCH_K", "10"))
+SEARCH_MAX_FETCH = int(os.getenv("SEARCH_MAX_FETCH", "200"))
+# Kết hợp BM25 với vector search (RRF) khi đã có file lexical index
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+
+
+def __getattr__(name):
+    # database.vectorstore / database.filter_llm vẫn dùng được, nhưng chỉ khởi tạo khi cần
+    if name == "vectorstore":
+        return resources.vectorstore()
+    if name == "filter_llm":
+        return resources.llm()
+    raise AttributeError(f"module 'database' has no attribute {name!r}")
 
 
-load_dotenv()
-
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index(os.getenv("PINECONE_INDEX_NAME"))
-spec = ServerlessSpec(cloud="aws", region="us-east-1")
-
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
-
-vectorstore = PineconeVectorStore(index=index, embedding=embedding_model, text_key="text")
-filter_llm = ChatGroq(model_name="llama3-70b-8192", temperature=0.0)
 filter_system = SystemMessage(content="""
 You are a Vietnamese query analyzer and translator.
 
@@ -99,8 +110,8 @@ Output:
 """)
 
 
-def extract_filters(query: str) -> dict:
-    resp = filter_llm.invoke([filter_system, HumanMessage(content=query)])
+def extract_filters_llm(query: str, llm=None) -> dict:
+    resp = (llm or resources.llm()).invoke([filter_system, HumanMessage(content=query)])
     import json
 
     default = {
@@ -122,81 +133,153 @@ def extract_filters(query: str) -> dict:
         result = json.loads(content)
         return {**default, **result}
     except Exception as e:
-        print("❌ Lỗi khi parse JSON từ LLM:", e)
-        print("⛔ Output LLM gây lỗi:\n", resp.content)
+        telemetry.incr("filter_llm_parse_errors_total")
+        telemetry.log("filter_llm_parse_error", always=True, level=logging.WARNING,
+                      error=str(e), output=resp.content[:500])
         return default
 
-def search_product_context(query: str) -> str:
-    
-    filters = extract_filters(query)
-    print("📥 Filters:", filters)
-
-    results = vectorstore.similarity_search(query, k=10)
-    if not results:
-        return "Không tìm thấy sản phẩm nào phù hợp."
-
-    out, seen = [], set()
-    for doc in results:
-        m = doc.metadata
-        price = float(m.get('Price', 0))
-        color = m.get('Color', '').lower()
-        mem   = m.get('Memory', '')
-        status= m.get('Status', '').upper()
-        attrs = m.get('Attributes', '').lower()
-        name  = m.get('ProductName', '').strip()
-
-
-        # if filters["price_min"] and price < filters["price_min"]:
-        #     continue
-        # if filters["price_max"] and price > filters["price_max"]:
-        #     continue
-        # if filters["colors"] and all(c not in color for c in filters["colors"]):
-        #     continue
-        # if filters["memories"] and mem not in filters["memories"]:
-        #     continue
-        # if filters["status"] and status != filters["status"]:
-        #     continue
-        # if filters["attributes"] and all(a not in attrs for a in filters["attributes"]):
-        #     continue
-
-        # if name in seen:
-        #     continue
-        # seen.add(name)
-
-        if not (
-            (not filters["price_min"] or price >= filters["price_min"]) and
-            (not filters["price_max"] or price <= filters["price_max"]) and
-            (not filters["colors"] or any(c in color for c in filters["colors"])) and
-            (not filters["memories"] or mem in filters["memories"]) and
-            (not filters["status"] or status == filters["status"]) and
-            (not filters["attributes"] or any(a in attrs for a in filters["attributes"])) and
-            (name not in seen)
-        ):
-            continue
-
-
-        lines = [
-            f"📦 Tên sản phẩm: {name}  \n",
-            f"🎨 Màu: {m.get('Color', 'Không rõ')}  \n",
-            f"💾 RAM: {m.get('Memory', 'Không rõ')}  \n",
-            f"💸 Giá: {m.get('Price', 'Không rõ')}  \n",
-            f"📋 Trạng thái: {m.get('Status', 'Không rõ')}  \n",
-            "⚙️ Thuộc tính khác:"
-        ]
-
-
-        attributes = m.get('Attributes')
-        if isinstance(attributes, dict):
-            attr_lines = [f"- {key}: {value}" for key, value in attributes.items()]
-        elif isinstance(attributes, str):
-            import re
-            attr_lines = [f"- {item.strip()}" for item in re.split(r',|;', attributes) if ':' in item]
-        else:
-            attr_lines = []
-
-        attr_text = "  \n".join(attr_lines)
-        out.append("  \n".join(lines) + "  \n" + attr_text + "  \n---")
-
-    return "\n\n".join(out)
+
+def extract_filters(query: str, llm=None) -> dict:
+    parsed = parse_filters(query)
+    if parsed.confidence >= FILTER_CONFIDENCE_THRESHOLD:
+        return parsed.filters
+
+    telemetry.incr("filter_llm_fallbacks_total")
+    telemetry.log("filter_llm_fallback", confidence=round(parsed.confidence, 2), issues=parsed.issues)
+    with telemetry.span("filter_llm"):
+        try:
+            return extract_filters_llm(query, llm=llm)
+        except GatewayOverloaded:
+            # Gateway đang quá tải: dùng tạm bộ lọc của parser thay vì bỏ cả câu hỏi
+            telemetry.incr("filter_llm_busy_total")
+            return parsed.filters
+
+
+def search_by_vector(store, vector, k: int, where=None):
+    # PineconeVectorStore chỉ có bản *_with_score, Chroma có bản trả về Document
+    if hasattr(store, "similarity_search_by_vector_with_score"):
+        return [doc for doc, _ in store.similarity_search_by_vector_with_score(vector, k=k, filter=where)]
+    return store.similarity_search_by_vector(vector, k=k, filter=where)
+
+
+# Cùng phiên bản với collection mà alias đang trỏ tới; tự nạp lại khi đổi alias hoặc file được ghi lại
+_lexical_index = AliasedArtifact(PRODUCT_COLLECTION_NAME if INDEX_LEVEL == "product" else COLLECTION_NAME,
+                                 LEXICAL_INDEX_PATH, BM25Index.load)
+_variant_table = AliasedArtifact(PRODUCT_COLLECTION_NAME, VARIANT_TABLE_PATH, VariantTable.load)
+
+
+def get_lexical_index():
+    """BM25 index written by chroma_sync.py for the current collection (None if missing)."""
+    return _lexical_index.get() if HYBRID_SEARCH else None
+
+
+def get_variant_table():
+    """Side table of the product-level index (INDEX_LEVEL=product), None otherwise."""
+    if INDEX_LEVEL != "product":
+        return None
+    table = _variant_table.get()
+    if table is None:
+        raise FileNotFoundError(f"{VARIANT_TABLE_PATH} missing for {PRODUCT_COLLECTION_NAME}; "
+                                "run chroma_sync.py --level product")
+    return table
+
+
+def _store_filter(filters: dict, table):
+    return build_product_filter(filters) if table is not None else build_metadata_filter(filters)
+
+
+def _expand(docs, filters: dict, table) -> list:
+    # Giá / tồn kho trong store là của lần sync trước: lấy giá hiện tại rồi lọc lại
+    overlay = resources.price_overlay()
+    # Index theo sản phẩm: bung ra các dòng màu / RAM / giá sau khi đã tìm xong
+    if table is not None:
+        return table.expand(docs, filters, overlay)
+    if overlay is not None:
+        docs = overlay.apply(docs)
+    return [doc for doc in docs if matches_filters(doc.metadata, filters)]
+
+
+def _product_key(doc) -> str:
+    return doc.metadata.get('ProductName', '').strip().lower()
+
+
+def top_products(docs, k: int) -> list:
+    """Every variant document of the first k distinct products (duplicates dropped)."""
+    kept, names, texts = [], set(), set()
+    for doc in docs:
+        name = _product_key(doc)
+        if name not in names:
+            if len(names) >= k:
+                continue
+            names.add(name)
+        if doc.page_content not in texts:
+            texts.add(doc.page_content)
+            kept.append(doc)
+    return kept
+
+
+def lexical_search(query: str, filters: dict, k: int = SEARCH_K, index=None) -> list:
+    index = index or get_lexical_index()
+    if index is None:
+        return []
+    table = get_variant_table()
+    where = _store_filter(filters, table)
+    if table is None:
+        accept = lambda m: evaluate_where(m, where) and matches_filters(m, filters)
+    else:
+        accept = lambda m: evaluate_where(m, where)
+    hits = index.search(query, k=k * 4, accept=accept)
+    kept = top_products(_expand(hits, filters, table), k)
+    telemetry.incr("retrieval_hits_total", len(hits), source="lexical", stage="retrieved")
+    telemetry.incr("retrieval_hits_total", len(kept), source="lexical", stage="kept")
+    return kept
+
+
+def retrieve_products(query: str, filters: dict, k: int = SEARCH_K, store=None) -> list:
+    store = store or resources.vectorstore()
+    vector = store.embeddings.embed_query(query)
+    return retrieve_products_by_vector(vector, filters, k=k, store=store, query=query)
+
+
+def retrieve_products_by_vector(vector, filters: dict, k: int = SEARCH_K, store=None, query: str = None) -> list:
+    """Filtered search: the store applies the metadata filter while searching,
+    and we keep asking for more until k distinct products pass matches_filters.
+    All matching variants of those products are returned (build_context groups
+    them). With `query` and a lexical index, BM25 hits are fused in with RRF."""
+    store = store or resources.vectorstore()
+    vector_hits = _vector_products(store, vector, filters, k)
+    lexical_hits = lexical_search(query, filters, k=k) if query else []
+    if not lexical_hits:
+        return vector_hits
+    return top_products(reciprocal_rank_fusion([vector_hits, lexical_hits], key=_product_key), k)
+
+
+def _vector_products(store, vector, filters: dict, k: int) -> list:
+    table = get_variant_table()
+    where = _store_filter(filters, table)
+
+    fetch_k = k
+    while True:
+        results = search_by_vector(store, vector, k=fetch_k, where=where)
+        kept = top_products(_expand(results, filters, table), k)
+        products = len({_product_key(doc) for doc in kept})
+        telemetry.incr("retrieval_hits_total", len(results), source="vector", stage="retrieved")
+        telemetry.incr("retrieval_hits_total", len(kept), source="vector", stage="kept")
+
+        if products >= k or len(results) < fetch_k or fetch_k >= SEARCH_MAX_FETCH:
+            return kept
+        fetch_k = min(fetch_k * 2, SEARCH_MAX_FETCH)
 
 
+def search_product_context(query: str) -> str:
+    with telemetry.span("search_product_context"):
+        with telemetry.span("filters"):
+            filters = extract_filters(query)
+        telemetry.log("filters", filters=filters)
+
+        with telemetry.span("search"):
+            results = retrieve_products(query, filters)
+        with telemetry.span("context"):
+            context = build_context(results, filters, reviews=resources.review_snippets())
+        telemetry.log("context", tokens=context.tokens, saved=context.saved_tokens, products=context.products)
+        return context.text
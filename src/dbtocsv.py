@@ -1,88 +1,203 @@
-import pandas as pd
-import pyodbc
+"""Export the catalog (one row per product variant detail) to CSV or Parquet.
+
+    python dbtocsv.py                                   # SQL Server -> product_data.csv
+    python dbtocsv.py --out product_data.parquet        # Parquet (needs pyarrow)
+    python dbtocsv.py --sqlite product_data.sqlite      # any DB-API source with the same schema
+
+Images, feedbacks and attributes are aggregated per key in their own
+subqueries, so the main query returns exactly one row per variant detail
+(no JOIN fan-out). Rows are fetched with cursor.fetchmany and written chunk
+by chunk, so memory stays flat regardless of catalog size.
+"""
+import argparse
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-conn = pyodbc.connect(
-    'DRIVER={ODBC Driver 17 for SQL Server};'
-    f'SERVER={os.getenv("SQL_SERVER_HOST")};'
-    f'DATABASE=ProductDB;'
-    f'UID={os.getenv("SQL_SERVER_USER")};'
-    f'PWD={os.getenv("SQL_SERVER_PASSWORD")}'
-)
-cursor = conn.cursor()
-
-def fetch_data():
-    query = """
-    SELECT 
-    p.id AS product_id,
-    p.name AS product_name,
-    p.created_at AS product_created_at,
-    p.updated_at AS product_updated_at,
-
-    t.id AS trademark_id,
-    t.name AS trademark_name,
-
-    pv.id AS product_variant_id,
-    pv.name AS product_variant_name,
-    MAX(CAST(COALESCE(pv.description, '') AS VARCHAR(MAX))) AS product_variant_description,
-    pv.status AS product_variant_status,
-    pv.featured AS product_variant_featured,
-    pv.created_at AS product_variant_created_at,
-    pv.updated_at AS product_variant_updated_at,
-
-    uc.id AS usage_category_id,
-    uc.name AS usage_category_name,
-    uc.status AS usage_category_status,
-
-    pvd.id AS product_variant_detail_id,
-    pv.name + ' - ' + c.name + ' - ' + m.name AS product_variant_detail_name,
-    pvd.price,
-    pvd.quantity,
-    pvd.sale,
-    pvd.status AS product_variant_detail_status,
-    pvd.views_count,
-
-    c.id AS color_id,
-    c.name AS color_name,
-
-    m.id AS memory_id,
-    m.name AS memory_name,
-
-    CAST(STRING_AGG(CAST(COALESCE(pi.path, '') AS VARCHAR(MAX)), '; ') AS VARCHAR(MAX)) AS product_images,
-    CAST(STRING_AGG(CAST(COALESCE(CAST(pf.feedback_rating AS VARCHAR) + ' Star - ' + CAST(pf.feedback_text AS VARCHAR(MAX)), '') AS VARCHAR(MAX)), ' || ') AS VARCHAR(MAX)) AS feedbacks,
-    CAST(STRING_AGG(CAST(COALESCE(ipf.image_path, '') AS VARCHAR(MAX)), '; ') AS VARCHAR(MAX)) AS feedback_images,
-    CAST(STRING_AGG(CAST(COALESCE(a.name + ': ' + av.value, '') AS VARCHAR(MAX)), '; ') AS VARCHAR(MAX)) AS attributes
-
-FROM products p
-LEFT JOIN trademarks t ON p.trademark_id = t.id
-LEFT JOIN products_variants pv ON pv.product_id = p.id
-LEFT JOIN usage_categories uc ON pv.usage_category_id = uc.id
-LEFT JOIN product_variant_details pvd ON pvd.product_variant_id = pv.id
-LEFT JOIN colors c ON pvd.color_id = c.id
-LEFT JOIN memories m ON pvd.memory_id = m.id
-LEFT JOIN products_images pi ON pi.product_variant_detail_id = pvd.id
-LEFT JOIN product_feedbacks pf ON pf.product_variant_id = pv.id
-LEFT JOIN img_product_feedback ipf ON ipf.product_feedback_id = pf.id
-LEFT JOIN attribute_values av ON av.product_variant_id = pv.id
-LEFT JOIN attributes a ON av.attribute_id = a.id
-
-GROUP BY 
-    p.id, p.name, p.created_at, p.updated_at,
-    t.id, t.name,
-    pv.id, pv.name, pv.status, pv.featured, pv.created_at, pv.updated_at,
-    uc.id, uc.name, uc.status,
-    pvd.id, pvd.price, pvd.quantity, pvd.sale, pvd.status, pvd.views_count,
-    c.id, c.name,
-    m.id, m.name
+import time
+
+import pandas as pd
+
+from sql_source import connect, as_text, concat, string_agg
+
+COLUMNS = [
+    "product_id", "product_name", "product_created_at", "product_updated_at",
+    "trademark_id", "trademark_name",
+    "product_variant_id", "product_variant_name", "product_variant_description", "product_variant_status",
+    "product_variant_featured", "product_variant_created_at", "product_variant_updated_at",
+    "usage_category_id", "usage_category_name", "usage_category_status",
+    "product_variant_detail_id", "product_variant_detail_name", "price", "quantity", "sale",
+    "product_variant_detail_status", "views_count",
+    "color_id", "color_name", "memory_id", "memory_name",
+    "product_images", "feedbacks", "feedback_images", "attributes",
+]
+FLOAT_COLUMNS = {"price", "sale"}
+INT_COLUMNS = {"quantity", "views_count"}
+BOOL_COLUMNS = {"product_variant_featured"}
 
+
+def build_query(conn) -> str:
+    feedback = concat(conn, as_text(conn, "pf.feedback_rating"), "' Star - '", as_text(conn, "pf.feedback_text"))
+    return f"""
+    WITH img AS (
+        SELECT product_variant_detail_id, {string_agg(conn, "pi.path", "; ")} AS product_images
+        FROM products_images pi
+        GROUP BY product_variant_detail_id
+    ),
+    fb AS (
+        SELECT pf.product_variant_id, {string_agg(conn, feedback, " || ")} AS feedbacks
+        FROM product_feedbacks pf
+        GROUP BY pf.product_variant_id
+    ),
+    fbi AS (
+        SELECT pf.product_variant_id, {string_agg(conn, "ipf.image_path", "; ")} AS feedback_images
+        FROM product_feedbacks pf
+        JOIN img_product_feedback ipf ON ipf.product_feedback_id = pf.id
+        GROUP BY pf.product_variant_id
+    ),
+    attr AS (
+        SELECT av.product_variant_id, {string_agg(conn, concat(conn, "a.name", "': '", "av.value"), "; ")} AS attributes
+        FROM attribute_values av
+        JOIN attributes a ON av.attribute_id = a.id
+        GROUP BY av.product_variant_id
+    )
+    SELECT
+        p.id AS product_id,
+        p.name AS product_name,
+        p.created_at AS product_created_at,
+        p.updated_at AS product_updated_at,
+        t.id AS trademark_id,
+        t.name AS trademark_name,
+        pv.id AS product_variant_id,
+        pv.name AS product_variant_name,
+        {as_text(conn, "COALESCE(pv.description, '')")} AS product_variant_description,
+        pv.status AS product_variant_status,
+        pv.featured AS product_variant_featured,
+        pv.created_at AS product_variant_created_at,
+        pv.updated_at AS product_variant_updated_at,
+        uc.id AS usage_category_id,
+        uc.name AS usage_category_name,
+        uc.status AS usage_category_status,
+        pvd.id AS product_variant_detail_id,
+        {concat(conn, "pv.name", "' - '", "c.name", "' - '", "m.name")} AS product_variant_detail_name,
+        pvd.price,
+        pvd.quantity,
+        pvd.sale,
+        pvd.status AS product_variant_detail_status,
+        pvd.views_count,
+        c.id AS color_id,
+        c.name AS color_name,
+        m.id AS memory_id,
+        m.name AS memory_name,
+        COALESCE(img.product_images, '') AS product_images,
+        COALESCE(fb.feedbacks, '') AS feedbacks,
+        COALESCE(fbi.feedback_images, '') AS feedback_images,
+        COALESCE(attr.attributes, '') AS attributes
+    FROM products p
+    LEFT JOIN trademarks t ON p.trademark_id = t.id
+    LEFT JOIN products_variants pv ON pv.product_id = p.id
+    LEFT JOIN usage_categories uc ON pv.usage_category_id = uc.id
+    LEFT JOIN product_variant_details pvd ON pvd.product_variant_id = pv.id
+    LEFT JOIN colors c ON pvd.color_id = c.id
+    LEFT JOIN memories m ON pvd.memory_id = m.id
+    LEFT JOIN img ON img.product_variant_detail_id = pvd.id
+    LEFT JOIN fb ON fb.product_variant_id = pv.id
+    LEFT JOIN fbi ON fbi.product_variant_id = pv.id
+    LEFT JOIN attr ON attr.product_variant_id = pv.id
     """
-    df = pd.read_sql(query, conn)
-    return df
 
-df = fetch_data()
-df.to_csv("product_data.csv", index=False, encoding="utf-8-sig")
 
-print("✅ Dữ liệu đã được xuất ra file product_data.csv")
+def iter_chunks(conn, chunk_size: int = 5000):
+    """DataFrames of at most chunk_size rows, straight from the cursor."""
+    cursor = conn.cursor()
+    cursor.execute(build_query(conn))
+    columns = [d[0] for d in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield pd.DataFrame.from_records([tuple(r) for r in rows], columns=columns)
+    cursor.close()
+
+
+def fetch_data(conn=None) -> pd.DataFrame:
+    """Whole catalog in one DataFrame (small catalogs / interactive use)."""
+    conn = conn or connect()
+    chunks = list(iter_chunks(conn))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=COLUMNS)
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    def field_type(name):
+        if name in FLOAT_COLUMNS:
+            return pa.float64()
+        if name in INT_COLUMNS:
+            return pa.int64()
+        if name in BOOL_COLUMNS:
+            return pa.bool_()
+        return pa.string()
+
+    return pa.schema([(name, field_type(name)) for name in COLUMNS])
+
+
+def _arrow_table(df: pd.DataFrame, schema):
+    import pyarrow as pa
+
+    arrays = []
+    for field in schema:
+        col = df[field.name]
+        if pa.types.is_string(field.type):
+            values = [None if pd.isna(v) else str(v) for v in col]
+        elif pa.types.is_boolean(field.type):
+            values = [None if pd.isna(v) else str(v).strip().lower() in ("1", "true") for v in col]
+        else:
+            values = pd.to_numeric(col, errors="coerce")
+        arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def export(conn, out_path: str, chunk_size: int = 5000, fmt: str = None) -> int:
+    fmt = fmt or ("parquet" if out_path.endswith(".parquet") else "csv")
+    tmp_path = out_path + ".tmp"
+    rows, writer = 0, None
+    try:
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            schema = _arrow_schema()
+            writer = pq.ParquetWriter(tmp_path, schema, compression="zstd")
+
+        for chunk in iter_chunks(conn, chunk_size):
+            chunk = chunk[COLUMNS]
+            if fmt == "parquet":
+                writer.write_table(_arrow_table(chunk, schema))
+            else:
+                # BOM chỉ ghi một lần ở đầu file (utf-8-sig như bản cũ)
+                chunk.to_csv(tmp_path, mode="w" if rows == 0 else "a", header=rows == 0, index=False,
+                             encoding="utf-8-sig" if rows == 0 else "utf-8")
+            rows += len(chunk)
+            print(f"  ... {rows} rows")
+        if fmt == "csv" and rows == 0:
+            pd.DataFrame(columns=COLUMNS).to_csv(tmp_path, index=False, encoding="utf-8-sig")
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, out_path)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="product_data.csv", help=".csv or .parquet")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="default: from the --out extension")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--sqlite", help="read from a SQLite file instead of SQL Server")
+    args = parser.parse_args()
+
+    conn = connect(args.sqlite)
+    started = time.perf_counter()
+    rows = export(conn, args.out, chunk_size=args.chunk_size, fmt=args.format)
+    conn.close()
+    print(f"✅ Dữ liệu đã được xuất ra file {args.out} ({rows} dòng, {time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+QUERY_LRU_SIZE = int(os.getenv("EMBEDDING_QUERY_LRU_SIZE", "2048"))
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", str(text))).strip()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def model_name_of(embeddings) -> str:
+    return str(getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None)
+               or type(embeddings).__name__)
+
+
+class EmbeddingCache:
+    """Content-addressed on-disk embedding store.
+
+    One append-only float32 file per model, read through np.memmap, plus a
+    SQLite index (model, sha256 of normalized text) -> row. Safe to share
+    between the sync scripts and the app: appends happen inside a SQLite
+    write transaction.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False, timeout=30)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS models (model TEXT PRIMARY KEY, dim INTEGER, rows INTEGER);
+            CREATE TABLE IF NOT EXISTS entries (model TEXT, key TEXT, row INTEGER, PRIMARY KEY (model, key));
+        """)
+        self._maps = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, model: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        return os.path.join(self.directory, f"{safe}.f32")
+
+    def _matrix(self, model: str, dim: int, rows: int):
+        cached = self._maps.get(model)
+        if cached is None or cached.shape[0] < rows:
+            cached = np.memmap(self._path(model), dtype=np.float32, mode="r", shape=(rows, dim))
+            self._maps[model] = cached
+        return cached
+
+    def get_many(self, model: str, texts) -> list:
+        keys = [text_key(t) for t in texts]
+        with self.lock:
+            meta = self.conn.execute("SELECT dim, rows FROM models WHERE model = ?", (model,)).fetchone()
+            found = {}
+            if meta:
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    found.update(self.conn.execute(
+                        f"SELECT key, row FROM entries WHERE model = ? AND key IN ({', '.join('?' for _ in chunk)})",
+                        [model, *chunk]).fetchall())
+            matrix = self._matrix(model, meta[0], meta[1]) if found else None
+
+            out = []
+            for key in keys:
+                row = found.get(key)
+                out.append(np.array(matrix[row]) if row is not None else None)
+            hits = sum(v is not None for v in out)
+            self.hits += hits
+            self.misses += len(out) - hits
+            return out
+
+    def put_many(self, model: str, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        keys = [text_key(t) for t in texts]
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                meta = self.conn.execute("SELECT dim, rows FROM models WHERE model = ?", (model,)).fetchone()
+                dim, rows = meta if meta else (vectors.shape[1], 0)
+                if dim != vectors.shape[1]:
+                    raise ValueError(f"{model}: cached dim {dim} != {vectors.shape[1]}")
+
+                path = self._path(model)
+                with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                    f.truncate(rows * dim * 4)  # bỏ phần ghi dở của lần crash trước
+                    f.seek(rows * dim * 4)
+                    f.write(vectors.tobytes())
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO entries (model, key, row) VALUES (?, ?, ?)",
+                    [(model, key, rows + i) for i, key in enumerate(keys)])
+                self.conn.execute("INSERT OR REPLACE INTO models (model, dim, rows) VALUES (?, ?, ?)",
+                                  (model, dim, rows + len(vectors)))
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings wrapper: query LRU -> disk cache -> model."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache = None, model_name: str = None,
+                 lru_size: int = QUERY_LRU_SIZE):
+        self.embeddings = embeddings
+        self.cache = cache or EmbeddingCache()
+        self.model_name = model_name or model_name_of(embeddings)
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lru_lock = threading.Lock()
+        self.lru_hits = 0
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        cached = self.cache.get_many(self.model_name, texts)
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            # Văn bản trùng nhau trong cùng một batch chỉ embed một lần
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            vectors = np.asarray(self.embeddings.embed_documents(unique), dtype=np.float32)
+            self.cache.put_many(self.model_name, unique, vectors)
+            computed = dict(zip(unique, vectors))
+            for i in missing:
+                cached[i] = computed[texts[i]]
+        return [list(map(float, v)) for v in cached]
+
+    def embed_query(self, text):
+        key = text_key(text)
+        with self._lru_lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.lru_hits += 1
+                return self._lru[key]
+
+        # Một số model (Gemini) embed query khác với document nên tách namespace
+        namespace = f"{self.model_name}:query"
+        vector = self.cache.get_many(namespace, [text])[0]
+        if vector is None:
+            vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+            self.cache.put_many(namespace, [text], [vector])
+        vector = list(map(float, vector))
+
+        with self._lru_lock:
+            self._lru[key] = vector
+            if len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+        return vector
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "lru_hits": self.lru_hits, "lru_size": len(self._lru)}
@@ -0,0 +1,212 @@
+"""Micro-batched query embeddings: one resident model shared by every session.
+
+    embeddings = EmbeddingBatcher(HuggingFaceEmbeddings(model_name=...))
+    embeddings.embed_query("samsung dưới 10 triệu")     # waits for a shared batch
+
+    python embedding_service.py --port 8765             # one model for every Streamlit process
+    EMBEDDING_SERVICE_URL=http://127.0.0.1:8765 streamlit run app.py
+
+Queries are queued; a single worker thread takes the first one, waits up to
+EMBED_MAX_WAIT_MS for others (at most EMBED_MAX_BATCH) and runs one batched
+encode, then hands each caller its vector. Batch sizes and queue waits go
+into the embedding_batch_size / embedding_queue_seconds histograms.
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.embeddings import Embeddings
+
+import telemetry
+from embedding_cache import model_name_of
+
+EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL", "")
+EMBED_BATCHING = os.getenv("EMBED_BATCHING", "1") == "1"
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+
+telemetry.register_buckets("embedding_batch_size", (1, 2, 4, 8, 16, 32, 64, 128))
+
+
+class EmbeddingBatcher(Embeddings):
+    """Embeddings wrapper that coalesces concurrent embed_query calls into one encode.
+
+    The batch is encoded with embed_documents, which for sentence-transformers
+    models is the same forward pass as embed_query.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch: int = EMBED_MAX_BATCH,
+                 max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.embeddings = embeddings
+        self.model_name = model_name_of(embeddings)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self.batches = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _submit(self, text: str) -> Future:
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                telemetry.observe("embedding_queue_seconds", started - enqueued)
+            # Câu hỏi trùng nhau trong cùng batch chỉ encode một lần
+            unique = list(dict.fromkeys(text for text, _, _ in batch))
+            telemetry.observe("embedding_batch_size", len(unique))
+            self.batches += 1
+            try:
+                vectors = dict(zip(unique, self.embeddings.embed_documents(unique)))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            telemetry.observe("stage_seconds", time.perf_counter() - started, stage="embed_batch")
+            for text, future, _ in batch:
+                future.set_result(list(vectors[text]))
+
+    def embed_query(self, text: str):
+        return self._submit(text).result()
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        # Lô lớn (đồng bộ catalog) đã đủ to, encode thẳng
+        if len(texts) >= self.max_batch:
+            return self.embeddings.embed_documents(texts)
+        return [f.result() for f in [self._submit(t) for t in texts]]
+
+
+class RemoteEmbeddings(Embeddings):
+    """Client of `python embedding_service.py` (POST /embed)."""
+
+    def __init__(self, url: str = EMBEDDING_SERVICE_URL, model_name: str = None, timeout: float = 30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.model_name = model_name or self._get("/health")["model"]
+
+    def _get(self, path: str) -> dict:
+        with urllib.request.urlopen(self.url + path, timeout=self.timeout) as response:
+            return json.load(response)
+
+    def _post(self, texts) -> list:
+        request = urllib.request.Request(self.url + "/embed", data=json.dumps({"texts": list(texts)}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)["vectors"]
+
+    def embed_query(self, text: str):
+        return self._post([text])[0]
+
+    def embed_documents(self, texts):
+        return self._post(texts)
+
+
+class _Server(ThreadingHTTPServer):
+    # Backlog mặc định (5) làm rớt kết nối khi nhiều session gọi cùng lúc
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def make_handler(embeddings: Embeddings):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/health":
+                self._send(200, {"model": model_name_of(embeddings), "queue": getattr(embeddings, "depth", 0)})
+            elif self.path.rstrip("/") == "/metrics":
+                body = telemetry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/embed":
+                self.send_error(404)
+                return
+            try:
+                texts = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))["texts"]
+                self._send(200, {"vectors": embeddings.embed_documents(texts)})
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(embeddings: Embeddings, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """Serve `embeddings` over HTTP from a daemon thread (one handler thread per request)."""
+    server = _Server((host, port), make_handler(embeddings))
+    threading.Thread(target=server.serve_forever, name="embedding-service", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--max-batch", type=int, default=EMBED_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=EMBED_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    embeddings = EmbeddingBatcher(HuggingFaceEmbeddings(model_name=args.model), args.max_batch, args.max_wait_ms)
+    embeddings.embed_query("khởi động")
+    server = serve(embeddings, args.host, args.port)
+    print(f"🚀 Embedding service for {args.model} on http://{args.host}:{args.port} (/embed, /health, /metrics)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Local stand-ins for ChatGroq and the vector store, for offline latency tests."""
+import asyncio
+import re
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings.fake import DeterministicFakeEmbedding
+from langchain_core.messages import AIMessage, AIMessageChunk
+from pydantic import PrivateAttr
+
+from catalog import evaluate_where
+from snapshot import load_documents
+
+DEFAULT_TEMPLATE = "📦 Tên sản phẩm: (giả lập) trả lời cho: {query}"
+
+
+class FakeChatModel:
+    """Answers with a recorded response (substring match on the prompt) or a
+    template, after `latency` seconds; streams one token per `token_latency`."""
+
+    def __init__(self, responses: dict = None, template: str = DEFAULT_TEMPLATE,
+                 latency: float = 0.0, token_latency: float = 0.0):
+        self.responses = responses or {}
+        self.template = template
+        self.latency = latency
+        self.token_latency = token_latency
+        self.calls = 0
+
+    def _answer(self, messages) -> str:
+        self.calls += 1
+        prompt = messages[-1].content if messages else ""
+        for key, response in self.responses.items():
+            if key in prompt:
+                return response
+        return self.template.format(query=prompt.splitlines()[0][:200] if prompt else "")
+
+    def _tokens(self, text: str):
+        return re.findall(r"\S+\s*|\s+", text)
+
+    def invoke(self, messages, **kwargs):
+        answer = self._answer(messages)
+        time.sleep(self.latency + self.token_latency * len(self._tokens(answer)))
+        return AIMessage(content=answer)
+
+    async def ainvoke(self, messages, **kwargs):
+        answer = self._answer(messages)
+        await asyncio.sleep(self.latency + self.token_latency * len(self._tokens(answer)))
+        return AIMessage(content=answer)
+
+    def stream(self, messages, **kwargs):
+        time.sleep(self.latency)
+        for token in self._tokens(self._answer(messages)):
+            time.sleep(self.token_latency)
+            yield AIMessageChunk(content=token)
+
+    async def astream(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(self._answer(messages)):
+            await asyncio.sleep(self.token_latency)
+            yield AIMessageChunk(content=token)
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+class FakeRateLimitedChatModel(FakeChatModel):
+    """FakeChatModel that, like the provider, rejects calls beyond `rps`
+    requests per second or `max_concurrent` open requests with a 429."""
+
+    def __init__(self, *args, rps: float = 5.0, max_concurrent: int = 8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rps = rps
+        self.max_concurrent = max_concurrent
+        self.rejected = 0
+        self._open = 0
+        self._recent = []
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        with self._lock:
+            now = time.monotonic()
+            self._recent = [t for t in self._recent if now - t < 1.0]
+            if len(self._recent) >= self.rps or self._open >= self.max_concurrent:
+                self.rejected += 1
+                raise FakeRateLimitError("rate limit exceeded")
+            self._recent.append(now)
+            self._open += 1
+
+    def _release(self):
+        with self._lock:
+            self._open -= 1
+
+    def invoke(self, messages, **kwargs):
+        self._admit()
+        try:
+            return super().invoke(messages, **kwargs)
+        finally:
+            self._release()
+
+    async def ainvoke(self, messages, **kwargs):
+        self._admit()
+        try:
+            return await super().ainvoke(messages, **kwargs)
+        finally:
+            self._release()
+
+    def stream(self, messages, **kwargs):
+        self._admit()
+        try:
+            yield from super().stream(messages, **kwargs)
+        finally:
+            self._release()
+
+    async def astream(self, messages, **kwargs):
+        self._admit()
+        try:
+            async for chunk in super().astream(messages, **kwargs):
+                yield chunk
+        finally:
+            self._release()
+
+
+class FakeSlowEmbeddings(DeterministicFakeEmbedding):
+    """DeterministicFakeEmbedding with the cost shape of a resident encoder:
+    one forward pass at a time, `latency` per call plus `per_text` per text."""
+
+    latency: float = 0.02
+    per_text: float = 0.001
+    calls: int = 0
+    _forward: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def _encode(self, n: int):
+        with self._forward:
+            self.calls += 1
+            time.sleep(self.latency + self.per_text * n)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        self._encode(len(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self._encode(1)
+        return super().embed_query(text)
+
+
+class FakeVectorSink:
+    """Pinecone index stand-in for sync benchmarks: each upsert takes
+    `latency` + `per_vector` * n seconds and fails with a 429 at `failure_rate`."""
+
+    def __init__(self, latency: float = 0.05, per_vector: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.per_vector = per_vector
+        self.failure_rate = failure_rate
+        self.rng = np.random.default_rng(seed)
+        self.vectors = {}
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        vectors = list(vectors)
+        with self._lock:
+            self.calls += 1
+            failed = self.rng.random() < self.failure_rate
+            self.failures += failed
+        time.sleep(self.latency + self.per_vector * len(vectors))
+        if failed:
+            raise FakeRateLimitError("upsert rate limit exceeded")
+        with self._lock:
+            for vector_id, values, metadata in vectors:
+                self.vectors[vector_id] = (values, metadata)
+
+    def update(self, id, set_metadata):
+        with self._lock:
+            values, metadata = self.vectors.get(id, (None, {}))
+            self.vectors[id] = (values, {**metadata, **set_metadata})
+
+    def delete(self, ids):
+        with self._lock:
+            for vector_id in ids:
+                self.vectors.pop(vector_id, None)
+
+
+class FakeVectorStore:
+    """Brute-force cosine search over in-memory documents; understands the
+    same metadata filter dicts as Chroma/Pinecone (catalog.build_metadata_filter)."""
+
+    def __init__(self, texts, metadatas, embeddings=None, latency: float = 0.0):
+        self.embeddings = embeddings or DeterministicFakeEmbedding(size=64)
+        self.latency = latency
+        self.docs = [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)]
+        matrix = np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32)
+        self.matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    @classmethod
+    def from_csv(cls, csv_path: str, **kwargs):
+        texts, metadatas = load_documents(csv_path)
+        return cls(texts, metadatas, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, filter=None, **kwargs):
+        time.sleep(self.latency)
+        query = np.asarray(embedding, dtype=np.float32)
+        scores = self.matrix @ (query / max(np.linalg.norm(query), 1e-12))
+        order = np.argsort(-scores)
+        hits = [self.docs[i] for i in order if evaluate_where(self.docs[i].metadata, filter)]
+        return hits[:k]
+
+    def similarity_search(self, query: str, k: int = 4, filter=None, **kwargs):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, filter=filter)
@@ -0,0 +1,350 @@
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import pandas as pd
+
+CATALOG_CSV = os.getenv(
+    "CATALOG_CSV",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "product_data.csv"),
+)
+
+# Màu tiếng Việt -> tên màu tiếng Anh trong catalog (viết thường)
+VI_COLORS = {
+    "xanh dương": "blue",
+    "xanh duong": "blue",
+    "xanh da trời": "blue",
+    "xanh lá": "green",
+    "xanh la": "green",
+    "xanh lục": "green",
+    "xanh rêu": "green",
+    # "xanh" đứng riêng có thể là xanh dương hoặc xanh lá
+    "xanh": ("blue", "green"),
+    "đen": "black",
+    "trắng": "white",
+    "tím": "purple",
+    "bạc": "silver",
+    "vàng": "yellow",
+    "đỏ": "red",
+    "cam": "orange",
+    "xám": "grey",
+    "ghi": "grey",
+    "nâu đồng": "bronze brown",
+    "nâu": "bronze brown",
+    # "đồng" còn là đơn vị tiền ("10 triệu đồng") và "đồng hồ": chỉ nhận sau "màu"
+    "màu đồng": "bronze brown",
+    "hồng": "pink",
+}
+
+STATUS_PHRASES = [
+    ("hết hàng", "OUT_OF_STOCK"),
+    ("ngừng bán", "DISCONTINUED"),
+    ("ngừng kinh doanh", "DISCONTINUED"),
+    ("còn hàng", "AVAILABLE"),
+    ("có sẵn", "AVAILABLE"),
+    ("sẵn hàng", "AVAILABLE"),
+    ("hàng mới", "AVAILABLE"),
+]
+
+ATTRIBUTE_PHRASES = [
+    ("super amoled", "Super AMOLED"),
+    ("amoled", "AMOLED"),
+    ("oled", "OLED"),
+    ("5g", "5G"),
+    ("4g", "4G"),
+    ("nfc", "NFC"),
+    ("ois", "OIS"),
+    ("sạc nhanh", "fast charging"),
+    ("chống nước", "water resistant"),
+    ("snapdragon", "Snapdragon"),
+    ("exynos", "Exynos"),
+    ("dimensity", "Dimensity"),
+    ("gorilla glass", "Gorilla Glass"),
+]
+
+# Hãng / dòng máy phổ biến, kể cả khi catalog chưa có (để biết câu hỏi đã nêu sản phẩm riêng)
+BRANDS = ["apple", "iphone", "ipad", "samsung", "galaxy", "oppo", "reno", "xiaomi", "redmi", "poco", "vivo",
+          "realme", "sony", "xperia", "nokia", "huawei", "honor", "asus", "rog", "google", "pixel", "oneplus",
+          "motorola", "moto", "tecno", "infinix", "nothing"]
+# Từ trong tên máy không đủ để chỉ ra một sản phẩm
+NAME_GENERIC = {"pro", "max", "plus", "ultra", "mini", "lite", "fe", "5g", "4g", "f", "u"}
+
+PRICE_UNITS = {
+    "triệu": 1_000_000, "trieu": 1_000_000, "tr": 1_000_000, "củ": 1_000_000, "cu": 1_000_000,
+    "nghìn": 1_000, "ngàn": 1_000, "nghin": 1_000, "ngan": 1_000, "k": 1_000,
+    "vnđ": 1, "vnd": 1, "đồng": 1, "đ": 1,
+}
+
+MAX_BEFORE = ["không vượt quá", "không quá", "khong qua", "chưa tới", "chưa đến", "dưới", "duoi",
+              "tối đa", "toi da", "nhỏ hơn", "ít hơn", "thấp hơn", "rẻ hơn", "bé hơn", "max", "<=", "<"]
+MAX_AFTER = ["trở xuống", "tro xuong", "đổ lại", "do lai", "đổ xuống", "trở lại"]
+MIN_BEFORE = ["tối thiểu", "ít nhất", "lớn hơn", "cao hơn", "đắt hơn", "trên", "tren", "hơn",
+              "từ", "tu", "min", ">=", ">"]
+MIN_AFTER = ["trở lên", "tro len", "đổ lên"]
+APPROX_BEFORE = ["khoảng", "tầm", "tam", "quanh", "cỡ", "chừng", "giá", "gia", "~"]
+RANGE_JOINERS = r"(?:đến|tới|den|toi|-|–|~|và)"
+
+_unit_re = "|".join(sorted((re.escape(u) for u in PRICE_UNITS), key=len, reverse=True))
+# Phần lẻ sau "triệu": "15tr5" = 15,5 triệu, "7 triệu 990" / "7 triệu 990 nghìn" = 7.990.000
+_after_million = "|".join(rf"(?<={re.escape(u)})" for u, v in PRICE_UNITS.items() if v == 1_000_000)
+_thousand_re = "|".join(re.escape(u) for u, v in PRICE_UNITS.items() if v == 1_000)
+# "10 triệu đồng": chữ "đồng" / "vnđ" sau đơn vị cũng thuộc về số tiền
+AMOUNT_RE = re.compile(rf"(?<![\w.,])(\d+(?:[.,]\d+)*)\s*({_unit_re})?"
+                       rf"(?:(?:{_after_million})\s*(\d{{1,3}})(?:\s*(?:{_thousand_re})(?!\w))?(?!\s*(?:{_unit_re})(?!\w)))?"
+                       rf"(?:\s*(?:đồng|vnđ|vnd)(?!\w))?(?!\w)")
+MEMORY_RE = re.compile(r"(?<![\w.,])(\d+)\s*(gb|tb)(?!\w)")
+# Dung lượng RAM / bộ nhớ có bán trên thị trường: chỉ thành bộ lọc khi có chữ "ram" / "bộ nhớ"
+# đứng trước, nếu không thì coi là một phần tên máy ("A55 5G 12GB") và để lại cho phần so tên
+STORAGE_SIZES = {f"{n}GB" for n in (1, 2, 3, 4, 6, 8, 12, 16, 18, 24, 32, 64, 128, 256, 512)} | {"1TB", "2TB"}
+MEMORY_CUES = ["ram", "rom", "bộ nhớ", "bo nho", "dung lượng", "dung luong"]
+HZ_RE = re.compile(r"(?<![\w.,])(\d+)\s*hz(?!\w)")
+MAH_RE = re.compile(r"(?<![\w.,])(\d+)\s*mah(?!\w)")
+COLOR_QUESTION_WORDS = {"gì", "nào", "sắc", "khác", "nữa", "của", "là", "có", "thì", "không", "gi", "nao"}
+
+
+@dataclass
+class ParseResult:
+    filters: dict
+    confidence: float
+    issues: list = field(default_factory=list)
+    # Phần câu hỏi không thuộc bộ lọc nào (các đoạn đã dùng bị thay bằng khoảng trắng)
+    rest: str = ""
+
+
+def empty_filters() -> dict:
+    return {
+        "price_min": None,
+        "price_max": None,
+        "colors": [],
+        "memories": [],
+        "status": None,
+        "attributes": [],
+        # Ngưỡng dưới cho thông số số ("RAM từ 8GB", "pin trên 5000 mAh")
+        "memory_min_gb": None,
+        "battery_min_mah": None,
+        "refresh_min_hz": None,
+    }
+
+
+@lru_cache(maxsize=4)
+def load_vocab(csv_path: str = CATALOG_CSV) -> dict:
+    """Color / memory / product-name vocabularies built from the catalog CSV (or its Arrow snapshot)."""
+    colors, memories, names = set(), set(), set(BRANDS)
+    if os.path.exists(csv_path):
+        if csv_path.endswith(".arrow"):
+            from snapshot import load_snapshot
+            table = load_snapshot(csv_path)
+            wanted = [c for c in ["color_name", "memory_name", *NAME_COLUMNS] if c in table.column_names]
+            df = table.select(wanted).to_pandas()
+        else:
+            df = pd.read_csv(csv_path, usecols=lambda c: c in ("color_name", "memory_name", *NAME_COLUMNS))
+        colors = {c.strip().lower() for c in df["color_name"].dropna() if str(c).strip()}
+        memories = {m.strip().upper() for m in df["memory_name"].dropna() if str(m).strip()}
+        for column in NAME_COLUMNS:
+            if column in df:
+                names.update(t for name in df[column].dropna() for t in _name_tokens(name))
+    return {"colors": colors, "memories": memories, "names": names}
+
+
+NAME_COLUMNS = ("trademark_name", "product_name", "product_variant_name")
+
+
+def _name_tokens(text) -> list:
+    # Chỉ giữ token có chữ cái và không phải dung lượng ("a55", "xperia"; bỏ "8gb", "10")
+    return [t for t in re.findall(r"\w+", str(text).lower())
+            if len(t) > 1 and re.search(r"[^\W\d_]", t) and not MEMORY_RE.fullmatch(t) and t not in NAME_GENERIC]
+
+
+def mentions_product(query: str, vocab: dict = None) -> bool:
+    """True when the query names a brand or model of its own ("iPhone", "A55", "Xperia")."""
+    names = (vocab or load_vocab()).get("names", set(BRANDS))
+    return any(t in names for t in _name_tokens(normalize_query(query)))
+
+
+def normalize_query(query: str) -> str:
+    text = unicodedata.normalize("NFC", query).lower()
+    return text.replace("≤", "<=").replace("≥", ">=")
+
+
+def _blank(text: str, start: int, end: int) -> str:
+    # Thay đoạn đã dùng bằng khoảng trắng để giữ nguyên vị trí các ký tự
+    return text[:start] + " " * (end - start) + text[end:]
+
+
+def _phrase_re(phrase: str):
+    return re.compile(rf"(?<!\w){re.escape(phrase)}(?!\w)")
+
+
+def _ends_with_any(text: str, cues) -> bool:
+    text = text.rstrip()
+    return any(re.search(rf"(?<!\w){re.escape(c)}$", text) for c in cues)
+
+
+def _starts_with_any(text: str, cues) -> bool:
+    text = text.lstrip()
+    return any(re.match(rf"{re.escape(c)}(?!\w)", text) for c in cues)
+
+
+def _to_number(raw: str) -> float:
+    if re.fullmatch(r"\d{1,3}([.,]\d{3})+", raw):
+        return float(re.sub(r"[.,]", "", raw))
+    return float(raw.replace(",", "."))
+
+
+def _to_vnd(value: float, multiplier) -> int:
+    if multiplier is None:
+        # Không có đơn vị: số nhỏ hiểu là triệu, số lớn hiểu là VND
+        multiplier = 1_000_000 if value < 1000 else 1
+    return int(round(value * multiplier))
+
+
+def _find_amounts(text: str):
+    amounts = []
+    for m in AMOUNT_RE.finditer(text):
+        value = _to_number(m.group(1))
+        unit = m.group(2)
+        multiplier = PRICE_UNITS[unit] if unit else None
+        if m.group(3):
+            value += int(m.group(3)) / 10 ** len(m.group(3))  # "15tr5" = 15,5 triệu; "7 triệu 990" = 7,99 triệu
+        amounts.append({"start": m.start(), "end": m.end(), "value": value, "multiplier": multiplier})
+    return amounts
+
+
+def _parse_price(text: str, filters: dict, issues: list) -> str:
+    amounts = _find_amounts(text)
+    used, models = set(), set()
+
+    # Khoảng giá: "từ 10 đến 20 triệu", "10-20tr"
+    for a, b in zip(amounts, amounts[1:]):
+        if id(a) in used or id(b) in used:
+            continue
+        if re.fullmatch(rf"\s*{RANGE_JOINERS}\s*", text[a["end"]:b["start"]]):
+            mult_a = a["multiplier"] if a["multiplier"] is not None else b["multiplier"]
+            low, high = _to_vnd(a["value"], mult_a), _to_vnd(b["value"], b["multiplier"])
+            filters["price_min"], filters["price_max"] = min(low, high), max(low, high)
+            used.update((id(a), id(b)))
+
+    for a in amounts:
+        if id(a) in used:
+            continue
+        before = text[max(0, a["start"] - 25):a["start"]]
+        after = text[a["end"]:a["end"] + 15]
+        value = _to_vnd(a["value"], a["multiplier"])
+        if _starts_with_any(after, MAX_AFTER):
+            filters["price_max"] = value
+        elif _starts_with_any(after, MIN_AFTER):
+            filters["price_min"] = value
+        elif _ends_with_any(before, MAX_BEFORE):
+            filters["price_max"] = value
+        elif _ends_with_any(before, MIN_BEFORE):
+            filters["price_min"] = value
+        elif _ends_with_any(before, APPROX_BEFORE) or a["multiplier"] is not None:
+            filters["price_min"], filters["price_max"] = int(value * 0.9), int(value * 1.1)
+        elif re.search(r"[^\W\d_]\s*$", before):
+            models.add(id(a))  # số đời máy: "iphone 15", "xperia 10" (giữ lại trong phần còn lại)
+        else:
+            issues.append(f"unparsed number: {text[a['start']:a['end']].strip()}")
+        used.add(id(a))
+
+    for a in amounts:
+        if id(a) not in models:
+            text = _blank(text, a["start"], a["end"])
+
+    if filters["price_min"] is None and filters["price_max"] is None:
+        if re.search(r"(?<!\w)(triệu|trieu|tr|củ|nghìn|ngàn|vnđ|vnd)(?!\w)", text):
+            issues.append("price unit without amount")
+    return text
+
+
+def _is_lower_bound(text: str, start: int, end: int) -> bool:
+    return (_ends_with_any(text[max(0, start - 12):start], MIN_BEFORE)
+            or _starts_with_any(text[end:end + 12], MIN_AFTER))
+
+
+def _parse_memories(text: str, filters: dict, issues: list, vocab: dict) -> str:
+    for m in list(MEMORY_RE.finditer(text)):
+        mem = f"{m.group(1)}{m.group(2).upper()}"
+        before = text[max(0, m.start() - 12):m.start()]
+        if _is_lower_bound(text, m.start(), m.end()):
+            filters["memory_min_gb"] = int(m.group(1)) * (1024 if m.group(2) == "tb" else 1)
+        elif mem in vocab["memories"] or any(cue in before for cue in MEMORY_CUES):
+            if mem not in filters["memories"]:
+                filters["memories"].append(mem)
+        elif mem in STORAGE_SIZES:
+            continue  # giữ trong phần còn lại để khớp tên máy
+        else:
+            issues.append(f"unknown memory: {mem}")
+        text = _blank(text, m.start(), m.end())
+
+    if not filters["memories"] and not filters["memory_min_gb"] \
+            and re.search(r"(?<!\w)ram(?!\w)", text) and re.search(r"\d", text):
+        issues.append("ram without size")
+    return text
+
+
+def _parse_colors(text: str, filters: dict, issues: list, vocab: dict) -> str:
+    phrases = dict(VI_COLORS)
+    phrases.update({c: c for c in vocab["colors"]})
+    for phrase in sorted(phrases, key=len, reverse=True):
+        for m in list(_phrase_re(phrase).finditer(text)):
+            colors = phrases[phrase]
+            for color in (colors,) if isinstance(colors, str) else colors:
+                if color not in filters["colors"]:
+                    filters["colors"].append(color)
+            text = _blank(text, m.start(), m.end())
+
+    if not filters["colors"]:
+        m = re.search(r"(?<!\w)màu\s+(\w+)", text)
+        if m and m.group(1) not in COLOR_QUESTION_WORDS:
+            issues.append(f"unknown color: {m.group(1)}")
+    return text
+
+
+def _parse_status(text: str, filters: dict) -> str:
+    for phrase, status in STATUS_PHRASES:
+        m = _phrase_re(phrase).search(text)
+        if m:
+            filters["status"] = filters["status"] or status
+            text = _blank(text, m.start(), m.end())
+    return text
+
+
+def _parse_attributes(text: str, filters: dict) -> str:
+    for regex, fmt, bound in ((HZ_RE, "{}Hz", "refresh_min_hz"), (MAH_RE, "{} mAh", "battery_min_mah")):
+        for m in list(regex.finditer(text)):
+            if _is_lower_bound(text, m.start(), m.end()):
+                filters[bound] = int(m.group(1))
+            else:
+                filters["attributes"].append(fmt.format(m.group(1)))
+            text = _blank(text, m.start(), m.end())
+
+    for phrase, attr in ATTRIBUTE_PHRASES:
+        for m in list(_phrase_re(phrase).finditer(text)):
+            if attr not in filters["attributes"]:
+                filters["attributes"].append(attr)
+            text = _blank(text, m.start(), m.end())
+    return text
+
+
+def parse_filters(query: str, vocab: dict = None) -> ParseResult:
+    """Rule-based version of database.extract_filters.
+
+    Returns the same filter dict as the LLM extractor plus a confidence score;
+    every cue we could not resolve (a stray number, an unknown color...) lowers it.
+    """
+    vocab = vocab or load_vocab()
+    filters, issues = empty_filters(), []
+    text = normalize_query(query)
+
+    # Thứ tự quan trọng: các token có đơn vị (GB, Hz, mAh) phải được xử lý trước giá,
+    # và giá trước màu để "đồng" trong "10 triệu đồng" không bị hiểu là màu
+    text = _parse_attributes(text, filters)
+    text = _parse_memories(text, filters, issues, vocab)
+    text = _parse_status(text, filters)
+    text = _parse_price(text, filters, issues)
+    text = _parse_colors(text, filters, issues, vocab)
+
+    confidence = max(0.0, 1.0 - 0.35 * len(issues))
+    return ParseResult(filters=filters, confidence=confidence, issues=issues, rest=text)
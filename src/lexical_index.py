@@ -0,0 +1,108 @@
+import gzip
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from catalog import parse_attributes
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "lexical_index.json.gz")
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# "12 GB" -> "12gb", "120 Hz" -> "120hz" để khớp token như trong tên máy
+_UNIT_RE = re.compile(r"(\d+)\s+(gb|tb|hz|mah|mp|nits|w)\b")
+
+
+def tokenize(text: str) -> list:
+    text = unicodedata.normalize("NFC", str(text)).lower()
+    text = _UNIT_RE.sub(r"\1\2", text)
+    return re.findall(r"\w+", text)
+
+
+def lexical_text(metadata: dict) -> str:
+    # Cột attributes trong CSV bị lặp do JOIN; chỉ index mỗi thuộc tính một lần để tf không bị thổi phồng
+    attributes = parse_attributes(metadata.get("Attributes"))
+    return " ".join([
+        metadata.get("ProductName", ""), metadata.get("Color", ""), metadata.get("Memory", ""),
+        metadata.get("Status", ""), *(f"{k} {v}" for k, v in attributes.items()),
+    ])
+
+
+class BM25Index:
+    def __init__(self, metadatas, texts, k1: float = 1.2, b: float = 0.75):
+        self.metadatas = list(metadatas)
+        self.texts = list(texts)
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = []
+        for i, metadata in enumerate(self.metadatas):
+            counts = Counter(tokenize(lexical_text(metadata)))
+            self.lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                self.postings.setdefault(token, []).append((i, tf))
+        self.avgdl = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    def _idf(self, token: str) -> float:
+        df = len(self.postings.get(token, ()))
+        n = len(self.lengths)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 10, accept=None) -> list:
+        scores = {}
+        for token in set(tokenize(query)):
+            idf = self._idf(token)
+            for i, tf in self.postings.get(token, ()):
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avgdl or 1))
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        out = []
+        for i in ranked:
+            if accept is None or accept(self.metadatas[i]):
+                out.append(Document(page_content=self.texts[i], metadata=self.metadatas[i]))
+                if len(out) >= k:
+                    break
+        return out
+
+    def save(self, path: str = LEXICAL_INDEX_PATH):
+        # Ghi ra file tạm rồi thay thế để tiến trình đang đọc không thấy file ghi dở
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "metadatas": self.metadatas, "texts": self.texts,
+                       "postings": self.postings, "lengths": self.lengths}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str = LEXICAL_INDEX_PATH):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls.__new__(cls)
+        index.k1, index.b = data["k1"], data["b"]
+        index.metadatas, index.texts, index.lengths = data["metadatas"], data["texts"], data["lengths"]
+        index.postings = {t: [tuple(p) for p in plist] for t, plist in data["postings"].items()}
+        index.avgdl = sum(index.lengths) / len(index.lengths) if index.lengths else 0.0
+        return index
+
+
+def reciprocal_rank_fusion(result_lists, key, k: int = RRF_K) -> list:
+    """Fuse ranked Document lists by key().
+
+    A key is ranked by its first document in each list; all of its documents
+    are returned together, in fused order.
+    """
+    scores, groups = {}, {}
+    for results in result_lists:
+        ranks = {}
+        for doc in results:
+            doc_key = key(doc)
+            ranks.setdefault(doc_key, len(ranks))
+            groups.setdefault(doc_key, []).append(doc)
+        for doc_key, rank in ranks.items():
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (k + rank + 1)
+    return [doc for doc_key in sorted(scores, key=scores.get, reverse=True) for doc in groups[doc_key]]
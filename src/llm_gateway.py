@@ -0,0 +1,301 @@
+"""Shared front door for every Groq call (answers and filter extraction).
+
+    gateway = LLMGateway(ChatGroq(...), fallback=ChatGroq(model_name="llama3-8b-8192"))
+    gateway.invoke(messages)              # same interface as the chat model
+    async for chunk in gateway.astream(messages): ...
+
+- identical in-flight requests (same messages, same call type) share one
+  upstream call; streams replay the chunks already received to late joiners
+- requests and prompt tokens go through token buckets sized to the provider
+  quota (LLM_RPM / LLM_TPM, per model)
+- LLM_WORKERS async workers on a background event loop; at most
+  LLM_MAX_QUEUE calls wait, beyond that GatewayOverloaded is raised
+- rate limits / timeouts / 5xx are retried with full-jitter backoff (a
+  stream only until its first chunk)
+- each attempt is cut off after LLM_CALL_TIMEOUT seconds so a hung upstream
+  call cannot hold a worker; GatewayTimeout once the retries are spent
+- once LLM_FALLBACK_DEPTH calls are waiting, new calls go to the fallback model
+"""
+import asyncio
+import atexit
+import hashlib
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import telemetry
+from context_builder import estimate_tokens
+
+# Quota mặc định của Groq cho llama3-70b-8192 (free tier); 0 = không giới hạn
+LLM_RPM = float(os.getenv("LLM_RPM", "30"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+# Số giây quota được phép dồn thành một đợt
+LLM_BURST_SECONDS = float(os.getenv("LLM_BURST_SECONDS", "10"))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_FALLBACK_DEPTH = int(os.getenv("LLM_FALLBACK_DEPTH", "16"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "3"))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "0.5"))
+LLM_BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", "8"))
+# Thời gian tối đa cho một lần gọi (cả stream); 0 = không giới hạn
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "60"))
+
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+_DONE = object()
+
+
+class GatewayOverloaded(RuntimeError):
+    """Raised instead of queueing when LLM_MAX_QUEUE calls are already waiting."""
+
+
+class GatewayTimeout(GatewayOverloaded):
+    """Raised when a call still has no complete answer after LLM_CALL_TIMEOUT on every attempt."""
+
+
+class TokenBucket:
+    """`rate` units per second, bursts up to `capacity`; rate <= 0 disables it.
+    Only used from the gateway event loop, so no lock."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return waited
+            delay = (amount - self.tokens) / self.rate
+            waited += delay
+            await asyncio.sleep(delay)
+
+
+class _Route:
+    def __init__(self, name: str, client, rpm: float, tpm: float, burst_seconds: float):
+        self.name = name
+        self.client = client
+        self.requests = TokenBucket(rpm / 60, max(1.0, rpm / 60 * burst_seconds))
+        self.tokens = TokenBucket(tpm / 60, max(1.0, tpm / 60 * burst_seconds))
+
+    async def acquire(self, prompt_tokens: int) -> float:
+        return await self.requests.acquire() + await self.tokens.acquire(prompt_tokens)
+
+
+class _Call:
+    def __init__(self, key: str, messages, stream: bool, route: _Route):
+        self.key = key
+        self.messages = messages
+        self.stream = stream
+        self.route = route
+        self.enqueued = time.perf_counter()
+        self.future = Future()
+        self.lock = threading.Lock()
+        self.chunks = []
+        self.subscribers = []
+        self.finished = None
+
+    def subscribe(self, deliver):
+        # Người đến sau nhận lại các chunk đã có rồi mới nhận tiếp
+        with self.lock:
+            for chunk in self.chunks:
+                deliver(chunk)
+            if self.finished is not None:
+                deliver(self.finished)
+            else:
+                self.subscribers.append(deliver)
+
+    def publish(self, chunk):
+        with self.lock:
+            self.chunks.append(chunk)
+            for deliver in self.subscribers:
+                deliver(chunk)
+
+    def finish(self, result=None, error: BaseException = None):
+        if not self.stream:
+            if error is not None:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(result)
+            return
+        with self.lock:
+            self.finished = error if error is not None else _DONE
+            for deliver in self.subscribers:
+                deliver(self.finished)
+            self.subscribers.clear()
+
+
+def _key(messages, stream: bool) -> str:
+    digest = hashlib.sha256(b"stream" if stream else b"invoke")
+    for m in messages:
+        digest.update(f"\0{getattr(m, 'type', '')}\0{getattr(m, 'content', m)}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_retryable(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status in RETRY_STATUS:
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    # groq.RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+    return any(word in type(error).__name__ for word in ("RateLimit", "Timeout", "Connection", "InternalServer"))
+
+
+class LLMGateway:
+    def __init__(self, client, fallback=None, workers: int = LLM_WORKERS, max_queue: int = LLM_MAX_QUEUE,
+                 fallback_depth: int = LLM_FALLBACK_DEPTH, rpm: float = LLM_RPM, tpm: float = LLM_TPM,
+                 retries: int = LLM_RETRIES, backoff: float = LLM_BACKOFF, backoff_cap: float = LLM_BACKOFF_CAP,
+                 burst_seconds: float = LLM_BURST_SECONDS, timeout: float = LLM_CALL_TIMEOUT):
+        self.client = client
+        self.primary = _Route("primary", client, rpm, tpm, burst_seconds)
+        self.fallback = _Route("fallback", fallback, rpm, tpm, burst_seconds) if fallback is not None else None
+        self.workers = workers
+        self.max_queue = max_queue
+        self.fallback_depth = fallback_depth
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.depth = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+
+    def __getattr__(self, name):
+        # model_name, temperature... của client chính
+        if name == "client":
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True).start()
+            asyncio.run_coroutine_threadsafe(self._start(), loop).result()
+            self._loop = loop
+            atexit.register(self.close)
+
+    async def _start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.get_running_loop().create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def close(self):
+        """Stop the workers and the background loop (calls still queued are dropped)."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._stop(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    def _submit(self, messages, stream: bool, deliver=None) -> _Call:
+        self._ensure_loop()
+        key = _key(messages, stream)
+        with self._lock:
+            call = self._inflight.get(key)
+            if call is not None:
+                telemetry.incr("llm_gateway_requests_total", result="coalesced")
+            else:
+                if self.depth >= self.max_queue:
+                    telemetry.incr("llm_gateway_requests_total", result="rejected")
+                    raise GatewayOverloaded(f"{self.depth} LLM calls already queued")
+                route = self.primary
+                if self.fallback is not None and self.depth >= self.fallback_depth:
+                    route = self.fallback
+                    telemetry.incr("llm_gateway_fallbacks_total")
+                call = self._inflight[key] = _Call(key, messages, stream, route)
+                self.depth += 1
+                telemetry.incr("llm_gateway_requests_total", result="queued")
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, call)
+        if stream:
+            call.subscribe(deliver)
+        return call
+
+    async def _worker(self):
+        while True:
+            call = await self._queue.get()
+            with self._lock:
+                self.depth -= 1
+            telemetry.observe("llm_gateway_queue_seconds", time.perf_counter() - call.enqueued)
+            try:
+                await self._run(call)
+            finally:
+                with self._lock:
+                    self._inflight.pop(call.key, None)
+
+    async def _attempt(self, call: _Call):
+        if call.stream:
+            async for chunk in call.route.client.astream(call.messages):
+                call.publish(chunk)
+            call.finish()
+        else:
+            call.finish(await call.route.client.ainvoke(call.messages))
+
+    async def _run(self, call: _Call):
+        prompt_tokens = sum(estimate_tokens(str(getattr(m, "content", m))) for m in call.messages)
+        for attempt in range(self.retries + 1):
+            waited = await call.route.acquire(prompt_tokens)
+            if waited:
+                telemetry.observe("llm_gateway_throttle_seconds", waited, route=call.route.name)
+            try:
+                await asyncio.wait_for(self._attempt(call), self.timeout if self.timeout > 0 else None)
+                return
+            except Exception as e:
+                # Stream đã gửi chunk cho người dùng thì không thử lại được
+                if attempt >= self.retries or call.chunks or not is_retryable(e):
+                    telemetry.incr("llm_gateway_errors_total", route=call.route.name, error=type(e).__name__)
+                    if isinstance(e, asyncio.TimeoutError):
+                        e = GatewayTimeout(f"no answer from {call.route.name} within {self.timeout:g}s")
+                    call.finish(error=e)
+                    return
+                telemetry.incr("llm_gateway_retries_total", route=call.route.name)
+                await asyncio.sleep(random.uniform(0, min(self.backoff_cap, self.backoff * 2 ** attempt)))
+
+    def invoke(self, messages, **kwargs):
+        return self._submit(messages, stream=False).future.result()
+
+    async def ainvoke(self, messages, **kwargs):
+        return await asyncio.wrap_future(self._submit(messages, stream=False).future)
+
+    def stream(self, messages, **kwargs):
+        items = queue.Queue()
+        self._submit(messages, stream=True, deliver=items.put)
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    async def astream(self, messages, **kwargs):
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        self._submit(messages, stream=True, deliver=lambda item: loop.call_soon_threadsafe(items.put_nowait, item))
+        while True:
+            item = await items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
@@ -0,0 +1,229 @@
+"""In-process vector index: memory-mapped float32 matrix + metadata columns.
+
+    python local_index.py --from-chroma            # export vectors already in chroma_db/
+    python local_index.py --csv product_data.csv   # embed the catalog with MODEL_NAME
+    python local_index.py --from-chroma --quantization int8   # + int8 codes for the first pass
+"""
+import argparse
+import json
+import operator
+import os
+
+import numpy as np
+from langchain_core.documents import Document
+
+from quantization import CODES_FILE, QUANTIZER_FILE, fit_quantizer, load_quantized, save_quantized
+
+try:
+    import hnswlib
+except ImportError:  # HNSW là tuỳ chọn, mặc định tìm kiếm chính xác bằng NumPy
+    hnswlib = None
+
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+HNSW_THRESHOLD = int(os.getenv("LOCAL_INDEX_HNSW_THRESHOLD", "50000"))
+MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+# none | int8 | pq: mã nén dùng cho lượt tìm đầu, sau đó xếp lại bằng vector float
+QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION", "none")
+PQ_SUBSPACES = int(os.getenv("LOCAL_INDEX_PQ_SUBSPACES", "48"))
+# Số ứng viên xếp lại = max(k * RERANK_FACTOR, RERANK_MIN); dưới ~40 thì recall của int8 / PQ giảm rõ
+RERANK_FACTOR = int(os.getenv("LOCAL_INDEX_RERANK", "4"))
+RERANK_MIN = int(os.getenv("LOCAL_INDEX_RERANK_MIN", "40"))
+
+_COMPARE = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+def build_local_index(texts, metadatas, vectors, out_dir: str = LOCAL_INDEX_DIR, model: str = MODEL_NAME,
+                      quantization: str = QUANTIZATION, subspaces: int = PQ_SUBSPACES):
+    os.makedirs(out_dir, exist_ok=True)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    np.save(os.path.join(out_dir, "vectors.npy"), vectors)
+    with open(os.path.join(out_dir, "documents.json"), "w", encoding="utf-8") as f:
+        json.dump({"texts": list(texts), "metadatas": list(metadatas)}, f, ensure_ascii=False)
+    for name in ("hnsw.bin", QUANTIZER_FILE, CODES_FILE):
+        if os.path.exists(os.path.join(out_dir, name)):
+            os.remove(os.path.join(out_dir, name))
+    if quantization != "none":
+        quantizer = fit_quantizer(quantization, vectors, subspaces)
+        save_quantized(out_dir, quantizer, quantizer.encode(vectors))
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model, "rows": int(vectors.shape[0]), "dim": int(vectors.shape[1]),
+                   "quantization": quantization}, f)
+    return out_dir
+
+
+def read_manifest(directory: str = LOCAL_INDEX_DIR) -> dict:
+    with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class LocalVectorIndex:
+    """Drop-in for the LangChain vector stores used by database.py.
+
+    Metadata filters (same dicts as Chroma/Pinecone) become boolean masks
+    over column arrays before any scoring. Exact search is one matrix-vector
+    product; above `hnsw_threshold` candidate rows an HNSW index is used
+    when hnswlib is installed. A quantized index (int8 / PQ codes in memory)
+    scores the codes first and re-ranks the top max(k * `rerank`, `rerank_min`)
+    rows with the memory-mapped float vectors.
+    """
+
+    def __init__(self, directory: str = LOCAL_INDEX_DIR, embeddings=None, hnsw_threshold: int = HNSW_THRESHOLD,
+                 rerank: int = RERANK_FACTOR, rerank_min: int = RERANK_MIN):
+        self.directory = directory
+        self.embeddings = embeddings
+        self.hnsw_threshold = hnsw_threshold
+        self.rerank = rerank
+        self.rerank_min = rerank_min
+        self.matrix = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.quantizer, self.codes = None, None
+        if read_manifest(directory).get("quantization", "none") != "none":
+            self.quantizer, self.codes = load_quantized(directory)
+        with open(os.path.join(directory, "documents.json"), encoding="utf-8") as f:
+            data = json.load(f)
+        self.texts = data["texts"]
+        self.metadatas = data["metadatas"]
+        self.columns = self._build_columns(self.metadatas)
+        self._hnsw = None
+
+    @staticmethod
+    def _build_columns(metadatas) -> dict:
+        keys = {k for m in metadatas for k in m}
+        columns = {}
+        for key in keys:
+            values = [m.get(key) for m in metadatas]
+            if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+                columns[key] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                columns[key] = np.array(["" if v is None else str(v) for v in values], dtype=object)
+        return columns
+
+    def _mask(self, where) -> np.ndarray:
+        n = self.matrix.shape[0]
+        if not where:
+            return np.ones(n, dtype=bool)
+        if "$and" in where:
+            return np.logical_and.reduce([self._mask(c) for c in where["$and"]])
+        if "$or" in where:
+            return np.logical_or.reduce([self._mask(c) for c in where["$or"]])
+
+        mask = np.ones(n, dtype=bool)
+        for key, cond in where.items():
+            column = self.columns.get(key)
+            if column is None:
+                return np.zeros(n, dtype=bool)
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            for op, value in cond.items():
+                if op in _COMPARE:
+                    with np.errstate(invalid="ignore"):
+                        mask &= _COMPARE[op](column, value)
+                elif op == "$eq":
+                    mask &= column == value
+                elif op == "$ne":
+                    mask &= column != value
+                elif op == "$in":
+                    mask &= np.isin(column, list(value))
+                elif op == "$nin":
+                    mask &= ~np.isin(column, list(value))
+                else:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+        return mask
+
+    def _hnsw_index(self):
+        if self._hnsw is None:
+            dim = self.matrix.shape[1]
+            index = hnswlib.Index(space="ip", dim=dim)
+            path = os.path.join(self.directory, "hnsw.bin")
+            if os.path.exists(path):
+                index.load_index(path, max_elements=self.matrix.shape[0])
+            else:
+                index.init_index(max_elements=self.matrix.shape[0], ef_construction=200, M=16)
+                index.add_items(np.asarray(self.matrix), np.arange(self.matrix.shape[0]))
+                index.save_index(path)
+            index.set_ef(128)
+            self._hnsw = index
+        return self._hnsw
+
+    def search_ids(self, embedding, k: int = 4, where=None):
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        mask = self._mask(where)
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return [], []
+        k = min(k, len(candidates))
+
+        if hnswlib is not None and len(candidates) > self.hnsw_threshold:
+            full = len(candidates) == len(mask)
+            labels, distances = self._hnsw_index().knn_query(
+                query, k=k, filter=None if full else (lambda label: bool(mask[label])))
+            return labels[0].tolist(), (1.0 - distances[0]).tolist()
+
+        full = len(candidates) == len(mask)
+        if self.quantizer is not None:
+            approx = self.quantizer.scores(self.codes if full else self.codes[candidates], query)
+            shortlist = candidates[_top(approx, min(len(candidates), max(k * self.rerank, self.rerank_min)))]
+            # Chỉ đọc các dòng float của danh sách rút gọn từ memmap
+            shortlist.sort()
+            scores = self.matrix[shortlist] @ query
+            top = _top(scores, k)
+            return shortlist[top].tolist(), scores[top].tolist()
+
+        scores = self.matrix @ query if full else self.matrix[candidates] @ query
+        top = _top(scores, k)
+        return candidates[top].tolist(), scores[top].tolist()
+
+    def similarity_search_by_vector_with_score(self, embedding, k: int = 4, filter=None, **kwargs):
+        ids, scores = self.search_ids(embedding, k=k, where=filter)
+        return [(Document(page_content=self.texts[i], metadata=self.metadatas[i]), s) for i, s in zip(ids, scores)]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def similarity_search(self, query: str, k: int = 4, filter=None, **kwargs):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, filter=filter)
+
+
+def _top(scores, k: int) -> np.ndarray:
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def export_chroma(chroma_path: str = "./chroma_db", collection_name: str = "products"):
+    import chromadb
+    from collection_alias import resolve
+
+    client = chromadb.PersistentClient(path=chroma_path)
+    data = client.get_collection(resolve(collection_name)).get(include=["embeddings", "metadatas", "documents"])
+    return data["documents"], data["metadatas"], data["embeddings"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--from-chroma", action="store_true", help="reuse the vectors stored in chroma_db/")
+    parser.add_argument("--csv", default="product_data.csv", help="CSV, Parquet export or Arrow snapshot")
+    parser.add_argument("--out", default=LOCAL_INDEX_DIR)
+    parser.add_argument("--quantization", choices=["none", "int8", "pq"], default=QUANTIZATION)
+    parser.add_argument("--subspaces", type=int, default=PQ_SUBSPACES, help="PQ subspaces (must divide dim)")
+    args = parser.parse_args()
+
+    if args.from_chroma:
+        from chroma_sync import MODEL_NAME as chroma_model
+        texts, metadatas, vectors = export_chroma()
+        build_local_index(texts, metadatas, vectors, args.out, model=chroma_model,
+                          quantization=args.quantization, subspaces=args.subspaces)
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from embedding_cache import CachedEmbeddings
+        from snapshot import load_documents
+
+        texts, metadatas = load_documents(args.csv)
+        embeddings = CachedEmbeddings(HuggingFaceEmbeddings(model_name=MODEL_NAME))
+        build_local_index(texts, metadatas, embeddings.embed_documents(texts), args.out, model=MODEL_NAME,
+                          quantization=args.quantization, subspaces=args.subspaces)
+    print(f"✅ Local index written to {args.out}: {read_manifest(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
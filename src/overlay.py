@@ -0,0 +1,211 @@
+"""Live price / stock overlay for retrieved variant documents.
+
+    overlay = PriceOverlay(sql_fetcher())           # or snapshot_fetcher() offline
+    docs = overlay.apply(docs)                      # Price / Status / Quantity / Sale refreshed
+
+Price, quantity, sale and the variant-detail status are not part of the
+embedded text; the vector metadata only keeps the values of the last sync
+for store pre-filtering. At answer time the current values are joined in
+by DetailId from a TTL cache, filled with one batched lookup per call for
+the ids that are missing or expired.
+
+The default source is the live product_variant_details table. The snapshot
+source only knows the values of the last dbtocsv / snapshot export, so it is
+no fresher than the vector metadata; use it for offline runs and benchmarks.
+SQL connections are pooled (OVERLAY_POOL_SIZE). When the source fails, the
+documents keep their synced values and the source is not asked again for
+OVERLAY_ERROR_BACKOFF seconds, so an unreachable database costs one connect
+attempt and one warning per window instead of one per query.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+import pandas as pd
+
+import telemetry
+
+# sql (trực tiếp) | snapshot (bản xuất gần nhất, có thể cũ) | none
+OVERLAY_SOURCE = os.getenv("OVERLAY_SOURCE", "sql")
+# Các trường hay đổi được so lại trước khi dùng câu trả lời trong answer cache
+VOLATILE_FIELDS = ("Price", "Status")
+OVERLAY_TTL = float(os.getenv("OVERLAY_TTL", "30"))
+OVERLAY_MAX_ENTRIES = int(os.getenv("OVERLAY_MAX_ENTRIES", "100000"))
+# Sau một lần lỗi, không gọi nguồn trong khoảng này (giây)
+OVERLAY_ERROR_BACKOFF = float(os.getenv("OVERLAY_ERROR_BACKOFF", "30"))
+OVERLAY_POOL_SIZE = int(os.getenv("OVERLAY_POOL_SIZE", "4"))
+# SQL Server giới hạn 2100 tham số mỗi câu lệnh
+SQL_CHUNK = 1000
+
+
+def _number(value):
+    value = pd.to_numeric(value, errors="coerce")
+    return None if pd.isna(value) else float(value)
+
+
+def _fields(price, quantity, sale, status) -> dict:
+    status = "" if status is None or pd.isna(status) else str(status).strip().upper()
+    fields = {"Price": _number(price), "Status": status or None, "Quantity": _number(quantity), "Sale": _number(sale)}
+    return {k: v for k, v in fields.items() if v is not None}
+
+
+def _close(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def sql_fetcher(connect=None, pool_size: int = OVERLAY_POOL_SIZE):
+    """fetch(ids) -> {id: fields} reading product_variant_details.
+
+    Connections are reused: each call takes an idle one (or opens a new one)
+    and returns it afterwards; at most `pool_size` are kept idle and a
+    connection that raised is closed instead of being returned.
+    """
+    from sql_source import connect as default_connect, in_clause
+
+    connect = connect or default_connect
+    idle = queue.LifoQueue()
+
+    def fetch(ids):
+        try:
+            conn = idle.get_nowait()
+        except queue.Empty:
+            conn = connect()
+        found = {}
+        try:
+            for start in range(0, len(ids), SQL_CHUNK):
+                clause, values = in_clause("id", ids[start:start + SQL_CHUNK])
+                rows = conn.execute(f"SELECT id, price, quantity, sale, status FROM product_variant_details "
+                                    f"WHERE {clause}", values).fetchall()
+                for detail_id, price, quantity, sale, status in rows:
+                    found[str(detail_id)] = _fields(price, quantity, sale, status)
+        except Exception:
+            _close(conn)
+            raise
+        if idle.qsize() < pool_size:
+            idle.put(conn)
+        else:
+            _close(conn)
+        return found
+
+    return fetch
+
+
+def snapshot_fetcher(path: str = None):
+    """fetch(ids) from the catalog snapshot (or CSV), re-read when the file changes."""
+    from filter_parser import CATALOG_CSV
+    from snapshot import SNAPSHOT_PATH, read_table
+
+    lock = threading.Lock()
+    loaded = {"mtime": None, "rows": {}}
+
+    def rows():
+        source = path or (SNAPSHOT_PATH if os.path.exists(SNAPSHOT_PATH) else CATALOG_CSV)
+        mtime = os.path.getmtime(source)
+        with lock:
+            if loaded["mtime"] != mtime:
+                df = read_table(source)
+                df = df[df["product_variant_detail_id"].notna()]
+                loaded["rows"] = {
+                    str(r["product_variant_detail_id"]): _fields(r["price"], r.get("quantity"), r.get("sale"),
+                                                                 r.get("product_variant_detail_status"))
+                    for r in df.to_dict("records")
+                }
+                loaded["mtime"] = mtime
+            return loaded["rows"]
+
+    def fetch(ids):
+        table = rows()
+        return {i: table[i] for i in ids if i in table}
+
+    return fetch
+
+
+class PriceOverlay:
+    """TTL cache DetailId -> current Price / Status / Quantity / Sale."""
+
+    def __init__(self, fetch, ttl: float = OVERLAY_TTL, max_entries: int = OVERLAY_MAX_ENTRIES,
+                 error_backoff: float = OVERLAY_ERROR_BACKOFF):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.error_backoff = error_backoff
+        self._entries = {}  # id -> (expires_at, fields or None)
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+
+    def lookup(self, ids) -> dict:
+        """{id: fields} for the ids known to the source (misses are cached too)."""
+        ids = list(dict.fromkeys(i for i in ids if i))
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for i in ids:
+                entry = self._entries.get(i)
+                if entry is not None and entry[0] > now:
+                    if entry[1] is not None:
+                        found[i] = entry[1]
+                else:
+                    missing.append(i)
+        telemetry.incr("overlay_lookups_total", len(ids) - len(missing), result="hit")
+        if not missing:
+            return found
+
+        if now < self._retry_at:
+            # Nguồn vừa lỗi: giữ giá của lần sync trước, không thử lại ngay
+            telemetry.incr("overlay_lookups_total", len(missing), result="backoff")
+            return found
+        telemetry.incr("overlay_lookups_total", len(missing), result="miss")
+        try:
+            with telemetry.span("overlay_fetch", ids=len(missing)):
+                fetched = self.fetch(missing)
+        except Exception as e:
+            self._retry_at = time.monotonic() + self.error_backoff
+            telemetry.incr("overlay_errors_total")
+            telemetry.log("overlay_fetch_error", always=True, level=logging.WARNING, error=str(e),
+                          retry_in=self.error_backoff)
+            return found
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            if len(self._entries) + len(missing) > self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            for i in missing:
+                self._entries[i] = (expires, fetched.get(i))
+        found.update({i: fetched[i] for i in missing if i in fetched})
+        return found
+
+    def unchanged(self, prices: dict) -> bool:
+        """True when every {DetailId: [Price, Status]} of `prices` still has those values."""
+        live = self.lookup(prices)
+        return all(i not in live or [live[i].get(f) for f in VOLATILE_FIELDS] == list(values)
+                   for i, values in prices.items())
+
+    def apply(self, docs) -> list:
+        """Copies of `docs` with the live fields; documents without a DetailId are returned as is."""
+        from langchain_core.documents import Document
+
+        live = self.lookup(doc.metadata.get("DetailId") for doc in docs)
+        out = []
+        for doc in docs:
+            fields = live.get(doc.metadata.get("DetailId"))
+            # Không sửa metadata gốc vì store có thể trả lại cùng một dict
+            out.append(Document(page_content=doc.page_content, metadata={**doc.metadata, **fields}) if fields else doc)
+        return out
+
+
+def price_snapshot(docs) -> dict:
+    """{DetailId: [Price, Status]} of the documents an answer was built from."""
+    return {doc.metadata["DetailId"]: [doc.metadata.get(f) for f in VOLATILE_FIELDS]
+            for doc in docs if doc.metadata.get("DetailId")}
+
+
+def create_overlay(source: str = OVERLAY_SOURCE):
+    if source == "none":
+        return None
+    if source == "sql":
+        return PriceOverlay(sql_fetcher())
+    return PriceOverlay(snapshot_fetcher())
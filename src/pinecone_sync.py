@@ -1,120 +1,402 @@
 import os
-import pyodbc
+import argparse
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import pandas as pd
-from pinecone import Pinecone, ServerlessSpec
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from tqdm.auto import tqdm
 import time
 from dotenv import load_dotenv
+from catalog import detail_id, typed_metadata
+from sql_source import connect, has_column, in_clause
+from embedding_cache import CachedEmbeddings
+from answer_cache import publish_invalidation
 
 # Load environment variables from .env
 load_dotenv()
 
-# Pinecone configuration
-api_key = os.getenv("PINECONE_API_KEY")
-pc = Pinecone(api_key=api_key)
+index_name = 'product-catalog-1'
+STATE_PATH = os.getenv("PINECONE_SYNC_STATE", "pinecone_sync_state.db")
+WATERMARK_KEY = "updated_at"
+BATCH_SIZE = int(os.getenv("PINECONE_BATCH_SIZE", "100"))
+# Số lệnh upsert chạy song song trong khi batch tiếp theo đang được embed
+UPSERT_WORKERS = int(os.getenv("PINECONE_UPSERT_WORKERS", "4"))
+SYNC_RETRIES = int(os.getenv("PINECONE_SYNC_RETRIES", "3"))
+SYNC_BACKOFF = float(os.getenv("PINECONE_SYNC_BACKOFF", "0.5"))
+DEAD_LETTER_PATH = os.getenv("PINECONE_DEAD_LETTER", "pinecone_sync_dead_letter.jsonl")
 
-spec = ServerlessSpec(cloud="aws", region="us-east-1")
 
-index_name = 'product-catalog-1'
-existing_indexes = [index_info["name"] for index_info in pc.list_indexes()]
-
-if index_name not in existing_indexes:
-    pc.create_index(
-        name=index_name,
-        dimension=768,
-        metric='dotproduct',
-        spec=spec
-    )
-    while not pc.describe_index(index_name).status['ready']:
-        time.sleep(1)
-
-index = pc.Index(index_name)
-time.sleep(1)
-
-# SQL Server configuration
-conn = pyodbc.connect(
-    'DRIVER={ODBC Driver 17 for SQL Server};'
-    f'SERVER={os.getenv("SQL_SERVER_HOST")};'
-    f'DATABASE=ProductDB;'
-    f'UID={os.getenv("SQL_SERVER_USER")};'
-    f'PWD={os.getenv("SQL_SERVER_PASSWORD")}'
-)
-cursor = conn.cursor()
-
-# Google Gemini Embedding Model
-os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
-embed_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-
-def fetch_data():
-    query = """
-    SELECT 
+def get_index():
+    # Pinecone configuration (SDK chỉ cần khi ghi thật; --dry-run / bench chạy không cần)
+    from pinecone import Pinecone, ServerlessSpec
+
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    spec = ServerlessSpec(cloud="aws", region="us-east-1")
+
+    existing_indexes = [index_info["name"] for index_info in pc.list_indexes()]
+    if index_name not in existing_indexes:
+        pc.create_index(
+            name=index_name,
+            dimension=768,
+            metric='dotproduct',
+            spec=spec
+        )
+        while not pc.describe_index(index_name).status['ready']:
+            time.sleep(1)
+
+    index = pc.Index(index_name)
+    time.sleep(1)
+    return index
+
+
+def get_embed_model():
+    # Google Gemini Embedding Model
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
+    return CachedEmbeddings(GoogleGenerativeAIEmbeddings(model="models/embedding-001"))
+
+
+class DryRunIndex:
+    """Stand-in for the Pinecone index that only counts operations."""
+
+    def __init__(self):
+        self.upserted, self.updated, self.deleted = 0, 0, 0
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        with self._lock:
+            self.upserted += len(list(vectors))
+
+    def update(self, id, set_metadata):
+        self.updated += 1
+
+    def delete(self, ids):
+        self.deleted += len(ids)
+
+
+class SyncState:
+    """Per-vector content hashes and the updated_at watermark, kept in SQLite."""
+
+    def __init__(self, path: str = STATE_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS vectors (id TEXT PRIMARY KEY, text_hash TEXT, meta_hash TEXT);
+            CREATE TABLE IF NOT EXISTS watermarks (name TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def hashes(self) -> dict:
+        return {row[0]: (row[1], row[2]) for row in self.conn.execute("SELECT id, text_hash, meta_hash FROM vectors")}
+
+    def save(self, rows):
+        self.conn.executemany("INSERT OR REPLACE INTO vectors (id, text_hash, meta_hash) VALUES (?, ?, ?)", rows)
+        self.conn.commit()
+
+    def forget(self, ids):
+        self.conn.executemany("DELETE FROM vectors WHERE id = ?", [(i,) for i in ids])
+        self.conn.commit()
+
+    def watermark(self):
+        row = self.conn.execute("SELECT value FROM watermarks WHERE name = ?", (WATERMARK_KEY,)).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, value):
+        self.conn.execute("INSERT OR REPLACE INTO watermarks (name, value) VALUES (?, ?)", (WATERMARK_KEY, value))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def _hash(value) -> str:
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def fetch_data(conn, since=None):
+    # Không dùng STRING_AGG / nối chuỗi bằng '+' để chạy được trên mọi nguồn SQL cùng schema
+    # ProductDB (SQLQuery1.sql) không có product_variant_details.updated_at; chỉ dùng khi bảng có cột này
+    detail_ts = has_column(conn, "product_variant_details", "updated_at")
+    query = f"""
+    SELECT
+        pvd.id AS id,
         p.name AS product_name,
+        pv.id AS variant_id,
         pv.name AS variant_name,
-        pv.name + ' - ' + c.name + ' - ' + m.name AS pvd_name,
         pvd.price,
         pvd.status,
         c.name AS color_name,
         m.name AS memory_name,
-        STRING_AGG(a.name + ': ' + av.value, ', ') AS attributes
+        p.updated_at AS updated_at,
+        pv.updated_at AS product_variant_updated_at,
+        {"pvd.updated_at" if detail_ts else "NULL"} AS detail_updated_at
     FROM products p
     JOIN products_variants pv ON p.id = pv.product_id
     JOIN product_variant_details pvd ON pv.id = pvd.product_variant_id
-    JOIN attribute_values av ON av.product_variant_id = pv.id
-    JOIN attributes a ON av.attribute_id = a.id
     JOIN colors c ON c.id = pvd.color_id
     JOIN memories m ON pvd.memory_id = m.id
-    GROUP BY p.name, pv.name, pv.name + ' - ' + c.name + ' - ' + m.name, 
-             pvd.price, pvd.status, c.name, m.name
     """
-    df = pd.read_sql(query, conn)
+    params = []
+    if since is not None:
+        query += " WHERE p.updated_at > ? OR pv.updated_at > ?"
+        params = [since, since]
+        if detail_ts:
+            # Đổi giá / tồn kho chỉ chạm tới product_variant_details
+            query += " OR pvd.updated_at > ?"
+            params.append(since)
+    df = pd.read_sql(query, conn, params=params)
+    if df.empty:
+        return df
+
+    # SQL Server giới hạn 2100 tham số mỗi câu lệnh
+    variant_ids = df['variant_id'].unique().tolist()
+    chunks = []
+    for i in range(0, len(variant_ids), 1000):
+        clause, values = in_clause("av.product_variant_id", variant_ids[i:i + 1000])
+        chunks.append(pd.read_sql(f"""
+            SELECT av.product_variant_id AS variant_id, a.name, av.value
+            FROM attribute_values av
+            JOIN attributes a ON av.attribute_id = a.id
+            WHERE {clause}
+        """, conn, params=values))
+    attrs = pd.concat(chunks, ignore_index=True)
+    attrs = (
+        (attrs['name'] + ': ' + attrs['value'])
+        .groupby(attrs['variant_id']).agg(', '.join)
+        .rename('attributes')
+    )
+
+    df = df.join(attrs, on='variant_id')
+    df['attributes'] = df['attributes'].fillna('')
+    df['pvd_name'] = df['variant_name'] + ' - ' + df['color_name'] + ' - ' + df['memory_name']
     return df
 
-def sync_with_pinecone(data):
-    batch_size = 100
-    total_batches = (len(data) + batch_size - 1) // batch_size
 
-    for i in tqdm(range(0, len(data), batch_size), desc='Processing Batches', unit='batch', total=total_batches):
-        i_end = min(len(data), i + batch_size)
-        batch = data.iloc[i:i_end]
+def fetch_ids(conn) -> set:
+    return {str(row[0]) for row in conn.execute("SELECT id FROM product_variant_details").fetchall()}
 
-        ids = [f"{row['pvd_name']}_{i}" for i, row in batch.iterrows()]
 
-        texts = [
-            f"{row['pvd_name']}. Giá: {row['price']}. Màu sắc: {row['color_name']}. Bộ nhớ: {row['memory_name']}. "
-            f"Trạng thái: {row['status']}. Thuộc tính: {row['attributes']}"
-            for _, row in batch.iterrows()
-        ]
+def build_text(row) -> str:
+    return (
+        f"{row['pvd_name']}. Màu sắc: {row['color_name']}. Bộ nhớ: {row['memory_name']}. "
+        f"Thuộc tính: {row['attributes']}"
+    )
 
-        embeds = embed_model.embed_documents(texts)
 
-        metadata = [
-        {
-            'ProductName': row['product_name'],
-            'VariantName': row['variant_name'],
-            'Color': row['color_name'],
-            'Memory': row['memory_name'],
-            'Price': row['price'],
-            'Status': row['status'],
-            'Attributes': row['attributes'],
-            'text': texts[i]  
-        }
-            for i, row in batch.iterrows()
-        ]
+def build_metadata(row, text: str) -> dict:
+    return typed_metadata(
+        row['product_name'], row['color_name'], row['memory_name'],
+        row['price'], row['status'], row['attributes'],
+        VariantName=row['variant_name'],
+        text=text,
+        # Khóa để overlay.PriceOverlay nối giá / tồn kho hiện tại
+        **detail_id(row['id'])
+    )
+
+
+def prepare_rows(data):
+    """(ids, texts, metadatas) for every row of fetch_data's frame."""
+    records = data.to_dict('records')
+    texts = [build_text(row) for row in records]
+    metadatas = [build_metadata(row, text) for row, text in zip(records, texts)]
+    return [str(row['id']) for row in records], texts, metadatas
+
+
+def _with_retry(fn, retries: int, backoff: float):
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception:
+            if attempt >= retries:
+                raise
+            time.sleep(random.uniform(0, backoff * 2 ** attempt))
+
+
+def write_dead_letter(path: str, stage: str, error: BaseException, ids, texts, metadatas):
+    with open(path, "a", encoding="utf-8") as f:
+        for vector_id, text, metadata in zip(ids, texts, metadatas):
+            f.write(json.dumps({"ts": time.time(), "stage": stage, "error": repr(error), "id": vector_id,
+                                "text": text, "metadata": metadata}, ensure_ascii=False, default=str) + "\n")
+
+
+def read_dead_letter(path: str = DEAD_LETTER_PATH):
+    """(ids, texts, metadatas) of the rows in the dead-letter file (last entry per id)."""
+    rows = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            rows[entry["id"]] = (entry["text"], entry["metadata"])
+    return list(rows), [t for t, _ in rows.values()], [m for _, m in rows.values()]
+
+
+def pipelined_upsert(ids, texts, metadatas, index, embed_model, batch_size: int = BATCH_SIZE,
+                     workers: int = UPSERT_WORKERS, retries: int = SYNC_RETRIES, backoff: float = SYNC_BACKOFF,
+                     dead_letter_path: str = DEAD_LETTER_PATH, on_batch=None) -> dict:
+    """Embed batch N+1 while batch N (and up to `workers` - 1 others) is being upserted.
+
+    Both steps retry each batch with full-jitter backoff; rows of a batch that
+    still fails go to the dead-letter file. `on_batch(start, end)` runs in the
+    calling thread after a batch is upserted (e.g. to record sync state).
+    At most 2 * workers upserts are in flight, so memory stays bounded.
+    """
+    started = time.perf_counter()
+    stats = {"rows": len(ids), "upserted": 0, "failed": 0}
+
+    def harvest(finished):
+        for future in finished:
+            start, end = pending.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                write_dead_letter(dead_letter_path, "upsert", e, ids[start:end], texts[start:end], metadatas[start:end])
+                stats["failed"] += end - start
+                continue
+            stats["upserted"] += end - start
+            if on_batch is not None:
+                on_batch(start, end)
+            progress.update(end - start)
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool, \
+            tqdm(total=len(ids), desc='Upserting Vectors', unit='vector') as progress:
+        for start in range(0, len(ids), batch_size):
+            end = min(start + batch_size, len(ids))
+            try:
+                embeds = _with_retry(lambda: embed_model.embed_documents(texts[start:end]), retries, backoff)
+            except Exception as e:
+                write_dead_letter(dead_letter_path, "embed", e, ids[start:end], texts[start:end], metadatas[start:end])
+                stats["failed"] += end - start
+                continue
+            vectors = list(zip(ids[start:end], embeds, metadatas[start:end]))
+            if len(pending) >= 2 * max(1, workers):
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                harvest(finished)
+            future = pool.submit(_with_retry, lambda v=vectors: index.upsert(vectors=v), retries, backoff)
+            pending[future] = (start, end)
+        harvest(wait(pending)[0])
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    stats["rows_per_s"] = round(stats["upserted"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+    print(f"⏱️ {stats['upserted']}/{stats['rows']} rows in {stats['seconds']}s ({stats['rows_per_s']} rows/s, "
+          f"{workers} upsert workers)")
+    if stats["failed"]:
+        print(f"☠️ {stats['failed']} rows written to {dead_letter_path}")
+    return stats
 
-        print(metadata)
 
+def sync_with_pinecone(data, index, embed_model, state: SyncState = None, **kwargs) -> dict:
+    """Full sync; with `state`, hashes are saved per upserted batch so the next incremental run skips them."""
+    ids, texts, metadatas = prepare_rows(data)
+    on_batch = None
+    if state is not None:
+        on_batch = lambda start, end: state.save([(vid, _hash(text), _hash(meta)) for vid, text, meta
+                                                  in zip(ids[start:end], texts[start:end], metadatas[start:end])])
+    stats = pipelined_upsert(ids, texts, metadatas, index, embed_model, on_batch=on_batch, **kwargs)
+    # Còn dòng lỗi thì giữ watermark để lần sau lấy lại
+    if state is not None and not stats["failed"]:
+        _advance_watermark(data, state)
+    return stats
+
+
+def _advance_watermark(data, state: SyncState):
+    if data.empty:
+        return
+    columns = ['updated_at', 'product_variant_updated_at', 'detail_updated_at']
+    latest = max(str(v) for v in pd.concat([data[c] for c in columns]).dropna())
+    if state.watermark() is None or latest > state.watermark():
+        state.set_watermark(latest)
+
+
+def sync_incremental(conn, index, embed_model, state: SyncState, full_scan: bool = False) -> dict:
+    """Only re-embed rows whose embedded text changed.
+
+    Rows are fetched past the updated_at watermark (or all of them with
+    full_scan, which also catches price/attribute edits that do not touch
+    updated_at). Unchanged rows are skipped, metadata-only changes become
+    index.update calls and variant-detail ids gone from the source are deleted.
+    """
+    since = None if full_scan else state.watermark()
+    data = fetch_data(conn, since=since)
+    known = state.hashes()
+
+    to_embed, to_update = [], []
+    for vector_id, text, metadata in zip(*prepare_rows(data)):
+        text_hash, meta_hash = _hash(text), _hash(metadata)
+        old = known.get(vector_id)
+        if old is None or old[0] != text_hash:
+            to_embed.append((vector_id, text, metadata, meta_hash))
+        elif old[1] != meta_hash:
+            to_update.append((vector_id, metadata, meta_hash))
+
+    # Chỉ lưu hash của các batch đã upsert thành công; batch lỗi nằm trong dead-letter
+    stats = pipelined_upsert([vid for vid, _, _, _ in to_embed], [text for _, text, _, _ in to_embed],
+                     [meta for _, _, meta, _ in to_embed], index, embed_model,
+                     on_batch=lambda start, end: state.save([(vid, _hash(text), meta_hash)
+                                                            for vid, text, _, meta_hash in to_embed[start:end]]))
+
+    for vector_id, metadata, meta_hash in to_update:
+        index.update(id=vector_id, set_metadata=metadata)
+    state.save([(vid, known[vid][0], meta_hash) for vid, _, meta_hash in to_update])
+
+    deleted = sorted(set(known) - fetch_ids(conn))
+    for i in range(0, len(deleted), 1000):
+        index.delete(ids=deleted[i:i + 1000])
+    state.forget(deleted)
+
+    # Câu trả lời đã cache có nhắc tới sản phẩm vừa đổi sẽ bị loại bỏ
+    changed = [meta['ProductName'] for _, _, meta, _ in to_embed] + [meta['ProductName'] for _, meta, _ in to_update]
+    changed += [meta['VariantName'] for _, _, meta, _ in to_embed] + [meta['VariantName'] for _, meta, _ in to_update]
+    if changed or deleted:
+        publish_invalidation(changed, flush_all=bool(deleted))
+
+    if not stats["failed"]:
+        _advance_watermark(data, state)
+    return {"fetched": len(data), "embedded": len(to_embed), "metadata_only": len(to_update), "deleted": len(deleted),
+            "failed": stats["failed"]}
 
-        with tqdm(total=len(ids), desc='Upserting Vectors', unit='vector') as upsert_pbar:
-            index.upsert(vectors=zip(ids, embeds, metadata))
-            upsert_pbar.update(len(ids))
 
 def main():
-    data = fetch_data()
-    sync_with_pinecone(data)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["full", "incremental"], default="full")
+    parser.add_argument("--full-scan", action="store_true", help="incremental mode without the watermark")
+    parser.add_argument("--sqlite", help="read from a SQLite copy of ProductDB instead of SQL Server")
+    parser.add_argument("--dry-run", action="store_true", help="do not write to Pinecone")
+    parser.add_argument("--workers", type=int, default=UPSERT_WORKERS, help="concurrent upserts")
+    parser.add_argument("--replay-dead-letter", action="store_true",
+                        help="re-send the rows of the dead-letter file instead of syncing")
+    args = parser.parse_args()
+
+    conn = connect(args.sqlite)
+    index = DryRunIndex() if args.dry_run else get_index()
+    embed_model = get_embed_model()
+    state = SyncState()
+    try:
+        if args.replay_dead_letter:
+            ids, texts, metadatas = read_dead_letter(DEAD_LETTER_PATH)
+            # Dòng nào lỗi lần nữa sẽ được ghi vào file mới
+            os.replace(DEAD_LETTER_PATH, DEAD_LETTER_PATH + ".replayed")
+            pipelined_upsert(ids, texts, metadatas, index, embed_model, workers=args.workers,
+                             on_batch=lambda start, end: state.save(
+                                 [(vid, _hash(text), _hash(meta)) for vid, text, meta
+                                  in zip(ids[start:end], texts[start:end], metadatas[start:end])]))
+            publish_invalidation(flush_all=True)
+        elif args.mode == "full":
+            data = fetch_data(conn)
+            # Lưu hash để lần chạy incremental sau không phải embed lại toàn bộ
+            sync_with_pinecone(data, index, embed_model, state=state, workers=args.workers)
+            publish_invalidation(flush_all=True)
+        else:
+            stats = sync_incremental(conn, index, embed_model, state, full_scan=args.full_scan)
+            print(f"✅ Incremental sync: {stats}")
+        print(f"🗃️ Embedding cache: {embed_model.stats()}")
+    finally:
+        state.close()
+        conn.close()
+
 
 if __name__ == "__main__":
     main()
-
-cursor.close()
-conn.close()
@@ -0,0 +1,135 @@
+"""Compressed copies of the local index vectors for the first-pass search.
+
+    quantizer = Int8Quantizer.fit(vectors)          # 1 byte / dim
+    quantizer = ProductQuantizer.fit(vectors, 48)   # 1 byte / subspace
+    codes = quantizer.encode(vectors)
+    approx = quantizer.scores(codes, query)         # ≈ vectors @ query
+
+Only the codes (and the small codebook) are read into memory; the float32
+matrix stays memory-mapped and is touched only for the exact re-rank of the
+shortlisted rows (local_index.LocalVectorIndex).
+"""
+import os
+
+import numpy as np
+
+QUANTIZER_FILE = "quantizer.npz"
+CODES_FILE = "codes.npy"
+# Số dòng mỗi lần giải nén khi chấm điểm int8, để không cấp phát cả ma trận float
+SCORE_CHUNK = 4096
+
+
+class Int8Quantizer:
+    """Symmetric scalar quantization with one scale per dimension."""
+
+    kind = "int8"
+    fields = ("scale",)
+
+    def __init__(self, scale):
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return cls(np.maximum(np.abs(vectors).max(axis=0), 1e-12) / 127)
+
+    def encode(self, vectors) -> np.ndarray:
+        codes = np.rint(np.asarray(vectors, dtype=np.float32) / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def scores(self, codes, query) -> np.ndarray:
+        scaled = np.asarray(query, dtype=np.float32) * self.scale
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK):
+            out[start:start + SCORE_CHUNK] = codes[start:start + SCORE_CHUNK].astype(np.float32) @ scaled
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return self.scale.nbytes
+
+
+class ProductQuantizer:
+    """Product quantization: `subspaces` slices, 256 k-means centroids each, one uint8 code per slice.
+
+    Scores are asymmetric (float query against the centroids), computed with
+    one lookup table per query.
+    """
+
+    kind = "pq"
+    fields = ("centroids",)
+
+    def __init__(self, centroids):
+        # (subspaces, centroids, sub_dim)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, vectors, subspaces: int = 48, iterations: int = 20, seed: int = 0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+        if dim % subspaces:
+            raise ValueError(f"dim={dim} is not divisible by subspaces={subspaces}")
+        rng = np.random.default_rng(seed)
+        k = min(256, n)
+        parts = vectors.reshape(n, subspaces, dim // subspaces)
+        centroids = np.stack([_kmeans(parts[:, m], k, iterations, rng) for m in range(subspaces)])
+        return cls(centroids)
+
+    def encode(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        subspaces, _, sub_dim = self.centroids.shape
+        parts = vectors.reshape(len(vectors), subspaces, sub_dim)
+        return np.stack([_nearest(parts[:, m], self.centroids[m]) for m in range(subspaces)], axis=1).astype(np.uint8)
+
+    def scores(self, codes, query) -> np.ndarray:
+        subspaces, _, sub_dim = self.centroids.shape
+        table = np.einsum("mkd,md->mk", self.centroids, np.asarray(query, dtype=np.float32).reshape(subspaces, sub_dim))
+        return table[np.arange(subspaces), codes].sum(axis=1)
+
+    @property
+    def nbytes(self) -> int:
+        return self.centroids.nbytes
+
+
+QUANTIZERS = {q.kind: q for q in (Int8Quantizer, ProductQuantizer)}
+
+
+def _nearest(points, centroids) -> np.ndarray:
+    # ||x - c||² = ||x||² - 2x·c + ||c||², bỏ ||x||² vì không đổi theo c
+    distances = (centroids ** 2).sum(axis=1) - 2 * points @ centroids.T
+    return distances.argmin(axis=1)
+
+
+def _kmeans(points, k: int, iterations: int, rng) -> np.ndarray:
+    centroids = points[rng.choice(len(points), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest(points, centroids)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, points)
+        filled = counts > 0
+        # Cụm rỗng giữ nguyên tâm cũ
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+def fit_quantizer(kind: str, vectors, subspaces: int = 48):
+    if kind not in QUANTIZERS:
+        raise ValueError(f"Unknown quantization: {kind} (expected one of {sorted(QUANTIZERS)})")
+    if kind == "pq":
+        return ProductQuantizer.fit(vectors, subspaces)
+    return Int8Quantizer.fit(vectors)
+
+
+def save_quantized(directory: str, quantizer, codes):
+    np.savez(os.path.join(directory, QUANTIZER_FILE), kind=quantizer.kind,
+             **{name: getattr(quantizer, name) for name in quantizer.fields})
+    np.save(os.path.join(directory, CODES_FILE), codes)
+
+
+def load_quantized(directory: str):
+    """(quantizer, codes) written by save_quantized."""
+    with np.load(os.path.join(directory, QUANTIZER_FILE)) as data:
+        cls = QUANTIZERS[str(data["kind"])]
+        quantizer = cls(*(data[name] for name in cls.fields))
+    return quantizer, np.load(os.path.join(directory, CODES_FILE))
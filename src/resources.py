@@ -0,0 +1,192 @@
+"""Process-wide lazy singletons for the heavy clients (vector store, embedding model, Groq).
+
+Nothing is created at import time. Each getter builds its resource on first
+use, under a lock, and every later call (any Streamlit session or rerun in
+the same process) gets the same object.
+"""
+import functools
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+import telemetry
+from collection_alias import alias_stamp, resolve
+from embedding_cache import CachedEmbeddings
+
+load_dotenv()
+
+# pinecone | chroma | local
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LLM_MODEL = os.getenv("GROQ_MODEL", "llama3-70b-8192")
+# Model nhỏ hơn dùng khi hàng đợi gateway quá dài; để trống để tắt
+LLM_FALLBACK_MODEL = os.getenv("GROQ_FALLBACK_MODEL", "llama3-8b-8192")
+
+# tên resource -> số giây để khởi tạo (bench_startup.py đọc)
+init_seconds = {}
+
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+# mtime của file alias Chroma lúc mở vector store hiện tại
+_store_stamp = None
+_store_lock = threading.Lock()
+
+
+def lazy_resource(factory):
+    lock = threading.Lock()
+    missing = object()
+    value = missing
+
+    name = factory.__name__.lstrip("_")
+
+    @functools.wraps(factory)
+    def get():
+        nonlocal value
+        if value is missing:
+            with lock:
+                if value is missing:
+                    started = time.perf_counter()
+                    value = factory()
+                    init_seconds[name] = time.perf_counter() - started
+                    telemetry.observe("resource_init_seconds", init_seconds[name], resource=name)
+                    telemetry.log("resource_ready", always=True, resource=name,
+                                  seconds=round(init_seconds[name], 3))
+        return value
+
+    def reset():
+        nonlocal value
+        with lock:
+            value = missing
+
+    def set(resource):
+        # Dùng sẵn `resource` thay vì tạo mới (benchmark, test)
+        nonlocal value
+        with lock:
+            value = resource
+
+    get.reset = reset
+    get.set = set
+    return get
+
+
+@functools.lru_cache(maxsize=None)
+def create_embeddings(model_name: str) -> CachedEmbeddings:
+    """Query embeddings for `model_name`: the shared embedding service when
+    EMBEDDING_SERVICE_URL is set, else the in-process model behind a micro-batcher.
+    One instance per model, also kept when the store is reopened after an alias swap."""
+    from embedding_service import EMBED_BATCHING, EMBEDDING_SERVICE_URL, EmbeddingBatcher, RemoteEmbeddings
+
+    if EMBEDDING_SERVICE_URL:
+        return CachedEmbeddings(RemoteEmbeddings(EMBEDDING_SERVICE_URL, model_name=model_name))
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    model = HuggingFaceEmbeddings(model_name=model_name)
+    if not EMBED_BATCHING:
+        return CachedEmbeddings(model)
+    batcher = EmbeddingBatcher(model)
+    telemetry.register_gauge("embedding_queue_depth", lambda: {(): batcher.depth})
+    return CachedEmbeddings(batcher)
+
+
+def create_vectorstore(backend: str = VECTOR_BACKEND):
+    if backend == "local":
+        from local_index import LocalVectorIndex, LOCAL_INDEX_DIR, read_manifest
+
+        model = read_manifest(LOCAL_INDEX_DIR)["model"]
+        return LocalVectorIndex(LOCAL_INDEX_DIR, embeddings=create_embeddings(model))
+
+    if backend == "chroma":
+        import chromadb
+        from langchain_chroma import Chroma
+        from chroma_sync import MODEL_NAME, COLLECTION_NAME, PRODUCT_COLLECTION_NAME
+        from variant_table import INDEX_LEVEL
+
+        return Chroma(
+            collection_name=resolve(PRODUCT_COLLECTION_NAME if INDEX_LEVEL == "product" else COLLECTION_NAME),
+            embedding_function=create_embeddings(MODEL_NAME),
+            client=chromadb.PersistentClient(path="./chroma_db")
+        )
+
+    from langchain_pinecone import PineconeVectorStore
+    from pinecone import Pinecone
+
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    index = pc.Index(os.getenv("PINECONE_INDEX_NAME"))
+    embedding_model = create_embeddings("sentence-transformers/all-mpnet-base-v2")
+    return PineconeVectorStore(index=index, embedding=embedding_model, text_key="text")
+
+
+@lazy_resource
+def _vectorstore():
+    global _store_stamp
+    _store_stamp = alias_stamp()
+    store = create_vectorstore()
+    embeddings = store.embeddings
+    if hasattr(embeddings, "stats"):
+        telemetry.register_gauge("embedding_cache_hit_ratio", lambda: {(): embeddings.stats()["hit_rate"]})
+    return store
+
+
+def vectorstore():
+    """The shared vector store; with the chroma backend it is reopened once
+    chroma_sync.py --rebuild switches the collection alias."""
+    store = _vectorstore()
+    if VECTOR_BACKEND == "chroma" and alias_stamp() != _store_stamp:
+        with _store_lock:
+            if alias_stamp() != _store_stamp:
+                _vectorstore.reset()
+                telemetry.log("vectorstore_reopen", always=True, reason="alias_changed")
+        store = _vectorstore()
+    return store
+
+
+vectorstore.reset = _vectorstore.reset
+
+
+@lazy_resource
+def llm():
+    # Một gateway dùng chung cho cả trích xuất bộ lọc và trả lời (cùng model, temperature 0)
+    from langchain_groq import ChatGroq
+    from llm_gateway import LLMGateway
+
+    # Gateway tự retry, tắt retry bên trong client
+    fallback = ChatGroq(model_name=LLM_FALLBACK_MODEL, temperature=0.0, max_retries=0) if LLM_FALLBACK_MODEL else None
+    gateway = LLMGateway(ChatGroq(model_name=LLM_MODEL, temperature=0.0, max_retries=0), fallback=fallback)
+    telemetry.register_gauge("llm_gateway_queue_depth", lambda: {(): gateway.depth})
+    return gateway
+
+
+@lazy_resource
+def price_overlay():
+    # Giá / tồn kho hiện tại theo DetailId (None khi OVERLAY_SOURCE=none)
+    from overlay import create_overlay
+
+    return create_overlay()
+
+
+@lazy_resource
+def review_snippets():
+    # Snippet đánh giá tính sẵn bởi review_digest.py ({} khi chưa chạy hoặc đã tắt)
+    from review_digest import REVIEW_DIGESTS, load_digests, snippets_by_name
+
+    return snippets_by_name(load_digests()) if REVIEW_DIGESTS else {}
+
+
+def warmup():
+    """Build the vector store and run one query embedding so the model is loaded."""
+    from structured_answers import catalog_frame
+
+    catalog_frame()
+    vectorstore().embeddings.embed_query("khởi động")
+
+
+def start_warmup() -> threading.Thread:
+    """Run warmup() once per process in a daemon thread; later calls return the same thread."""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warmup, name="resource-warmup", daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
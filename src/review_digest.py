@@ -0,0 +1,243 @@
+"""Precomputed review digests: rating summary + a few pros / cons per product variant.
+
+    python review_digest.py                          # from the CSV / Parquet export's feedbacks column
+    python review_digest.py --source sql --summarizer llm
+
+The feedbacks column holds every review of a variant as one "||"-joined
+string, far too long for the prompt. This offline job turns each variant's
+reviews into a digest (average, histogram, pros, cons) and a snippet already
+cut to REVIEW_SNIPPET_TOKENS, written to REVIEW_DIGEST_PATH. A digest is
+recomputed only when the hash of the variant's reviews (or the summarizer / budget)
+changes. At query time build_context just looks the snippet up by name.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+import pandas as pd
+
+from context_builder import estimate_tokens
+
+REVIEW_DIGESTS = os.getenv("REVIEW_DIGESTS", "1") == "1"
+REVIEW_DIGEST_PATH = os.getenv("REVIEW_DIGEST_PATH", "review_digests.json.gz")
+REVIEW_SNIPPET_TOKENS = int(os.getenv("REVIEW_SNIPPET_TOKENS", "60"))
+REVIEW_POINTS = int(os.getenv("REVIEW_POINTS", "3"))
+# Ý kiến dài hơn thế này bị cắt trong snippet
+MAX_POINT_CHARS = 80
+
+
+def parse_feedbacks(raw) -> list:
+    """'5 Star - Pin trâu || 3 Star - ...' -> [(5, 'Pin trâu'), ...] (JOIN duplicates dropped)."""
+    if raw is None or (isinstance(raw, float) and pd.isna(raw)):
+        return []
+    reviews = []
+    for item in str(raw).split("||"):
+        rating, sep, text = item.strip().partition(" Star - ")
+        if sep and rating.strip().isdigit():
+            reviews.append((int(rating), text.strip()))
+    return list(dict.fromkeys(reviews))
+
+
+def feedbacks_from_table(df: pd.DataFrame) -> dict:
+    """{variant_id: {"name": ..., "reviews": [(rating, text), ...]}} from a catalog CSV / Parquet export."""
+    if "feedbacks" not in df:
+        # catalog.arrow (snapshot.py) không giữ cột feedbacks
+        raise ValueError("no feedbacks column; use the CSV / Parquet export or --source sql")
+    variants = {}
+    df = df[df["product_variant_id"].notna()]
+    for variant_id, name, raw in df[["product_variant_id", "product_variant_name", "feedbacks"]].values:
+        entry = variants.setdefault(str(variant_id), {"name": str(name).strip(), "reviews": []})
+        entry["reviews"] = list(dict.fromkeys(entry["reviews"] + parse_feedbacks(raw)))
+    return variants
+
+
+def feedbacks_from_sql(conn) -> dict:
+    rows = conn.execute(
+        "SELECT pv.id, pv.name, pf.feedback_rating, pf.feedback_text FROM products_variants pv "
+        "LEFT JOIN product_feedbacks pf ON pf.product_variant_id = pv.id").fetchall()
+    variants = {}
+    for variant_id, name, rating, text in rows:
+        entry = variants.setdefault(str(variant_id), {"name": str(name or "").strip(), "reviews": []})
+        if rating is not None:
+            entry["reviews"].append((int(rating), str(text or "").strip()))
+    return variants
+
+
+def reviews_hash(reviews) -> str:
+    return hashlib.sha256(json.dumps(sorted(reviews), ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _clauses(text: str) -> list:
+    # Bỏ các đoạn không có chữ (mã số, "12321312", ...)
+    pieces = (p.strip(" -") for p in re.split(r"[.!?;,\n]+", text))
+    return [p for p in pieces if len(re.findall(r"[^\W\d_]", p)) >= 3]
+
+
+class ExtractiveSummarizer:
+    """Local pros / cons: the clauses repeated most often in good (>=4★) and bad (<=2★) reviews."""
+
+    name = "extractive"
+
+    def __init__(self, points: int = REVIEW_POINTS):
+        self.points = points
+
+    def _top(self, texts) -> list:
+        counts, original = Counter(), {}
+        for text in texts:
+            for clause in dict.fromkeys(_clauses(text)):
+                key = clause.lower()
+                counts[key] += 1
+                original.setdefault(key, clause)
+        ranked = sorted(counts, key=lambda k: (-counts[k], len(k)))
+        return [original[k] for k in ranked[:self.points]]
+
+    def summarize(self, name: str, reviews) -> dict:
+        return {"pros": self._top(t for r, t in reviews if r >= 4),
+                "cons": self._top(t for r, t in reviews if r <= 2)}
+
+
+class LLMSummarizer:
+    """Pros / cons written by the chat model (one call per changed variant); falls back to extractive."""
+
+    name = "llm"
+
+    def __init__(self, llm=None, points: int = REVIEW_POINTS, max_reviews: int = 50):
+        self.llm = llm
+        self.points = points
+        self.max_reviews = max_reviews
+        self.fallback = ExtractiveSummarizer(points)
+
+    def summarize(self, name: str, reviews) -> dict:
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        import resources
+
+        if not any(t for _, t in reviews):
+            return {"pros": [], "cons": []}
+        system = SystemMessage(content=(
+            f"Tóm tắt đánh giá của khách về {name}. Trả về JSON duy nhất dạng "
+            f'{{"pros": [...], "cons": [...]}}, mỗi danh sách tối đa {self.points} ý ngắn (dưới 10 từ), '
+            "chỉ dùng những gì khách nói."))
+        lines = "\n".join(f"{r}★: {t}" for r, t in reviews[:self.max_reviews] if t)
+        try:
+            content = (self.llm or resources.llm()).invoke([system, HumanMessage(content=lines)]).content
+            parsed = json.loads(content[content.index("{"):content.rindex("}") + 1])
+            return {key: [str(p).strip() for p in parsed.get(key, [])][:self.points] for key in ("pros", "cons")}
+        except Exception as e:
+            print(f"⚠️ LLM summary failed for {name}: {e}")
+            return self.fallback.summarize(name, reviews)
+
+
+SUMMARIZERS = {"extractive": ExtractiveSummarizer, "llm": LLMSummarizer}
+
+
+def _short(point: str) -> str:
+    return point if len(point) <= MAX_POINT_CHARS else point[:MAX_POINT_CHARS - 1].rstrip() + "…"
+
+
+def render_snippet(digest: dict, budget: int = REVIEW_SNIPPET_TOKENS) -> str:
+    """'⭐ 4.2/5 (15 đánh giá) 👍 ... 👎 ...' with pros / cons dropped until it fits `budget`."""
+    if not digest["count"]:
+        return ""
+    head = f"⭐ {digest['average']:.1f}/5 ({digest['count']} đánh giá)"
+    pros, cons = [_short(p) for p in digest["pros"]], [_short(c) for c in digest["cons"]]
+    while True:
+        parts = [head]
+        if pros:
+            parts.append("👍 " + "; ".join(pros))
+        if cons:
+            parts.append("👎 " + "; ".join(cons))
+        snippet = " ".join(parts)
+        if estimate_tokens(snippet) <= budget or not (pros or cons):
+            return snippet
+        # Bỏ bớt ý ở danh sách dài hơn trước
+        (pros if len(pros) >= len(cons) else cons).pop()
+
+
+def build_digest(name: str, reviews, summarizer, budget: int = REVIEW_SNIPPET_TOKENS) -> dict:
+    ratings = [r for r, _ in reviews]
+    histogram = Counter(ratings)
+    digest = {
+        "name": name,
+        "count": len(ratings),
+        "average": round(sum(ratings) / len(ratings), 2) if ratings else None,
+        "histogram": {str(star): histogram.get(star, 0) for star in range(1, 6)},
+        **(summarizer.summarize(name, reviews) if reviews else {"pros": [], "cons": []}),
+    }
+    digest["snippet"] = render_snippet(digest, budget)
+    return digest
+
+
+def build_digests(variants: dict, summarizer, previous: dict = None, budget: int = REVIEW_SNIPPET_TOKENS) -> tuple:
+    """(digests, recomputed); digests whose reviews, summarizer and budget are unchanged are reused."""
+    previous = previous or {}
+    digests, recomputed = {}, 0
+    for variant_id, entry in variants.items():
+        key = f"{summarizer.name}:{budget}:{reviews_hash(entry['reviews'])}"
+        old = previous.get(variant_id)
+        if old is not None and old.get("hash") == key and old.get("name") == entry["name"]:
+            digests[variant_id] = old
+            continue
+        digests[variant_id] = {**build_digest(entry["name"], entry["reviews"], summarizer, budget), "hash": key}
+        recomputed += 1
+    return digests, recomputed
+
+
+def save_digests(digests: dict, path: str = REVIEW_DIGEST_PATH):
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(digests, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_digests(path: str = REVIEW_DIGEST_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def snippets_by_name(digests: dict) -> dict:
+    """{product name (lowercase): snippet}, the key build_context groups variants by."""
+    return {d["name"].lower(): d["snippet"] for d in digests.values() if d.get("snippet") and d.get("name")}
+
+
+def main():
+    from filter_parser import CATALOG_CSV
+    from snapshot import read_table
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", choices=["csv", "sql"], default="csv", help="csv = catalog CSV / Parquet export")
+    parser.add_argument("--csv", default=CATALOG_CSV)
+    parser.add_argument("--summarizer", choices=sorted(SUMMARIZERS), default="extractive")
+    parser.add_argument("--budget", type=int, default=REVIEW_SNIPPET_TOKENS, help="max tokens per snippet")
+    parser.add_argument("--out", default=REVIEW_DIGEST_PATH)
+    parser.add_argument("--full", action="store_true", help="recompute every digest")
+    args = parser.parse_args()
+
+    if args.source == "sql":
+        from sql_source import connect
+
+        conn = connect()
+        try:
+            variants = feedbacks_from_sql(conn)
+        finally:
+            conn.close()
+    else:
+        variants = feedbacks_from_table(read_table(args.csv))
+
+    previous = {} if args.full else load_digests(args.out)
+    digests, recomputed = build_digests(variants, SUMMARIZERS[args.summarizer](), previous, args.budget)
+    save_digests(digests, args.out)
+    with_reviews = sum(1 for d in digests.values() if d["count"])
+    print(f"✅ {len(digests)} review digests ({with_reviews} with reviews): "
+          f"{recomputed} recomputed, {len(digests) - recomputed} reused -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
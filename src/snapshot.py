@@ -0,0 +1,145 @@
+"""Columnar catalog snapshot (Arrow IPC, memory-mapped) with typed and pre-parsed columns.
+
+    python snapshot.py --csv product_data.csv --out catalog.arrow
+    python snapshot.py --csv product_data.parquet        # output of dbtocsv.py
+
+Columns keep the CSV names where they overlap (so build_documents works on
+snapshot.to_pandas()), plus:
+- price / sale as float64, quantity as int64
+- color_name / memory_name / product_variant_status as dictionary (categorical)
+- attributes_map: map<string, string> parsed once
+- memory_gb / battery_mah / refresh_hz: numeric specs for ">=" filters
+- text: the document text that gets embedded
+"""
+import argparse
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from catalog import NUMERIC_SPECS, build_documents, detail_id, parse_attributes, typed_metadata
+
+SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT", "catalog.arrow")
+
+STRING_COLUMNS = ["product_variant_detail_id", "product_id", "product_name", "product_variant_id",
+                  "product_variant_name", "product_variant_description", "attributes"]
+CATEGORY_COLUMNS = ["color_name", "memory_name", "product_variant_status", "product_variant_detail_status"]
+_METADATA_FIELDS = {"MemoryGB": "memory_gb", "BatteryMah": "battery_mah", "RefreshHz": "refresh_hz"}
+# filter key -> cột snapshot
+SPEC_COLUMNS = {key: _METADATA_FIELDS[field] for key, field in NUMERIC_SPECS.items()}
+
+
+def _strings(series: pd.Series) -> list:
+    return [None if pd.isna(v) else str(v) for v in series]
+
+
+def build_snapshot(df: pd.DataFrame, path: str = SNAPSHOT_PATH) -> str:
+    texts, metadatas = build_documents(df)
+    columns = {}
+    for name in STRING_COLUMNS:
+        columns[name] = pa.array(_strings(df[name]) if name in df else [None] * len(df), type=pa.string())
+    for name in CATEGORY_COLUMNS:
+        values = _strings(df[name]) if name in df else [None] * len(df)
+        columns[name] = pa.array(values, type=pa.string()).dictionary_encode()
+    columns["price"] = pa.array(pd.to_numeric(df["price"], errors="coerce"), type=pa.float64(), from_pandas=True)
+    columns["sale"] = pa.array(pd.to_numeric(df.get("sale"), errors="coerce"), type=pa.float64(), from_pandas=True)
+    columns["quantity"] = pa.array(pd.to_numeric(df.get("quantity"), errors="coerce"), type=pa.int64(),
+                                   from_pandas=True)
+    columns["attributes_map"] = pa.array([list(parse_attributes(a).items()) for a in df["attributes"]],
+                                         type=pa.map_(pa.string(), pa.string()))
+    for field, column in _METADATA_FIELDS.items():
+        columns[column] = pa.array([m.get(field) for m in metadatas], type=pa.float64())
+    columns["text"] = pa.array(texts, type=pa.string())
+
+    table = pa.table(columns)
+    tmp_path = path + ".tmp"
+    # IPC không nén để đọc bằng memory map (zero-copy)
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+    return path
+
+
+def is_snapshot(path: str) -> bool:
+    return path.endswith((".arrow", ".feather", ".ipc"))
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH) -> pa.Table:
+    """Memory-mapped table: columns are read from the page cache, not copied."""
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def read_table(path: str) -> pd.DataFrame:
+    """Catalog rows as a DataFrame from a snapshot, a Parquet export or the CSV."""
+    if is_snapshot(path):
+        return load_snapshot(path).to_pandas()
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def snapshot_documents(table: pa.Table):
+    """(texts, metadatas) straight from the snapshot columns, no string parsing."""
+    cols = {name: table.column(name).to_pylist() for name in
+            ["product_variant_name", "color_name", "memory_name", "price", "product_variant_status",
+             "attributes", "product_variant_detail_id", "text", *_METADATA_FIELDS.values()]}
+    metadatas = []
+    for i, text in enumerate(cols["text"]):
+        specs = {field: cols[column][i] for field, column in _METADATA_FIELDS.items()
+                 if cols[column][i] is not None}
+        metadatas.append(typed_metadata(cols["product_variant_name"][i], cols["color_name"][i],
+                                        cols["memory_name"][i], cols["price"][i],
+                                        cols["product_variant_status"][i], cols["attributes"][i],
+                                        text=text, **detail_id(cols["product_variant_detail_id"][i]), **specs))
+    return cols["text"], metadatas
+
+
+def load_documents(path: str):
+    """(texts, metadatas) from a snapshot, a Parquet export or the CSV."""
+    if is_snapshot(path):
+        return snapshot_documents(load_snapshot(path))
+    return build_documents(read_table(path))
+
+
+def filter_mask(table: pa.Table, filters: dict):
+    """Boolean mask for the extracted filters, computed column-wise with pyarrow.compute."""
+    mask = pa.array([True] * table.num_rows)
+    if filters.get("price_min"):
+        mask = pc.and_kleene(mask, pc.greater_equal(table["price"], float(filters["price_min"])))
+    if filters.get("price_max"):
+        mask = pc.and_kleene(mask, pc.less_equal(table["price"], float(filters["price_max"])))
+    if filters.get("colors"):
+        colors = pc.utf8_lower(pc.cast(table["color_name"], pa.string()))
+        mask = pc.and_kleene(mask, pc.is_in(colors, pa.array([c.strip().lower() for c in filters["colors"]])))
+    if filters.get("memories"):
+        memories = pc.utf8_upper(pc.cast(table["memory_name"], pa.string()))
+        mask = pc.and_kleene(mask, pc.is_in(memories, pa.array([m.strip().upper() for m in filters["memories"]])))
+    if filters.get("status"):
+        status = pc.utf8_upper(pc.cast(table["product_variant_status"], pa.string()))
+        mask = pc.and_kleene(mask, pc.equal(status, filters["status"].upper()))
+    for key, column in SPEC_COLUMNS.items():
+        if filters.get(key):
+            mask = pc.and_kleene(mask, pc.greater_equal(table[column], float(filters[key])))
+    return pc.fill_null(mask, False)
+
+
+def select(table: pa.Table, filters: dict) -> pa.Table:
+    return table.filter(filter_mask(table, filters))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default="product_data.csv", help="CSV or Parquet export from dbtocsv.py")
+    parser.add_argument("--out", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    df = read_table(args.csv)
+    build_snapshot(df, args.out)
+    table = load_snapshot(args.out)
+    print(f"✅ Snapshot {args.out}: {table.num_rows} rows, {table.num_columns} columns, "
+          f"{os.path.getsize(args.out) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import sqlite3
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def connect(sqlite_path: str = None):
+    """DB-API connection to the product database.
+
+    SQL Server by default; a SQLite file with the same schema when
+    `sqlite_path` (or CATALOG_SQLITE) is given, e.g. one made by
+    create_sqlite_catalog for offline runs.
+    """
+    sqlite_path = sqlite_path or os.getenv("CATALOG_SQLITE")
+    if sqlite_path:
+        # Kết nối có thể được dùng lại từ luồng khác (overlay.sql_fetcher), nhưng không đồng thời
+        return sqlite3.connect(sqlite_path, check_same_thread=False)
+
+    import pyodbc
+    return pyodbc.connect(
+        'DRIVER={ODBC Driver 17 for SQL Server};'
+        f'SERVER={os.getenv("SQL_SERVER_HOST")};'
+        f'DATABASE=ProductDB;'
+        f'UID={os.getenv("SQL_SERVER_USER")};'
+        f'PWD={os.getenv("SQL_SERVER_PASSWORD")}'
+    )
+
+
+def dialect(conn) -> str:
+    return "sqlite" if isinstance(conn, sqlite3.Connection) else "mssql"
+
+
+def as_text(conn, expr: str) -> str:
+    return f"CAST({expr} AS TEXT)" if dialect(conn) == "sqlite" else f"CAST({expr} AS VARCHAR(MAX))"
+
+
+def concat(conn, *parts: str) -> str:
+    return f" {'||' if dialect(conn) == 'sqlite' else '+'} ".join(parts)
+
+
+def string_agg(conn, expr: str, separator: str) -> str:
+    if dialect(conn) == "sqlite":
+        return f"GROUP_CONCAT({expr}, '{separator}')"
+    return f"STRING_AGG({as_text(conn, expr)}, '{separator}')"
+
+
+def has_column(conn, table: str, column: str) -> bool:
+    """Whether `table` has `column` (schemas differ between ProductDB and the SQLite mirror)."""
+    if dialect(conn) == "sqlite":
+        return column in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    return conn.execute("SELECT COL_LENGTH(?, ?)", (table, column)).fetchone()[0] is not None
+
+
+def in_clause(column: str, values) -> tuple:
+    values = list(values)
+    return f"{column} IN ({', '.join('?' for _ in values)})", values
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trademarks (id TEXT PRIMARY KEY, name TEXT);
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY, name TEXT, trademark_id TEXT, created_at TEXT, updated_at TEXT);
+CREATE TABLE IF NOT EXISTS usage_categories (id TEXT PRIMARY KEY, name TEXT, status TEXT);
+CREATE TABLE IF NOT EXISTS products_variants (
+    id TEXT PRIMARY KEY, product_id TEXT, usage_category_id TEXT, name TEXT, description TEXT,
+    status TEXT, featured INTEGER, created_at TEXT, updated_at TEXT);
+CREATE TABLE IF NOT EXISTS colors (id TEXT PRIMARY KEY, name TEXT);
+CREATE TABLE IF NOT EXISTS memories (id TEXT PRIMARY KEY, name TEXT);
+CREATE TABLE IF NOT EXISTS product_variant_details (
+    id TEXT PRIMARY KEY, product_variant_id TEXT, color_id TEXT, memory_id TEXT,
+    price REAL, quantity INTEGER, sale REAL, status TEXT, views_count INTEGER, updated_at TEXT);
+CREATE TABLE IF NOT EXISTS attributes (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS attribute_values (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, product_variant_id TEXT, attribute_id INTEGER, value TEXT);
+CREATE TABLE IF NOT EXISTS products_images (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, product_variant_detail_id TEXT, path TEXT);
+CREATE TABLE IF NOT EXISTS product_feedbacks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, product_variant_id TEXT, feedback_rating INTEGER, feedback_text TEXT);
+CREATE TABLE IF NOT EXISTS img_product_feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, product_feedback_id INTEGER, image_path TEXT);
+"""
+
+
+def _none(value):
+    return None if pd.isna(value) else value
+
+
+def create_sqlite_catalog(csv_path: str, db_path: str) -> str:
+    """Local SQLite stand-in for ProductDB, rebuilt from the exported CSV."""
+    df = pd.read_csv(csv_path).dropna(subset=["product_variant_detail_id"])
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    # File tạo trước khi có cột updated_at của product_variant_details
+    if "updated_at" not in {row[1] for row in conn.execute("PRAGMA table_info(product_variant_details)")}:
+        conn.execute("ALTER TABLE product_variant_details ADD COLUMN updated_at TEXT")
+
+    def insert(table, columns, rows):
+        sql = f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        conn.executemany(sql, [tuple(_none(v) for v in r) for r in rows])
+
+    insert("trademarks", ["id", "name"],
+           df[["trademark_id", "trademark_name"]].drop_duplicates().values)
+    insert("products", ["id", "name", "trademark_id", "created_at", "updated_at"],
+           df[["product_id", "product_name", "trademark_id", "product_created_at",
+               "product_updated_at"]].drop_duplicates("product_id").values)
+    insert("usage_categories", ["id", "name", "status"],
+           df[["usage_category_id", "usage_category_name", "usage_category_status"]]
+           .dropna(subset=["usage_category_id"]).drop_duplicates("usage_category_id").values)
+    insert("products_variants",
+           ["id", "product_id", "usage_category_id", "name", "description", "status", "featured",
+            "created_at", "updated_at"],
+           df[["product_variant_id", "product_id", "usage_category_id", "product_variant_name",
+               "product_variant_description", "product_variant_status", "product_variant_featured",
+               "product_variant_created_at", "product_variant_updated_at"]]
+           .drop_duplicates("product_variant_id").values)
+    insert("colors", ["id", "name"], df[["color_id", "color_name"]].drop_duplicates("color_id").values)
+    insert("memories", ["id", "name"], df[["memory_id", "memory_name"]].drop_duplicates("memory_id").values)
+    insert("product_variant_details",
+           ["id", "product_variant_id", "color_id", "memory_id", "price", "quantity", "sale", "status",
+            "views_count"],
+           df[["product_variant_detail_id", "product_variant_id", "color_id", "memory_id", "price",
+               "quantity", "sale", "product_variant_detail_status", "views_count"]].values)
+
+    # Cột attributes trong CSV bị lặp do JOIN, chỉ giữ mỗi cặp (variant, thuộc tính) một lần
+    for variant_id, attributes in df[["product_variant_id", "attributes"]].dropna().drop_duplicates().values:
+        for item in str(attributes).split("; "):
+            if ": " not in item:
+                continue
+            name, value = item.split(": ", 1)
+            conn.execute("INSERT OR IGNORE INTO attributes (name) VALUES (?)", (name.strip(),))
+            attribute_id = conn.execute("SELECT id FROM attributes WHERE name = ?", (name.strip(),)).fetchone()[0]
+            exists = conn.execute(
+                "SELECT 1 FROM attribute_values WHERE product_variant_id = ? AND attribute_id = ?",
+                (variant_id, attribute_id)).fetchone()
+            if not exists:
+                conn.execute(
+                    "INSERT INTO attribute_values (product_variant_id, attribute_id, value) VALUES (?, ?, ?)",
+                    (variant_id, attribute_id, value.strip()))
+
+    # Ảnh cũng bị lặp do JOIN; mỗi đường dẫn một dòng
+    for detail_id, images in df[["product_variant_detail_id", "product_images"]].dropna().values:
+        for path in dict.fromkeys(p.strip() for p in str(images).split(";") if p.strip()):
+            conn.execute("INSERT INTO products_images (product_variant_detail_id, path) VALUES (?, ?)",
+                         (detail_id, path))
+
+    seen = set()
+    for variant_id, feedbacks in df[["product_variant_id", "feedbacks"]].dropna().drop_duplicates().values:
+        for item in str(feedbacks).split("||"):
+            rating, sep, text = item.strip().partition(" Star - ")
+            if sep and rating.strip().isdigit() and (variant_id, rating, text) not in seen:
+                seen.add((variant_id, rating, text))
+                conn.execute(
+                    "INSERT INTO product_feedbacks (product_variant_id, feedback_rating, feedback_text) "
+                    "VALUES (?, ?, ?)", (variant_id, int(rating), text.strip()))
+
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+if __name__ == "__main__":
+    import sys
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "product_data.csv"
+    db_path = sys.argv[2] if len(sys.argv) > 2 else "product_data.sqlite"
+    create_sqlite_catalog(csv_path, db_path)
+    print(f"✅ Đã tạo SQLite catalog: {db_path}")
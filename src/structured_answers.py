@@ -0,0 +1,292 @@
+"""Answers for purely structured questions straight from the catalog, without the LLM.
+
+    answer_structured("có bao nhiêu màu của Galaxy A55")
+    answer_structured("Sony Xperia màu bạc còn hàng không")
+    answer_structured("tầm 8 triệu nên mua máy nào")     # None -> shopbot_ai
+
+A question qualifies when the rule-based parser is confident and every word
+it left over is a catalog product-name token, a model number or a known
+question word (STRUCTURED_WORDS). When nothing in the catalog matches, the
+question goes to the LLM instead (the filters may be stricter than the
+user meant, e.g. attribute translations matched by substring). The
+catalog is filtered with pandas masks that follow the same semantics as
+catalog.build_metadata_filter + matches_filters (except that every
+requested attribute must be present), and the answer uses the Vietnamese
+color / status names.
+"""
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+import pandas as pd
+
+import resources
+from catalog import build_documents, NUMERIC_SPECS
+from context_builder import format_price
+from filter_parser import (APPROX_BEFORE, CATALOG_CSV, MAX_AFTER, MAX_BEFORE, MIN_AFTER, MIN_BEFORE,
+                           normalize_query, parse_filters)
+from snapshot import SNAPSHOT_PATH, read_table
+
+STRUCTURED_ANSWERS = os.getenv("STRUCTURED_ANSWERS", "1") == "1"
+STRUCTURED_CONFIDENCE = float(os.getenv("STRUCTURED_CONFIDENCE", "1.0"))
+STRUCTURED_MAX_PRODUCTS = int(os.getenv("STRUCTURED_MAX_PRODUCTS", "10"))
+
+COLORS_VI = {
+    "black": "Đen",
+    "white": "Trắng",
+    "blue": "Xanh",
+    "purple": "Tím",
+    "silver": "Bạc",
+    "green": "Xanh lá",
+    "yellow": "Vàng",
+    "red": "Đỏ",
+    "orange": "Cam",
+    "grey": "Xám",
+    "gray": "Xám",
+    "pink": "Hồng",
+    "bronze brown": "Nâu đồng",
+}
+
+STATUS_VI = {
+    "AVAILABLE": "Còn hàng",
+    "OUT_OF_STOCK": "Hết hàng",
+    "DISCONTINUED": "Ngừng bán",
+}
+
+# Từ để hỏi / từ nối không làm thay đổi ý định của câu hỏi có cấu trúc
+STRUCTURED_WORDS = set("""
+điện thoại dt đt máy sản phẩm dòng loại bản phiên mẫu con chiếc cái
+nào những các của có không ko còn chưa được đang hiện là và với thì sao
+giá bao nhiêu tiền màu mấy gì ram nhất rẻ đắt mắc cao thấp
+cho tôi mình em anh chị shop xem hỏi liệt kê tìm cần muốn mua ạ ơi nhé hả vậy
+""".split())
+for _cues in (MAX_BEFORE, MAX_AFTER, MIN_BEFORE, MIN_AFTER, APPROX_BEFORE):
+    STRUCTURED_WORDS.update(w for cue in _cues for w in cue.split())
+STRUCTURED_WORDS.update(["đến", "tới", "den", "toi", "từ", "tu"])
+
+_COLORS_INTENT = re.compile(r"(?:bao nhiêu|mấy|những|các)\s+màu|màu\s+(?:gì|nào)")
+_PRICE_INTENT = re.compile(r"giá\s+(?:bao nhiêu|thế nào|sao)|bao nhiêu tiền")
+_CHEAPEST = re.compile(r"(?:rẻ|thấp)\s+nhất")
+_PRICIEST = re.compile(r"(?:đắt|mắc|cao)\s+nhất")
+
+
+@dataclass
+class StructuredAnswer:
+    text: str
+    intent: str
+    products: list
+    # metadata của mọi biến thể khớp, để câu hỏi tiếp theo lọc lại (conversation)
+    metadatas: list
+
+
+def convert_color(color) -> str:
+    if not isinstance(color, str) or not color.strip():
+        return "Không rõ"
+    return COLORS_VI.get(color.strip().lower(), color.strip())
+
+
+def convert_status(status) -> str:
+    if not isinstance(status, str) or not status.strip():
+        return "Không rõ"
+    return STATUS_VI.get(status.strip().upper(), status.strip())
+
+
+def _tokens(text: str) -> list:
+    return re.findall(r"\w+", text.lower())
+
+
+@lru_cache(maxsize=2)
+def catalog_frame(path: str = None) -> pd.DataFrame:
+    """One row per variant detail with the typed metadata columns (+ name tokens)."""
+    path = path or (SNAPSHOT_PATH if os.path.exists(SNAPSHOT_PATH) else CATALOG_CSV)
+    _, metadatas = build_documents(read_table(path))
+    frame = pd.DataFrame(metadatas)
+    frame = frame[frame["ProductName"] != ""].reset_index(drop=True)
+    frame["NameTokens"] = [frozenset(_tokens(name)) for name in frame["ProductName"]]
+    frame["Searchable"] = (frame["ProductName"] + " " + frame["Attributes"]).str.lower()
+    for field in NUMERIC_SPECS.values():
+        if field not in frame:
+            frame[field] = float("nan")
+    return frame
+
+
+@lru_cache(maxsize=2)
+def name_vocab(path: str = None) -> frozenset:
+    return frozenset().union(*catalog_frame(path)["NameTokens"])
+
+
+def with_live_prices(frame: pd.DataFrame, overlay) -> pd.DataFrame:
+    """`frame` with Price / Status replaced by the overlay values (rows it does not know keep theirs)."""
+    if overlay is None or "DetailId" not in frame:
+        return frame
+    live = overlay.lookup(frame["DetailId"].dropna())
+    frame = frame.copy()
+    for field in ("Price", "Status"):
+        frame[field] = [live.get(i, {}).get(field, v) for i, v in zip(frame["DetailId"], frame[field])]
+    return frame
+
+
+def filter_frame(frame: pd.DataFrame, filters: dict, name_tokens=()) -> pd.DataFrame:
+    mask = pd.Series(True, index=frame.index)
+    if filters.get("price_min"):
+        mask &= frame["Price"] >= float(filters["price_min"])
+    if filters.get("price_max"):
+        mask &= frame["Price"] <= float(filters["price_max"])
+    if filters.get("colors"):
+        mask &= frame["ColorKey"].isin([c.strip().lower() for c in filters["colors"]])
+    if filters.get("memories"):
+        mask &= frame["MemoryKey"].isin([m.strip().upper() for m in filters["memories"]])
+    if filters.get("status"):
+        mask &= frame["Status"] == filters["status"].upper()
+    # Trả lời trực tiếp nên mọi thuộc tính đều phải có (matches_filters chỉ cần một)
+    for attribute in filters.get("attributes") or []:
+        mask &= frame["Searchable"].str.contains(attribute.lower(), regex=False)
+    for key, field in NUMERIC_SPECS.items():
+        if filters.get(key):
+            mask &= frame[field] >= float(filters[key])
+    if name_tokens:
+        mask &= frame["NameTokens"].map(lambda names: all(_has_token(names, t) for t in name_tokens))
+    return frame[mask]
+
+
+def _has_token(names: frozenset, token: str) -> bool:
+    if token in names:
+        return True
+    # Số đời máy: "10" khớp "10vi" nhưng không khớp "1vi" hay "100"
+    return token.isdigit() and any(re.match(rf"{token}(?!\d)", name) for name in names)
+
+
+def _price_range(prices) -> str:
+    prices = sorted(p for p in prices if pd.notna(p))
+    if not prices:
+        return "Không rõ"
+    if prices[0] == prices[-1]:
+        return format_price(prices[0])
+    return f"{format_price(prices[0])} - {format_price(prices[-1])}"
+
+
+def _unique(values) -> list:
+    return list(dict.fromkeys(v for v in values if v))
+
+
+def _render_product(name: str, rows: pd.DataFrame) -> str:
+    return "  \n".join([
+        f"📦 Tên sản phẩm: {name}",
+        f"🎨 Màu: {', '.join(_unique(convert_color(c) for c in rows['Color'])) or 'Không rõ'}",
+        f"💾 RAM: {', '.join(_unique(rows['Memory'])) or 'Không rõ'}",
+        f"💸 Giá: {_price_range(rows['Price'])}",
+        f"📋 Trạng thái: {', '.join(_unique(convert_status(s) for s in rows['Status']))}",
+    ])
+
+
+def _answer_colors(products) -> str:
+    lines = []
+    for name, rows in products:
+        colors = _unique(convert_color(c) for c in rows["Color"])
+        lines.append(f"🎨 {name} có {len(colors)} màu: {', '.join(colors)}.")
+    return "  \n".join(lines)
+
+
+def _answer_prices(products) -> str:
+    lines = []
+    for name, rows in products:
+        lines.append(f"💸 Giá {name}: {_price_range(rows['Price'])}")
+        for _, row in rows.sort_values("Price").iterrows():
+            lines.append(f"- {convert_color(row['Color'])}, RAM {row['Memory'] or 'Không rõ'}: "
+                         f"{_price_range([row['Price']])} ({convert_status(row['Status'])})")
+    return "  \n".join(lines)
+
+
+def _answer_list(products, total: int) -> str:
+    blocks = [_render_product(name, rows) for name, rows in products]
+    more = total - len(products)
+    tail = f"  \n  \n... và {more} sản phẩm khác." if more > 0 else ""
+    return f"Có {total} sản phẩm phù hợp:  \n  \n" + "  \n  \n".join(blocks) + tail
+
+
+def _answer_ranked(products, total: int, intent: str) -> str:
+    label = "rẻ nhất" if intent == "cheapest" else "đắt nhất"
+    blocks = [_render_product(name, rows) for name, rows in products]
+    if total == 1:
+        head = "Chỉ có 1 sản phẩm phù hợp:"
+    else:
+        head = f"{len(products)} sản phẩm {label} trong số {total} sản phẩm phù hợp:"
+    return f"{head}  \n  \n" + "  \n  \n".join(blocks)
+
+
+def structured_intent(query: str, parsed=None):
+    """(intent, filters, name_tokens) when the query is fully structured, else None."""
+    parsed = parsed or parse_filters(query)
+    if parsed.confidence < STRUCTURED_CONFIDENCE:
+        return None
+    text = normalize_query(query)
+    vocab = name_vocab()
+    rest = _tokens(parsed.rest)
+    # Số còn lại trong câu là số đời máy ("xperia 10"), giữ để phân biệt các model
+    name_tokens = [t for t in rest if (t in vocab or t.isdigit()) and t not in STRUCTURED_WORDS]
+    if any(t not in vocab and not t.isdigit() and t not in STRUCTURED_WORDS for t in rest):
+        return None
+
+    filters = parsed.filters
+    # "A55 12GB": dung lượng nằm trong tên máy, không chắc là RAM -> để LLM xử lý
+    if filters["memories"] and name_tokens and "ram" not in _tokens(text):
+        return None
+
+    if _COLORS_INTENT.search(text):
+        intent = "colors"
+    elif _PRICE_INTENT.search(text):
+        intent = "price"
+    elif _CHEAPEST.search(text):
+        intent = "cheapest"
+    elif _PRICIEST.search(text):
+        intent = "priciest"
+    else:
+        intent = "list"
+    has_filter = any(v not in (None, [], "") for v in filters.values())
+    if intent == "list" and not has_filter and not name_tokens:
+        return None
+    if intent in ("colors", "price") and not name_tokens:
+        return None
+    return intent, filters, name_tokens
+
+
+def _metadatas(rows: pd.DataFrame) -> list:
+    # Bỏ các cột phụ và giá trị NaN để giống metadata trong vector store
+    records = rows.drop(columns=["NameTokens", "Searchable"]).to_dict("records")
+    return [{k: v for k, v in r.items() if not (isinstance(v, float) and pd.isna(v))} for r in records]
+
+
+def answer_structured(query: str, parsed=None):
+    """StructuredAnswer from the catalog, or None for open-ended questions."""
+    resolved = structured_intent(query, parsed)
+    if resolved is None:
+        return None
+    intent, filters, name_tokens = resolved
+
+    # Lọc trước theo các trường không đổi để chỉ tra giá hiện tại cho các dòng liên quan
+    volatile = ("price_min", "price_max", "status")
+    rows = filter_frame(catalog_frame(), {k: v for k, v in filters.items() if k not in volatile}, name_tokens)
+    rows = filter_frame(with_live_prices(rows, resources.price_overlay()), filters)
+    if rows.empty:
+        # Không chắc là "không có": để RAG + LLM trả lời
+        return None
+    if intent in ("cheapest", "priciest"):
+        prices = rows.groupby("ProductName", sort=False)["Price"]
+        order = prices.min() if intent == "cheapest" else prices.max()
+        names = order.sort_values(ascending=intent == "cheapest").index.tolist()
+    else:
+        names = _unique(rows["ProductName"])
+    total = len(names)
+    names = names[:3] if intent in ("cheapest", "priciest") else names[:STRUCTURED_MAX_PRODUCTS]
+    products = [(name, rows[rows["ProductName"] == name]) for name in names]
+
+    if intent == "colors":
+        text = _answer_colors(products)
+    elif intent == "price":
+        text = _answer_prices(products)
+    elif intent in ("cheapest", "priciest"):
+        text = _answer_ranked(products, total, intent)
+    else:
+        text = _answer_list(products, total)
+    return StructuredAnswer(text, intent, names, _metadatas(rows))
@@ -0,0 +1,245 @@
+"""Spans, counters and sampled structured logs for the chatbot pipeline.
+
+    with telemetry.span("search", k=10):
+        ...
+    telemetry.incr("llm_tokens_total", 512, direction="in")
+    telemetry.log("context", tokens=230)          # sampled, JSON on the "shopbot" logger
+    print(telemetry.prometheus_text())
+
+Span durations go into a histogram (stage_seconds{stage=...}). With
+TELEMETRY_OTEL_FILE set, finished spans are also written as JSON lines:
+through the OpenTelemetry SDK when it is installed, otherwise in the same
+shape by a small built-in exporter. METRICS_PORT serves /metrics.
+"""
+import bisect
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter, SimpleSpanProcessor
+except ImportError:  # OpenTelemetry là tuỳ chọn
+    otel_trace = None
+
+LOG_SAMPLE_RATE = float(os.getenv("TELEMETRY_LOG_SAMPLE_RATE", "0.01"))
+OTEL_FILE = os.getenv("TELEMETRY_OTEL_FILE", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("shopbot")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(os.getenv("TELEMETRY_LOG_LEVEL", "INFO"))
+    logger.propagate = False
+
+_lock = threading.Lock()
+_counters = {}     # (name, labels) -> value
+_histograms = {}   # (name, labels) -> [bucket counts..., +Inf, count, sum]
+_gauges = {}       # name -> callable returning {labels tuple: value}
+_buckets = {}      # name -> bucket bounds khi khác BUCKETS (ví dụ kích thước batch)
+_observers = []    # fn(name, value, labels) nhận mọi giá trị observe (bench_pipeline.py)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_span_file = None
+_tracer = None
+_server = None
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def incr(name: str, value: float = 1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, seconds: float, **labels):
+    key = (name, _labels(labels))
+    bounds = _buckets.get(name, BUCKETS)
+    with _lock:
+        hist = _histograms.setdefault(key, [0] * (len(bounds) + 3))  # buckets, +Inf, count, sum
+        hist[bisect.bisect_left(bounds, seconds)] += 1
+        hist[-2] += 1
+        hist[-1] += seconds
+    for observer in _observers:
+        observer(name, seconds, labels)
+
+
+def register_buckets(name: str, bounds):
+    """Histogram `name` uses `bounds` instead of BUCKETS (for values that are not seconds)."""
+    _buckets[name] = tuple(sorted(bounds))
+
+
+def add_observer(fn):
+    """`fn(name, value, labels)` is called with every observed value (per-request timings in benchmarks)."""
+    _observers.append(fn)
+
+
+def register_gauge(name: str, collect):
+    """`collect()` -> {(): value} or {(("label", "x"),): value}; read at export time."""
+    _gauges[name] = collect
+
+
+def _otel_tracer():
+    global _tracer
+    if _tracer is None:
+        provider = TracerProvider()
+        stream = open(OTEL_FILE, "a", encoding="utf-8")
+        provider.add_span_processor(SimpleSpanProcessor(
+            ConsoleSpanExporter(out=stream, formatter=lambda s: s.to_json(indent=None) + "\n")))
+        _tracer = provider.get_tracer("shopbot")
+    return _tracer
+
+
+def _write_span(record: dict):
+    global _span_file
+    with _lock:
+        if _span_file is None:
+            _span_file = open(OTEL_FILE, "a", encoding="utf-8")
+        _span_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        _span_file.flush()
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def span(name: str, trace_id: str = None, **attributes):
+    """Time one pipeline stage; nested spans share the trace id of the outermost one.
+
+    `trace_id` groups spans that cannot nest (e.g. stages of an async generator).
+    """
+    parent = _current_span.get()
+    record = {
+        "name": name,
+        "trace_id": parent["trace_id"] if parent else trace_id or new_trace_id(),
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "attributes": attributes,
+    }
+    token = _current_span.set(record)
+    otel_span = None
+    if OTEL_FILE and otel_trace is not None:
+        otel_span = _otel_tracer().start_as_current_span(name, attributes=attributes)
+        otel_span.__enter__()
+    started = time.perf_counter()
+    record["start"] = time.time()
+    status = "ok"
+    try:
+        yield record
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        _current_span.reset(token)
+        observe("stage_seconds", duration, stage=name)
+        if status == "error":
+            incr("stage_errors_total", stage=name)
+        if otel_span is not None:
+            otel_span.__exit__(None, None, None)
+        elif OTEL_FILE:
+            record.update(duration_ms=round(duration * 1000, 3), status=status)
+            _write_span(record)
+
+
+def traced(name: str, fn, trace_id: str = None):
+    """fn wrapped in span(name) (for asyncio.to_thread / executors)."""
+    def wrapper(*args, **kwargs):
+        with span(name, trace_id=trace_id):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def log(event: str, always: bool = False, level: int = logging.INFO, **fields):
+    """Structured log line, kept for a LOG_SAMPLE_RATE fraction of calls unless `always`."""
+    if not always and random.random() >= LOG_SAMPLE_RATE:
+        return
+    current = _current_span.get()
+    if current:
+        fields.setdefault("trace_id", current["trace_id"])
+    logger.log(level, json.dumps({"event": event, **fields}, ensure_ascii=False, default=str))
+
+
+def _format_labels(labels, extra=()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def prometheus_text() -> str:
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+
+    for name in sorted({n for n, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for name in sorted({n for n, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (n, labels), hist in sorted(histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(_buckets.get(name, BUCKETS), hist):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist[-2]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist[-1]}")
+
+    for name, collect in sorted(_gauges.items()):
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in sorted(collect().items()):
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port: int = METRICS_PORT):
+    """Start a /metrics endpoint in a daemon thread (once per process; no-op if port is 0)."""
+    global _server
+    with _lock:
+        if _server is None and port:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
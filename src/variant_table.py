@@ -0,0 +1,59 @@
+"""Side table for the product-level index: VariantId -> variant-detail rows.
+
+With INDEX_LEVEL=product the vector store and the BM25 index hold one
+document per product variant (catalog.build_product_documents); the color /
+memory / price / stock rows live here and are expanded only for the
+retrieved products, so every retrieved slot is a distinct phone.
+"""
+import gzip
+import json
+import os
+
+from langchain_core.documents import Document
+
+from catalog import build_metadata_filter, evaluate_where, matches_filters
+
+# variant: một document cho mỗi dòng chi tiết (cũ) | product: một document cho mỗi biến thể
+INDEX_LEVEL = os.getenv("INDEX_LEVEL", "variant")
+VARIANT_TABLE_PATH = os.getenv("VARIANT_TABLE_PATH", "variant_table.json.gz")
+
+
+class VariantTable:
+    def __init__(self, variants: dict):
+        self.variants = variants
+
+    def __len__(self):
+        return len(self.variants)
+
+    def rows(self, variant_id) -> list:
+        return self.variants.get(variant_id, [])
+
+    def expand(self, docs, filters: dict, overlay=None) -> list:
+        """Variant-detail documents of `docs` (in order) that satisfy `filters`.
+
+        Documents without a VariantId (a variant-level index) are kept as they
+        are when they match. With an `overlay` the rows get the live price /
+        stock before they are filtered.
+        """
+        where = build_metadata_filter(filters)
+        expanded = []
+        for doc in docs:
+            variant_id = doc.metadata.get("VariantId")
+            rows = self.variants.get(variant_id) if variant_id is not None else [doc.metadata]
+            expanded.extend(doc if variant_id is None else Document(page_content=m.get("text", ""), metadata=m)
+                            for m in rows or [])
+        if overlay is not None:
+            expanded = overlay.apply(expanded)
+        return [doc for doc in expanded if evaluate_where(doc.metadata, where) and matches_filters(doc.metadata, filters)]
+
+    def save(self, path: str = VARIANT_TABLE_PATH):
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(self.variants, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str = VARIANT_TABLE_PATH):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls(json.load(f))
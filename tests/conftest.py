@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Các module trong src/ được import theo tên trần (như khi chạy từ thư mục src)
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
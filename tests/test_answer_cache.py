@@ -0,0 +1,25 @@
+from answer_cache import SemanticAnswerCache, filters_key
+
+
+def _cache(tmp_path, **kwargs):
+    return SemanticAnswerCache(invalidation_log=str(tmp_path / "invalidations.jsonl"), **kwargs)
+
+
+def test_hit_requires_same_filters(tmp_path):
+    cache = _cache(tmp_path)
+    cache.store([1.0, 0.0], {"colors": ["Black"]}, "answer")
+    assert cache.lookup([1.0, 0.01], {"colors": ["black"]}) == "answer"
+    assert cache.lookup([1.0, 0.0], {"colors": ["white"]}) is None
+
+
+def test_filters_key_ignores_empty_values():
+    assert filters_key({"colors": [], "price_max": 10, "status": None}) == filters_key({"price_max": 10.0})
+
+
+def test_changed_prices_turn_a_hit_into_a_miss(tmp_path):
+    cache = _cache(tmp_path)
+    cache.store([1.0, 0.0], {}, "old price", prices={"a": [1.0, "AVAILABLE"]})
+    assert cache.lookup([1.0, 0.0], {}, fresh=lambda prices: True) == "old price"
+    assert cache.lookup([1.0, 0.0], {}, fresh=lambda prices: False) is None
+    assert cache.metrics()["stale"] == 1
+    assert cache.lookup([1.0, 0.0], {}) is None
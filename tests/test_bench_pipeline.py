@@ -0,0 +1,20 @@
+import os
+
+import bench_pipeline
+import resources
+from answer_cache import SemanticAnswerCache
+from fakes import FakeChatModel, FakeVectorStore
+from filter_parser import CATALOG_CSV
+
+
+def test_run_query_times_the_real_pipeline(monkeypatch):
+    monkeypatch.setattr(resources, "price_overlay", lambda: None)
+    monkeypatch.setattr(resources, "review_snippets", lambda: {})
+    store = FakeVectorStore.from_csv(CATALOG_CSV)
+    cache = SemanticAnswerCache(max_entries=0, invalidation_log=os.devnull)
+    timings = bench_pipeline.run_query("điện thoại Sony chụp ảnh đẹp", store, FakeChatModel(),
+                                       bench_pipeline.filter_llm_from_recording(), cache)
+    for stage in ("filters", "embed", "search", "context", "generation", "first_token", "total"):
+        assert stage in timings
+    assert timings["context_tokens"] > 0
+    assert timings["total"] >= timings["generation"]
@@ -0,0 +1,47 @@
+import pytest
+
+from catalog import build_metadata_filter, build_product_filter, evaluate_where, matches_filters, typed_metadata
+
+PHONE = typed_metadata("Samsung Galaxy S24", "Black", "8GB", "15990000", "available",
+                       "Pin: 4000 mAh; Tần số quét: 120 Hz", MemoryGB=8.0, RefreshHz=120.0)
+
+
+def test_typed_metadata_normalizes_keys():
+    assert PHONE["Price"] == 15990000.0
+    assert PHONE["ColorKey"] == "black" and PHONE["MemoryKey"] == "8GB" and PHONE["Status"] == "AVAILABLE"
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({}, True),
+    ({"price_max": 20000000}, True),
+    ({"price_min": 16000000}, False),
+    ({"colors": ["BLACK", "white"]}, True),
+    ({"colors": ["white"]}, False),
+    ({"memories": ["8gb"], "status": "available"}, True),
+    ({"status": "OUT_OF_STOCK"}, False),
+    ({"refresh_min_hz": 120}, True),
+    ({"memory_min_gb": 12}, False),
+])
+def test_store_filter_agrees_with_matches_filters(filters, expected):
+    assert evaluate_where(PHONE, build_metadata_filter(filters)) is expected
+    assert matches_filters(PHONE, filters) is expected
+
+
+def test_build_metadata_filter_shapes():
+    assert build_metadata_filter({}) is None
+    assert build_metadata_filter({"price_max": 10}) == {"Price": {"$lte": 10.0}}
+    assert len(build_metadata_filter({"price_min": 1, "price_max": 10})["$and"]) == 2
+
+
+def test_evaluate_where_operators():
+    m = {"Price": 100.0, "ColorKey": "black"}
+    assert evaluate_where(m, {"$or": [{"Price": {"$gt": 200}}, {"ColorKey": "black"}]})
+    assert not evaluate_where(m, {"$and": [{"Price": {"$gte": 100}}, {"ColorKey": {"$nin": ["black"]}}]})
+    assert evaluate_where(m, {"Price": {"$ne": 50, "$lt": 101}})
+    assert not evaluate_where(m, {"BatteryMah": {"$gte": 4000}})  # thiếu trường thì không khớp
+
+
+def test_product_filter_keeps_products_with_some_variant_in_range():
+    product = {"PriceMin": 10.0, "PriceMax": 30.0}
+    assert evaluate_where(product, build_product_filter({"price_min": 20, "price_max": 25}))
+    assert not evaluate_where(product, build_product_filter({"price_min": 31}))
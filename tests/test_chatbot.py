@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+import chatbot
+import resources
+from answer_cache import SemanticAnswerCache
+from conversation import ConversationState
+from fakes import FakeChatModel, FakeVectorStore
+from filter_parser import CATALOG_CSV
+from llm_gateway import GatewayOverloaded
+
+QUERY = "điện thoại Sony chụp ảnh đẹp"
+
+
+class RecordingChat(FakeChatModel):
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    def _answer(self, messages):
+        self.prompts.append("\n".join(m.content for m in messages))
+        return super()._answer(messages)
+
+
+@pytest.fixture
+def offline(monkeypatch, tmp_path):
+    store = FakeVectorStore.from_csv(CATALOG_CSV)
+    llm = RecordingChat()
+    monkeypatch.setattr(resources, "price_overlay", lambda: None)
+    monkeypatch.setattr(resources, "vectorstore", lambda: store)
+    monkeypatch.setattr(resources, "llm", lambda: llm)
+    monkeypatch.setattr(resources, "review_snippets", lambda: {
+        name.lower(): "⭐ 4.8/5 (9 đánh giá)" for name in ("Sony Xperia 1VI", "Sony Xperia 10VI")})
+    monkeypatch.setattr(chatbot, "answer_cache", SemanticAnswerCache(invalidation_log=str(tmp_path / "log")))
+    return store, llm
+
+
+def test_shop_chatbot_sends_review_snippets(offline):
+    _, llm = offline
+    chatbot.shop_chatbot(QUERY)
+    assert "⭐ 4.8/5" in llm.prompts[-1]
+
+
+def test_shop_chatbot_async_sends_review_snippets(offline):
+    store, llm = offline
+
+    async def run():
+        return [t async for t in chatbot.shop_chatbot_async(QUERY, llm=llm, store=store)]
+
+    assert asyncio.run(run())
+    assert "⭐ 4.8/5" in llm.prompts[-1]
+
+
+def _lookups(cache):
+    metrics = cache.metrics()
+    return metrics["hits"] + metrics["misses"]
+
+
+def test_turns_with_history_stay_out_of_the_shared_cache(offline):
+    cache, session = chatbot.answer_cache, ConversationState()
+    chatbot.shop_chatbot(QUERY, state=session)
+    assert cache.metrics()["entries"] == 1
+    chatbot.shop_chatbot("Samsung nào chụp ảnh đẹp dưới 10 triệu", state=session)
+    assert cache.metrics()["entries"] == 1
+    lookups = _lookups(cache)
+    chatbot.shop_chatbot("loại nào dưới 30 triệu thì sao?", state=session)
+    assert _lookups(cache) == lookups
+    assert cache.metrics()["entries"] == 1
+
+
+def test_cache_hit_keeps_the_results_for_follow_ups(offline):
+    chatbot.shop_chatbot(QUERY, state=ConversationState())
+    session = ConversationState()
+    chatbot.shop_chatbot(QUERY, state=session)
+    assert chatbot.answer_cache.metrics()["hits"] == 1
+    assert session.results and session.turns[-1].products
+
+
+class OverloadedChat(FakeChatModel):
+    def _answer(self, messages):
+        raise GatewayOverloaded("64 LLM calls already queued")
+
+
+def test_overloaded_gateway_returns_busy_message(offline, monkeypatch):
+    store, _ = offline
+    busy = OverloadedChat()
+    monkeypatch.setattr(resources, "llm", lambda: busy)
+    assert chatbot.shop_chatbot(QUERY) == chatbot.BUSY_MESSAGE
+
+    async def run():
+        return [t async for t in chatbot.shop_chatbot_async(QUERY, llm=busy, store=store)]
+
+    assert asyncio.run(run()) == [chatbot.BUSY_MESSAGE]
@@ -0,0 +1,50 @@
+import os
+
+from collection_alias import AliasedArtifact, artifact_path, read_aliases, swap
+
+
+def test_artifact_path_versions_side_files():
+    assert artifact_path("variant_table.json.gz", "products") == "variant_table.json.gz"
+    assert artifact_path("data/lexical_index.json.gz", "products__v20260101000000") == \
+        "data/lexical_index.products__v20260101000000.json.gz"
+
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_aliased_artifact_follows_swap_and_rewrites(tmp_path):
+    alias_path = str(tmp_path / "aliases.json")
+    base = str(tmp_path / "table.txt")
+    old, new = "products__v20260101000000", "products__v20260102000000"
+    _write(artifact_path(base, old), "old")
+    _write(artifact_path(base, new), "new")
+    loads = []
+
+    def load(path):
+        loads.append(path)
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    artifact = AliasedArtifact("products", base, load, alias_path=alias_path)
+    assert artifact.get() is None  # chưa có alias, file gốc chưa tồn tại
+
+    swap("products", old, alias_path)
+    assert artifact.get() == "old"
+    assert artifact.get() == "old" and len(loads) == 1
+
+    swap("products", new, alias_path)
+    assert read_aliases(alias_path)["products"] == new
+    assert artifact.get() == "new"
+
+    _write(artifact_path(base, new), "rebuilt")
+    os.utime(artifact_path(base, new), ns=(1, 1))
+    assert artifact.get() == "rebuilt"
+
+
+def test_pinned_artifact_skips_disk(tmp_path):
+    artifact = AliasedArtifact("products", str(tmp_path / "missing"), lambda p: 1 / 0,
+                               alias_path=str(tmp_path / "aliases.json"))
+    artifact.pin("table")
+    assert artifact.get() == "table"
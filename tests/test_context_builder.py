@@ -0,0 +1,60 @@
+from langchain_core.documents import Document
+
+from context_builder import build_context, estimate_tokens, group_variants, relevant_attributes, render_group
+
+
+def _doc(name, color, memory, price, attributes="Pin: 5000 mAh; Chip: Snapdragon 8 Gen 3; Màn hình: 6.8 inch"):
+    return Document(page_content=name, metadata={"ProductName": name, "Color": color, "Memory": memory,
+                                                 "Price": price, "Status": "AVAILABLE", "Attributes": attributes})
+
+
+RESULTS = [
+    _doc("Samsung Galaxy S24 Ultra", "Black", "12GB", 30990000.0),
+    _doc("Samsung Galaxy S24 Ultra", "Gray", "12GB", 28990000.0),
+    _doc("OPPO Reno 11", "Green", "8GB", 10990000.0, "Sạc nhanh: 67W; Camera: 50MP"),
+]
+
+
+def test_variants_grouped_in_retrieval_order():
+    groups = group_variants(RESULTS)
+    assert [g["name"] for g in groups] == ["Samsung Galaxy S24 Ultra", "OPPO Reno 11"]
+    assert groups[0]["colors"] == ["Black", "Gray"]
+    assert groups[0]["memories"] == ["12GB"]
+    assert groups[0]["prices"] == [28990000.0, 30990000.0]
+
+
+def test_context_lists_each_combination_with_its_price():
+    context = build_context(RESULTS)
+    assert context.products == 2 and context.dropped == 0
+    assert context.text.count("📦") == 2
+    assert "💸 Black/12GB: 30.990.000đ (AVAILABLE)" in context.text
+    assert "💸 Gray/12GB: 28.990.000đ (AVAILABLE)" in context.text
+    assert context.tokens == estimate_tokens(context.text)
+
+
+def test_combinations_collapse_to_a_price_range_when_over_budget():
+    group = group_variants(RESULTS)[0]
+    attributes = relevant_attributes(group["attributes"])
+    tight = build_context(RESULTS[:2], budget=estimate_tokens(render_group(group, attributes)))
+    assert "28.990.000đ - 30.990.000đ" in tight.text
+    assert "Black/12GB" not in tight.text and "⚙️" in tight.text
+
+
+def test_relevant_attributes_follow_the_filters():
+    attributes = group_variants(RESULTS)[0]["attributes"]
+    assert relevant_attributes(attributes, {"attributes": ["pin"]}) == {"Pin": "5000 mAh"}
+    assert len(relevant_attributes(attributes, {}, default=2)) == 2
+
+
+def test_budget_drops_attributes_then_products():
+    bare = render_group(group_variants(RESULTS)[0], {})
+    tight = build_context(RESULTS, budget=estimate_tokens(bare) + 2)
+    assert tight.products == 1 and tight.dropped == 1
+    assert "⚙️" not in tight.text
+    assert "OPPO" not in tight.text
+
+
+def test_empty_results():
+    context = build_context([])
+    assert context.products == 0
+    assert context.text == "Không tìm thấy sản phẩm nào phù hợp."
@@ -0,0 +1,60 @@
+from langchain_core.documents import Document
+
+from conversation import ConversationState, is_follow_up, merge_filters, narrows
+from filter_parser import empty_filters
+
+
+def _filters(**values):
+    return {**empty_filters(), **values}
+
+
+def test_new_question_with_con_hang_is_not_a_follow_up():
+    assert not is_follow_up("iPhone nào còn hàng dưới 20 triệu")
+    assert not is_follow_up("điện thoại nào còn hàng dưới 20 triệu")
+    assert not is_follow_up("còn hàng không")
+
+
+def test_short_query_without_cue_is_not_a_follow_up():
+    assert not is_follow_up("màu đen")
+    assert not is_follow_up("Samsung A55")
+
+
+def test_anaphoric_cues_without_product_are_follow_ups():
+    assert is_follow_up("cái màu đen thì sao?")
+    assert is_follow_up("còn bản 256GB?")
+    assert is_follow_up("nó có chống nước không")
+    assert is_follow_up("trong số đó con nào rẻ nhất")
+
+
+def test_cue_with_a_product_of_its_own_starts_a_new_topic():
+    assert not is_follow_up("còn Xperia thì sao")
+    assert not is_follow_up("iPhone thì sao")
+
+
+def test_new_question_does_not_inherit_previous_filters():
+    state = ConversationState()
+    state.resolve("Samsung màu đen", _filters(colors=["black"]))
+    query = "iPhone nào còn hàng dưới 20 triệu"
+    filters, reused = state.resolve(query, _filters(status="AVAILABLE", price_max=20_000_000))
+    assert filters["colors"] == []
+    assert reused is None
+    assert state.search_query(query) == query
+    assert state.topic == query
+
+
+def test_follow_up_merges_and_reuses_results():
+    state = ConversationState()
+    state.resolve("Samsung dưới 10 triệu", _filters(price_max=10_000_000))
+    state.results = [Document(page_content="a", metadata={"ProductName": "A", "Color": "Black", "ColorKey": "black", "Price": 9e6}),
+                     Document(page_content="b", metadata={"ProductName": "B", "Color": "White", "ColorKey": "white", "Price": 8e6})]
+    filters, reused = state.resolve("cái màu đen thì sao", _filters(colors=["black"]))
+    assert filters["price_max"] == 10_000_000 and filters["colors"] == ["black"]
+    assert [d.page_content for d in reused] == ["a"]
+    assert state.search_query("cái màu đen thì sao") == "Samsung dưới 10 triệu cái màu đen thì sao"
+
+
+def test_merge_and_narrows():
+    previous = _filters(price_max=10_000_000, colors=["black", "white"])
+    merged = merge_filters(previous, _filters(colors=["black"]))
+    assert merged["price_max"] == 10_000_000 and narrows(previous, merged)
+    assert not narrows(previous, merge_filters(previous, _filters(price_max=20_000_000)))
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings.fake import DeterministicFakeEmbedding
+
+from embedding_cache import CachedEmbeddings, EmbeddingCache, text_key
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+def test_text_key_ignores_whitespace():
+    assert text_key("Samsung  Galaxy\nS24 ") == text_key("Samsung Galaxy S24")
+
+
+def test_round_trip_survives_reopen(tmp_path):
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many("m", ["a", "b", "c"], vectors)
+
+    reopened = EmbeddingCache(str(tmp_path))
+    found = reopened.get_many("m", ["c", "x", "a"])
+    np.testing.assert_array_equal(found[0], vectors[2])
+    assert found[1] is None
+    np.testing.assert_array_equal(found[2], vectors[0])
+    assert reopened.stats()["hits"] == 2 and reopened.stats()["misses"] == 1
+
+
+def test_appends_keep_earlier_rows(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many("m", ["a"], [[1, 2]])
+    cache.put_many("m", ["b"], [[3, 4]])
+    assert [v.tolist() for v in cache.get_many("m", ["a", "b"])] == [[1, 2], [3, 4]]
+    with pytest.raises(ValueError):
+        cache.put_many("m", ["c"], [[1, 2, 3]])
+
+
+def test_cached_embeddings_only_embed_new_texts(tmp_path):
+    model = CountingEmbeddings(size=8)
+    cached = CachedEmbeddings(model, EmbeddingCache(str(tmp_path)), model_name="fake")
+    first = cached.embed_documents(["a", "b", "a"])
+    assert model.calls == 2
+    assert cached.embed_documents(["b", "a"]) == [first[1], first[0]]
+    assert model.calls == 2
+
+    query = cached.embed_query("a")
+    assert model.calls == 3  # query có namespace riêng
+    fresh = CachedEmbeddings(model, EmbeddingCache(str(tmp_path)), model_name="fake")
+    assert fresh.embed_query("a") == query and model.calls == 3
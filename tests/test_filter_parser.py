@@ -0,0 +1,107 @@
+import pytest
+
+from filter_parser import CATALOG_CSV, load_vocab, mentions_product, parse_filters
+
+
+def _set(result):
+    return {k: v for k, v in result.filters.items() if v not in (None, [], "")}
+
+
+def test_currency_dong_is_not_a_color():
+    result = parse_filters("dưới 10 triệu đồng màu đen")
+    assert _set(result) == {"price_max": 10_000_000, "colors": ["black"]}
+    assert result.confidence == 1.0
+
+
+def test_amount_in_dong_is_a_price():
+    result = parse_filters("điện thoại 5000000 đồng")
+    assert _set(result) == {"price_min": 4_500_000, "price_max": 5_500_000}
+
+
+def test_dong_ho_is_not_a_color():
+    assert _set(parse_filters("đồng hồ")) == {}
+
+
+def test_dong_after_mau_is_bronze():
+    assert parse_filters("samsung màu đồng").filters["colors"] == ["bronze brown"]
+
+
+@pytest.mark.parametrize("query", ["samsung xanh lá", "samsung xanh la", "samsung màu xanh lá cây"])
+def test_green(query):
+    assert parse_filters(query).filters["colors"] == ["green"]
+
+
+def test_bare_xanh_is_blue_or_green():
+    assert parse_filters("samsung xanh").filters["colors"] == ["blue", "green"]
+    assert parse_filters("samsung xanh dương").filters["colors"] == ["blue"]
+
+
+def test_standard_memory_outside_catalog_stays_in_the_name():
+    assert "12GB" not in load_vocab()["memories"]
+    result = parse_filters("samsung 12gb")
+    assert result.filters["memories"] == []
+    assert "12gb" in result.rest
+    assert result.confidence == 1.0
+
+
+def test_memory_cue_makes_a_filter():
+    assert parse_filters("samsung ram 12gb").filters["memories"] == ["12GB"]
+    assert parse_filters("bộ nhớ 12gb").filters["memories"] == ["12GB"]
+
+
+@pytest.mark.parametrize("query", ["Samsung Galaxy A55 5G 12GB", "A55 5G 12GB"])
+def test_size_in_model_name_is_not_a_memory_filter(query):
+    result = parse_filters(query)
+    assert result.filters["memories"] == []
+    assert "a55" in result.rest and "12gb" in result.rest
+
+
+def test_odd_memory_size_lowers_confidence():
+    result = parse_filters("samsung 13gb")
+    assert result.filters["memories"] == []
+    assert result.confidence < 1.0
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("từ 10 đến 20 triệu", {"price_min": 10_000_000, "price_max": 20_000_000}),
+    ("tầm 15tr", {"price_min": 13_500_000, "price_max": 16_500_000}),
+    ("trên 8 triệu", {"price_min": 8_000_000}),
+    ("9 triệu trở xuống", {"price_max": 9_000_000}),
+    ("dưới 7 triệu 990", {"price_max": 7_990_000}),
+    ("từ 7 triệu 990 đến 9 triệu", {"price_min": 7_990_000, "price_max": 9_000_000}),
+    ("dưới 5 triệu 500 nghìn", {"price_max": 5_500_000}),
+    ("dưới 15tr5", {"price_max": 15_500_000}),
+])
+def test_price_ranges(query, expected):
+    assert _set(parse_filters(query)) == expected
+
+
+def test_model_number_is_not_a_price():
+    result = parse_filters("iphone 15 dưới 20tr màu đen")
+    assert _set(result) == {"price_max": 20_000_000, "colors": ["black"]}
+
+
+def test_status_and_specs():
+    result = parse_filters("samsung còn hàng ram từ 8gb pin trên 5000 mAh 120hz")
+    assert result.filters["status"] == "AVAILABLE"
+    assert result.filters["memory_min_gb"] == 8
+    assert result.filters["battery_min_mah"] == 5000
+    assert result.filters["attributes"] == ["120Hz"]
+
+
+def test_mentions_product():
+    assert mentions_product("iPhone nào còn hàng")
+    assert mentions_product("a55 giá bao nhiêu")
+    assert not mentions_product("cái màu đen thì sao")
+    assert not mentions_product("bản 256GB")
+
+
+def test_a55_12gb_query_retrieves_the_model(monkeypatch):
+    import resources
+    from database import extract_filters, retrieve_products
+    from fakes import FakeVectorStore
+
+    monkeypatch.setattr(resources, "price_overlay", lambda: None)
+    query = "Samsung Galaxy A55 5G 12GB"
+    results = retrieve_products(query, extract_filters(query), store=FakeVectorStore.from_csv(CATALOG_CSV))
+    assert "Samsung Galaxy A55 5G 12GB" in {d.metadata["ProductName"] for d in results}
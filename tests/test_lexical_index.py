@@ -0,0 +1,47 @@
+from langchain_core.documents import Document
+
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+METADATAS = [
+    {"ProductName": "Samsung Galaxy S24", "Color": "Black", "Memory": "8GB", "Status": "AVAILABLE",
+     "Attributes": "Tần số quét: 120 Hz; Pin: 4000 mAh"},
+    {"ProductName": "Sony Xperia 10VI", "Color": "White", "Memory": "8GB", "Status": "AVAILABLE",
+     "Attributes": "Tần số quét: 60 Hz"},
+    {"ProductName": "OPPO Reno 11", "Color": "Green", "Memory": "12GB", "Status": "OUT_OF_STOCK",
+     "Attributes": "Sạc nhanh: 67 W"},
+]
+
+
+def _index():
+    return BM25Index(METADATAS, [m["ProductName"] for m in METADATAS])
+
+
+def test_tokenize_joins_units():
+    assert tokenize("Màn 120 Hz, pin 5000 mAh") == ["màn", "120hz", "pin", "5000mah"]
+
+
+def test_search_ranks_exact_name_tokens_first():
+    hits = _index().search("xperia 10vi", k=2)
+    assert hits[0].metadata["ProductName"] == "Sony Xperia 10VI"
+    assert _index().search("120hz")[0].metadata["ProductName"] == "Samsung Galaxy S24"
+
+
+def test_search_applies_accept_and_k():
+    hits = _index().search("8gb", k=5, accept=lambda m: m["Color"] == "White")
+    assert [h.metadata["ProductName"] for h in hits] == ["Sony Xperia 10VI"]
+    assert len(_index().search("8gb", k=1)) == 1
+
+
+def test_save_load_round_trip(tmp_path):
+    path = _index().save(str(tmp_path / "bm25.json.gz"))
+    loaded = BM25Index.load(path)
+    assert [d.metadata for d in loaded.search("oppo reno")] == [d.metadata for d in _index().search("oppo reno")]
+
+
+def test_rrf_rewards_agreement_and_groups_by_key():
+    a, b, c = (Document(page_content=n, metadata={"ProductName": n}) for n in "abc")
+    b2 = Document(page_content="b 256GB", metadata={"ProductName": "b"})
+    fused = reciprocal_rank_fusion([[a, b, b2], [c, b]], key=lambda d: d.metadata["ProductName"])
+    # b có mặt ở cả hai danh sách nên lên đầu, các biến thể của b đi liền nhau
+    assert list(dict.fromkeys(d.metadata["ProductName"] for d in fused)) == ["b", "a", "c"]
+    assert [d.page_content for d in fused[:2]] == ["b", "b 256GB"]
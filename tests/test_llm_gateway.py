@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from llm_gateway import GatewayTimeout, LLMGateway
+
+
+class HungClient:
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(10)
+
+    async def astream(self, messages):
+        self.calls += 1
+        await asyncio.sleep(10)
+        yield "never"
+
+
+@pytest.fixture
+def gateway():
+    client = HungClient()
+    gateway = LLMGateway(client, workers=1, rpm=0, retries=1, backoff=0, timeout=0.05)
+    yield gateway, client
+    gateway.close()
+
+
+def test_hung_call_times_out_and_frees_the_worker(gateway):
+    gateway, client = gateway
+    with pytest.raises(GatewayTimeout):
+        gateway.invoke(["xin chào"])
+    assert client.calls == 2  # lần đầu + 1 lần thử lại
+    with pytest.raises(GatewayTimeout):
+        list(gateway.stream(["câu khác"]))
+    assert client.calls == 4
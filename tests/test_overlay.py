@@ -0,0 +1,105 @@
+import sqlite3
+
+import pandas as pd
+from langchain_core.documents import Document
+
+import pinecone_sync
+from filter_parser import CATALOG_CSV
+from overlay import PriceOverlay, price_snapshot, snapshot_fetcher, sql_fetcher
+from sql_source import create_sqlite_catalog
+
+
+class CountingFetch:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def __call__(self, ids):
+        self.calls.append(list(ids))
+        return {i: self.rows[i] for i in ids if i in self.rows}
+
+
+def _doc(detail_id, price, status="AVAILABLE"):
+    return Document(page_content=detail_id, metadata={"DetailId": detail_id, "Price": price, "Status": status})
+
+
+def test_lookup_batches_misses_and_caches_hits_and_misses():
+    fetch = CountingFetch({"a": {"Price": 1.0}})
+    overlay = PriceOverlay(fetch, ttl=60)
+    assert overlay.lookup(["a", "b", "a"]) == {"a": {"Price": 1.0}}
+    assert overlay.lookup(["a", "b"]) == {"a": {"Price": 1.0}}
+    assert fetch.calls == [["a", "b"]]
+
+
+def test_expired_entries_are_fetched_again():
+    fetch = CountingFetch({"a": {"Price": 1.0}})
+    overlay = PriceOverlay(fetch, ttl=0)
+    overlay.lookup(["a"])
+    overlay.lookup(["a"])
+    assert len(fetch.calls) == 2
+
+
+def test_apply_copies_documents_with_live_fields():
+    overlay = PriceOverlay(CountingFetch({"a": {"Price": 2.0, "Status": "OUT_OF_STOCK"}}))
+    doc, other = _doc("a", 1.0), Document(page_content="x", metadata={"Price": 5.0})
+    refreshed = overlay.apply([doc, other])
+    assert refreshed[0].metadata["Price"] == 2.0 and refreshed[0].metadata["Status"] == "OUT_OF_STOCK"
+    assert doc.metadata["Price"] == 1.0
+    assert refreshed[1] is other
+
+
+def test_fetch_error_keeps_synced_values_and_backs_off():
+    calls = []
+
+    def failing(ids):
+        calls.append(ids)
+        raise ConnectionError("db down")
+
+    overlay = PriceOverlay(failing, error_backoff=60)
+    doc = _doc("a", 1.0)
+    assert overlay.apply([doc]) == [doc]
+    assert overlay.lookup(["a"]) == {}
+    assert len(calls) == 1  # trong thời gian backoff không gọi lại nguồn
+
+    overlay = PriceOverlay(failing, error_backoff=0)
+    overlay.lookup(["a"])
+    overlay.lookup(["a"])
+    assert len(calls) == 3  # lỗi không được cache như một kết quả
+
+
+def test_sql_fetcher_reuses_connections(tmp_path):
+    opened = []
+
+    def connect():
+        opened.append(sqlite3.connect(create_sqlite_catalog(CATALOG_CSV, str(tmp_path / "catalog.db"))))
+        return opened[-1]
+
+    fetch = sql_fetcher(connect)
+    detail_id = str(pd.read_csv(CATALOG_CSV)["product_variant_detail_id"].dropna().iloc[0])
+    assert detail_id in fetch([detail_id])
+    assert detail_id in fetch([detail_id])
+    assert len(opened) == 1
+
+
+def test_unchanged_compares_price_and_status():
+    rows = {"a": {"Price": 1.0, "Status": "AVAILABLE"}}
+    overlay = PriceOverlay(CountingFetch(rows), ttl=0)
+    prices = price_snapshot([_doc("a", 1.0), Document(page_content="x", metadata={})])
+    assert prices == {"a": [1.0, "AVAILABLE"]}
+    assert overlay.unchanged(prices)
+    rows["a"] = {"Price": 1.5, "Status": "AVAILABLE"}
+    assert not overlay.unchanged(prices)
+
+
+def test_snapshot_fetcher_reads_the_catalog():
+    df = pd.read_csv(CATALOG_CSV)
+    row = df[df["product_variant_detail_id"].notna()].iloc[0]
+    found = snapshot_fetcher(CATALOG_CSV)([row["product_variant_detail_id"], "missing"])
+    assert list(found) == [row["product_variant_detail_id"]]
+    assert found[row["product_variant_detail_id"]]["Price"] == float(row["price"])
+
+
+def test_pinecone_metadata_has_detail_id():
+    row = {"id": 7, "product_name": "A", "color_name": "Black", "memory_name": "8GB", "price": 1.0,
+           "status": "AVAILABLE", "attributes": "", "variant_name": "A", "pvd_name": "A - Black - 8GB"}
+    assert pinecone_sync.build_metadata(row, "t")["DetailId"] == "7"
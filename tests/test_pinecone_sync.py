@@ -0,0 +1,30 @@
+import sqlite3
+
+import pinecone_sync
+from filter_parser import CATALOG_CSV
+from sql_source import create_sqlite_catalog
+
+
+def test_detail_only_change_is_fetched_and_advances_the_watermark(tmp_path):
+    conn = sqlite3.connect(create_sqlite_catalog(CATALOG_CSV, str(tmp_path / "catalog.db")))
+    since = max(pinecone_sync.fetch_data(conn)[["updated_at", "product_variant_updated_at"]].max().dropna())
+    assert pinecone_sync.fetch_data(conn, since=since).empty
+
+    detail_id = conn.execute("SELECT id FROM product_variant_details LIMIT 1").fetchone()[0]
+    conn.execute("UPDATE product_variant_details SET price = 1, updated_at = ? WHERE id = ?",
+                 ("9999-01-01 00:00:00", detail_id))
+    changed = pinecone_sync.fetch_data(conn, since=since)
+    assert changed["id"].astype(str).tolist() == [str(detail_id)]
+
+    state = pinecone_sync.SyncState(str(tmp_path / "state.db"))
+    pinecone_sync._advance_watermark(changed, state)
+    assert state.watermark() == "9999-01-01 00:00:00"
+
+
+def test_schema_without_detail_timestamp_uses_product_timestamps(tmp_path):
+    conn = sqlite3.connect(create_sqlite_catalog(CATALOG_CSV, str(tmp_path / "catalog.db")))
+    conn.execute("ALTER TABLE product_variant_details DROP COLUMN updated_at")
+    data = pinecone_sync.fetch_data(conn)
+    assert data["detail_updated_at"].isna().all()
+    since = max(data[["updated_at", "product_variant_updated_at"]].max().dropna())
+    assert pinecone_sync.fetch_data(conn, since=since).empty
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from local_index import LocalVectorIndex, build_local_index
+from quantization import Int8Quantizer, ProductQuantizer, fit_quantizer, load_quantized, save_quantized
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(600, 32)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_int8_scores_track_exact_scores(vectors):
+    quantizer = Int8Quantizer.fit(vectors)
+    codes = quantizer.encode(vectors)
+    assert codes.dtype == np.int8
+    query = vectors[0]
+    np.testing.assert_allclose(quantizer.scores(codes, query), vectors @ query, atol=0.02)
+
+
+def test_pq_scores_correlate_with_exact_scores(vectors):
+    quantizer = ProductQuantizer.fit(vectors, subspaces=8)
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (len(vectors), 8) and codes.dtype == np.uint8
+    query = vectors[1]
+    assert np.corrcoef(quantizer.scores(codes, query), vectors @ query)[0, 1] > 0.9
+
+
+def test_pq_rejects_uneven_subspaces(vectors):
+    with pytest.raises(ValueError):
+        ProductQuantizer.fit(vectors, subspaces=5)
+
+
+def test_save_and_load_round_trip(vectors, tmp_path):
+    quantizer = fit_quantizer("int8", vectors)
+    save_quantized(str(tmp_path), quantizer, quantizer.encode(vectors))
+    loaded, codes = load_quantized(str(tmp_path))
+    np.testing.assert_array_equal(loaded.scale, quantizer.scale)
+    np.testing.assert_array_equal(codes, quantizer.encode(vectors))
+
+
+@pytest.mark.parametrize("kind", ["int8", "pq"])
+def test_default_shortlist_keeps_recall(vectors, tmp_path, kind):
+    metadatas = [{"i": i} for i in range(len(vectors))]
+    texts = [str(i) for i in range(len(vectors))]
+    exact = LocalVectorIndex(build_local_index(texts, metadatas, vectors, str(tmp_path / "exact"), quantization="none"))
+    quantized = LocalVectorIndex(build_local_index(texts, metadatas, vectors, str(tmp_path / kind),
+                                                   quantization=kind, subspaces=8))
+    assert quantized.rerank_min >= 40
+    rng = np.random.default_rng(1)
+    recalls = []
+    for query in rng.normal(size=(20, 32)).astype(np.float32):
+        expected = set(exact.search_ids(query, k=4)[0])
+        recalls.append(len(expected & set(quantized.search_ids(query, k=4)[0])) / 4)
+    assert np.mean(recalls) >= 0.95
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+from langchain_core.documents import Document
+
+from context_builder import build_context, estimate_tokens
+from review_digest import (ExtractiveSummarizer, build_digest, build_digests, feedbacks_from_table, load_digests,
+                           parse_feedbacks, render_snippet, save_digests, snippets_by_name)
+
+REVIEWS = [(5, "Pin trâu, màn hình đẹp"), (5, "pin trâu. Giao nhanh"), (4, "Màn hình đẹp"),
+           (1, "Nóng máy khi chơi game, pin tụt"), (2, "nóng máy"), (3, "12321312")]
+
+
+def test_parse_feedbacks_drops_join_duplicates_and_blanks():
+    raw = "5 Star - Tốt || 5 Star - Tốt ||  || 3 Star - 12321312"
+    assert parse_feedbacks(raw) == [(5, "Tốt"), (3, "12321312")]
+    assert parse_feedbacks(None) == [] and parse_feedbacks(float("nan")) == []
+
+
+def test_feedbacks_from_table_groups_by_variant():
+    import pandas as pd
+    df = pd.DataFrame({"product_variant_id": ["v1", "v1", "v2"], "product_variant_name": ["A", "A", "B"],
+                       "feedbacks": ["5 Star - Tốt", "5 Star - Tốt || 1 Star - Tệ", None]})
+    variants = feedbacks_from_table(df)
+    assert variants["v1"] == {"name": "A", "reviews": [(5, "Tốt"), (1, "Tệ")]}
+    assert variants["v2"]["reviews"] == []
+
+
+def test_extractive_pros_and_cons():
+    digest = build_digest("X", REVIEWS, ExtractiveSummarizer(points=2))
+    assert digest["count"] == 6 and digest["average"] == 3.33
+    assert digest["histogram"] == {"1": 1, "2": 1, "3": 1, "4": 1, "5": 2}
+    assert [p.lower() for p in digest["pros"]] == ["pin trâu", "màn hình đẹp"]
+    assert {c.lower() for c in digest["cons"]} == {"pin tụt", "nóng máy"}
+    assert digest["snippet"].startswith("⭐ 3.3/5 (6 đánh giá) 👍")
+
+
+def test_snippet_fits_budget():
+    digest = build_digest("X", REVIEWS, ExtractiveSummarizer())
+    snippet = render_snippet({**digest, "pros": ["rất " * 30] * 3}, budget=20)
+    assert estimate_tokens(snippet) <= 20 or "👍" not in snippet
+    assert render_snippet({**digest, "count": 0}) == ""
+
+
+def test_unchanged_reviews_are_reused(tmp_path):
+    summarizer = ExtractiveSummarizer()
+    variants = {"v1": {"name": "A", "reviews": REVIEWS}, "v2": {"name": "B", "reviews": []}}
+    digests, recomputed = build_digests(variants, summarizer)
+    assert recomputed == 2
+    path = save_digests(digests, str(tmp_path / "digests.json.gz"))
+    variants["v2"]["reviews"] = [(5, "Đẹp lắm")]
+    again, recomputed = build_digests(variants, summarizer, load_digests(path))
+    assert recomputed == 1 and again["v1"] == digests["v1"]
+    assert snippets_by_name(again) == {"a": digests["v1"]["snippet"], "b": again["v2"]["snippet"]}
+
+
+def test_build_context_drops_review_before_product():
+    docs = [Document(page_content="a", metadata={"ProductName": "A", "Price": 1e6})]
+    reviews = {"a": "⭐ 4.5/5 (10 đánh giá)"}
+    assert "⭐ 4.5/5" in build_context(docs, reviews=reviews).text
+    tight = build_context(docs, budget=estimate_tokens(build_context(docs).text), reviews=reviews)
+    assert "⭐" not in tight.text and tight.products == 1
+
+
+def test_snapshot_without_feedbacks_is_rejected_clearly():
+    with pytest.raises(ValueError, match="feedbacks"):
+        feedbacks_from_table(pd.DataFrame({"product_variant_id": ["1"], "product_variant_name": ["A"]}))
@@ -0,0 +1,47 @@
+import pytest
+
+import resources
+from structured_answers import answer_structured, structured_intent
+
+
+@pytest.fixture(autouse=True)
+def no_overlay(monkeypatch):
+    monkeypatch.setattr(resources, "price_overlay", lambda: None)
+
+
+def test_no_catalog_match_falls_back_to_the_llm():
+    # "chống nước" -> "water resistant" không có trong thuộc tính catalog
+    assert answer_structured("Samsung có chống nước không") is None
+    assert answer_structured("Samsung dưới 1000 đồng") is None
+
+
+def test_model_number_selects_one_model():
+    answer = answer_structured("Xperia 10 giá bao nhiêu")
+    assert answer.intent == "price"
+    assert answer.products == ["Sony Xperia 10VI"]
+    assert answer_structured("Xperia 1 giá bao nhiêu").products == ["Sony Xperia 1VI"]
+    assert len(answer_structured("Xperia giá bao nhiêu").products) == 2
+
+
+def test_cheapest_has_its_own_wording():
+    answer = answer_structured("samsung rẻ nhất")
+    assert answer.intent == "cheapest"
+    assert len(answer.products) == 3
+    assert answer.text.startswith("3 sản phẩm rẻ nhất trong số")
+    assert "Có " not in answer.text.splitlines()[0]
+
+
+def test_priciest_orders_by_highest_price():
+    answer = answer_structured("điện thoại nào đắt nhất")
+    assert answer.intent == "priciest"
+    assert answer.products[0] == "Samsung Galaxy S23 Ultra 1TB"
+
+
+def test_colors_intent():
+    answer = answer_structured("có bao nhiêu màu của Xperia 1")
+    assert answer.intent == "colors"
+    assert answer.text.startswith("🎨 Sony Xperia 1VI có 3 màu")
+
+
+def test_open_ended_question_is_not_structured():
+    assert structured_intent("tầm 8 triệu nên mua máy nào chơi game tốt") is None